@@ -0,0 +1,206 @@
+"""
+Архивный колоночный формат истории цен.
+
+Файл — заголовок MAGIC + версия, за которым идут блоки. Блок хранит один тикер и две колонки
+одинаковой длины: timestamps (int64) и prices (float64), little-endian, без построчной разметки.
+Экспорт пишет по блоку на каждую пачку StorageBackend.iter_prices, поэтому отдаётся потоком;
+импорт загружает блоки крупными транзакциями вместе с инкрементальным обновлением свечей.
+
+    python -m app.archive export --out prices.cpa --ticker btc_usd [--start TS] [--end TS]
+    python -m app.archive import prices.cpa
+"""
+import argparse
+import asyncio
+import struct
+import sys
+from array import array
+from itertools import repeat
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.storage import StorageBackend, create_storage
+
+MAGIC = b"CPARCH"
+VERSION = 1
+MEDIA_TYPE = "application/vnd.crypto-prices.archive"
+
+_HEADER = struct.Struct("<6sH")
+_BLOCK = struct.Struct("<HQ")
+
+Block = Tuple[str, array, array]
+
+
+class ArchiveFormatError(ValueError):
+    pass
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_header() -> bytes:
+    return _HEADER.pack(MAGIC, VERSION)
+
+
+def encode_block(ticker: str, timestamps: array, prices: array) -> bytes:
+    if len(timestamps) != len(prices):
+        raise ValueError("Timestamp and price columns must have the same length.")
+    name = ticker.encode()
+    return _BLOCK.pack(len(name), len(timestamps)) + name + _little_endian(timestamps) + _little_endian(prices)
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise ArchiveFormatError("Unexpected end of archive.")
+    return data
+
+
+def _read_column(stream: BinaryIO, typecode: str, count: int) -> array:
+    column = array(typecode)
+    column.frombytes(_read_exact(stream, count * column.itemsize))
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def _read_header(stream: BinaryIO):
+    magic, version = _HEADER.unpack(_read_exact(stream, _HEADER.size))
+    if magic != MAGIC:
+        raise ArchiveFormatError("Not a price archive.")
+    if version != VERSION:
+        raise ArchiveFormatError(f"Unsupported archive version: {version}")
+
+
+def _read_block_head(stream: BinaryIO) -> Optional[Tuple[str, int]]:
+    head = stream.read(_BLOCK.size)
+    if not head:
+        return None
+    if len(head) != _BLOCK.size:
+        raise ArchiveFormatError("Unexpected end of archive.")
+    name_size, count = _BLOCK.unpack(head)
+    return _read_exact(stream, name_size).decode(), count
+
+
+def read_blocks(stream: BinaryIO) -> Iterator[Block]:
+    _read_header(stream)
+    while True:
+        head = _read_block_head(stream)
+        if head is None:
+            return
+        ticker, count = head
+        yield ticker, _read_column(stream, "q", count), _read_column(stream, "d", count)
+
+
+def index_blocks(stream: BinaryIO) -> Iterator[Tuple[str, int, int]]:
+    """
+    (ticker, смещение колонок, число строк) каждого блока без чтения колонок — для чтения
+    блоков в произвольном порядке через read_columns.
+    """
+    _read_header(stream)
+    while True:
+        head = _read_block_head(stream)
+        if head is None:
+            return
+        ticker, count = head
+        yield ticker, stream.tell(), count
+        stream.seek(count * 16, 1)
+
+
+def read_columns(stream: BinaryIO, offset: int, count: int) -> Tuple[array, array]:
+    stream.seek(offset)
+    return _read_column(stream, "q", count), _read_column(stream, "d", count)
+
+
+async def iter_export(
+        db: StorageBackend,
+        tickers: Sequence[str],
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        chunk_size: int = settings.archive_chunk_size,
+) -> AsyncIterator[bytes]:
+    yield encode_header()
+    for ticker in tickers:
+        async for chunk in db.iter_prices(ticker, start, end, chunk_size=chunk_size):
+            timestamps = array("q", [row[2] for row in chunk])
+            prices = array("d", [row[1] for row in chunk])
+            yield encode_block(ticker, timestamps, prices)
+
+
+async def import_blocks(
+        db: StorageBackend,
+        blocks: Iterable[Block],
+        batch_rows: int = settings.archive_import_batch_rows,
+) -> int:
+    """
+    Загружает блоки транзакциями по batch_rows строк и обновляет кэш последних цен.
+    Уже зафиксированные пачки при ошибке в следующих блоках не откатываются.
+    """
+    batch: List[Tuple[str, float, int]] = []
+    total = 0
+    for ticker, timestamps, prices in blocks:
+        if not timestamps:
+            continue
+        if min(prices) < 0:
+            raise ValueError("Price cannot be negative.")
+        batch.extend(zip(repeat(ticker), prices, timestamps))
+        if len(batch) >= batch_rows:
+            total += await db.import_prices_bulk(batch)
+            batch = []
+    if batch:
+        total += await db.import_prices_bulk(batch)
+    if total:
+        await db.refresh_latest_cache()
+    return total
+
+
+async def export_file(db_url: str, path: str, tickers: Sequence[str], start: Optional[int], end: Optional[int]) -> int:
+    db = create_storage(db_url)
+    await db.initialize()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            async for data in iter_export(db, tickers, start, end):
+                out.write(data)
+                size += len(data)
+    finally:
+        await db.close()
+    return size
+
+
+async def import_file(db_url: str, path: str) -> int:
+    db = create_storage(db_url)
+    await db.initialize()
+    try:
+        with open(path, "rb") as stream:
+            return await import_blocks(db, read_blocks(stream))
+    finally:
+        await db.close()
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.archive", description="Export and import price history.")
+    parser.add_argument("--db", default=settings.database_url)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Write price history into an archive file.")
+    export.add_argument("--out", required=True)
+    export.add_argument("--ticker", action="append", required=True, dest="tickers")
+    export.add_argument("--start", type=int, default=None)
+    export.add_argument("--end", type=int, default=None)
+    load = subparsers.add_parser("import", help="Load an archive file into crypto_prices.")
+    load.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        size = asyncio.run(export_file(args.db, args.out, args.tickers, args.start, args.end))
+        print(f"Wrote {size} bytes to {args.out}")
+    elif args.command == "import":
+        rows = asyncio.run(import_file(args.db, args.path))
+        print(f"Imported {rows} rows from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
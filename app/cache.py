@@ -0,0 +1,35 @@
+from typing import Dict, Iterable, Optional
+
+from app.models import PriceResponse
+
+
+class LatestPriceCache:
+    """
+    Последняя известная цена по каждому тикеру.
+
+    Кэш обновляется после каждой зафиксированной вставки и никогда не откатывает цену
+    на более старую временную метку, поэтому порядок прихода обновлений не важен.
+    """
+
+    def __init__(self):
+        self._prices: Dict[str, PriceResponse] = {}
+        self.data_version: Optional[int] = None
+
+    def get(self, ticker: str) -> Optional[PriceResponse]:
+        return self._prices.get(ticker)
+
+    def update(self, ticker: str, price: float, timestamp: int):
+        current = self._prices.get(ticker)
+        if current is None or timestamp >= current.timestamp:
+            self._prices[ticker] = PriceResponse(ticker=ticker, price=price, timestamp=timestamp)
+
+    def merge(self, prices: Iterable[PriceResponse]):
+        for item in prices:
+            self.update(item.ticker, item.price, item.timestamp)
+
+    def tickers(self):
+        return list(self._prices)
+
+    def clear(self):
+        self._prices.clear()
+        self.data_version = None
@@ -1,3 +1,5 @@
+from typing import List, Literal, Optional
+
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
 
@@ -5,8 +7,73 @@ from pydantic import ConfigDict
 class Settings(BaseSettings):
     database_url: str = "/app/data/crypto_prices.db"
     fetch_interval: int = 60
+    fetch_missed_tick_policy: Literal["skip", "catch_up"] = "skip"
+    fetch_max_catch_up: int = 5
+    ingestion_mode: Literal["rest", "websocket", "synthetic", "replay"] = "rest"
+    tickers: List[str] = ["btc_usd", "eth_usd"]
+    deribit_api_url: str = "https://www.deribit.com/api/v2"
+    fetch_concurrency: int = 10
+    fetch_timeout: float = 10.0
+    fetch_retries: int = 2
+    fetch_retry_base_delay: float = 0.5
+    fetch_retry_max_delay: float = 5.0
+    circuit_failure_threshold: int = 5
+    circuit_reset_timeout: float = 30.0
+    backfill_enabled: bool = True
+    backfill_max_age: int = 24 * 60 * 60
+    fetch_connection_limit: int = 20
+    fetch_dns_cache_ttl: int = 300
+    fetch_keepalive_timeout: float = 30.0
+    fetch_limit_per_host: int = 0
+    fetch_connect_timeout: Optional[float] = 5.0
+    fetch_max_response_bytes: int = 8 * 1024 * 1024
+    deribit_ws_url: str = "wss://www.deribit.com/ws/api/v2"
+    ws_heartbeat_interval: int = 30
+    ws_reconnect_min_delay: float = 1.0
+    ws_reconnect_max_delay: float = 60.0
     api_host: str = "0.0.0.0"
     api_port: int = 8000
+    db_pool_size: int = 4
+    db_busy_timeout: int = 5000
+    db_health_check_interval: float = 30.0
+    latest_cache_validation_interval: float = 0.5
+    shared_latest_enabled: bool = True
+    shared_latest_capacity: int = 1024
+    shared_latest_name: Optional[str] = None
+    hot_tier_window: int = 24 * 60 * 60
+    stream_chunk_size: int = 1000
+    max_page_size: int = 10000
+    max_batch_tickers: int = 100
+    stream_queue_size: int = 100
+    sse_keepalive_interval: float = 15.0
+    leader_election_enabled: bool = True
+    leader_lock_path: Optional[str] = None
+    leader_poll_interval: float = 5.0
+    follower_poll_interval: float = 1.0
+    write_buffer_enabled: bool = False
+    write_buffer_max_rows: int = 1000
+    write_buffer_flush_interval: float = 1.0
+    partition_maintenance_interval: float = 3600.0
+    partition_retention_days: Optional[int] = None
+    partition_move_chunk_size: int = 2000
+    partition_vacuum_pages: int = 256
+    archive_chunk_size: int = 100000
+    archive_import_batch_rows: int = 500000
+    http_cache_enabled: bool = True
+    http_cache_max_entries: int = 1024
+    http_cache_max_bytes: int = 64 * 1024 * 1024
+    http_cache_max_entry_bytes: int = 4 * 1024 * 1024
+    http_cache_immutable_ttl: int = 24 * 60 * 60
+    http_cache_tick_grace: float = 1.0
+    metrics_enabled: bool = True
+    synthetic_tickers: int = 0
+    synthetic_rate: float = 1.0
+    synthetic_volatility: float = 0.0005
+    synthetic_seed: Optional[int] = None
+    replay_path: Optional[str] = None
+    replay_speed: float = 1.0
+    replay_max_rows_per_tick: int = 100000
+    replay_rebase: bool = True
 
     model_config = ConfigDict(env_prefix="", env_file=".env")
 
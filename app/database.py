@@ -1,82 +1,540 @@
+import asyncio
 import os
-import aiosqlite
-from typing import List, Optional, Tuple
-from app.models import PriceResponse
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+from app.models import OHLCResponse, PriceResponse
 from app.config import settings
+from app.pool import ConnectionPool
+from app.migrations import migrate
+from app.cache import LatestPriceCache
+from app.hot_tier import HotTier
+from app.leader import FileLeaderLock, LeaderLock
+from app.shared_latest import SharedLatestPrices, segment_name
+from app.metrics import DB_QUERY_SECONDS, DB_ROWS, instrument
+from app.storage import (
+    PageCursor, PriceRow, StorageBackend, rewrites_history, sqlite_path, validate_price_row
+)
+from app import partitions, rollups
 import logging
 
 LOG = logging.getLogger(__name__)
 
+ITER_LATENCY = DB_QUERY_SECONDS.labels("sqlite", "iter_prices")
+ITER_ROWS = DB_ROWS.labels("sqlite", "iter_prices")
 
-class Database:
-    def __init__(self, db_url: str = settings.database_url):
+# Последняя цена по каждому тикеру без полного прохода по индексу: рекурсивный CTE
+# перебирает различные тикеры прыжками по индексу (ticker, timestamp, price).
+# Выполняется отдельно для головы и каждой секции: через представление price_history
+# SQLite материализует объединение целиком.
+LATEST_PER_TICKER_QUERY = '''
+    WITH RECURSIVE tickers(ticker) AS (
+        SELECT MIN(ticker) FROM {table}
+        UNION ALL
+        SELECT (SELECT MIN(ticker) FROM {table} WHERE ticker > tickers.ticker)
+        FROM tickers WHERE tickers.ticker IS NOT NULL
+    )
+    SELECT latest.ticker, latest.price, latest.timestamp
+    FROM tickers
+    JOIN {table} AS latest ON latest.rowid = (
+        SELECT rowid FROM {table}
+        WHERE ticker = tickers.ticker ORDER BY timestamp DESC LIMIT 1
+    )
+'''
+
+# Свечи по корзинам фиксированной длины. Корзина — начало интервала, округлённое вниз
+# (в том числе для отрицательных timestamp); open/close берутся оконными функциями.
+OHLC_QUERY = '''
+    SELECT bucket, open, MAX(price), MIN(price), close, COUNT(*), AVG(price)
+    FROM (
+        SELECT price, bucket,
+               FIRST_VALUE(price) OVER (PARTITION BY bucket ORDER BY timestamp, rid) AS open,
+               FIRST_VALUE(price) OVER (PARTITION BY bucket ORDER BY timestamp DESC, rid DESC) AS close
+        FROM (
+            SELECT price, timestamp, rid, timestamp - ((timestamp % ?) + ?) % ? AS bucket
+            FROM price_history WHERE {where}
+        )
+    )
+    GROUP BY bucket
+    ORDER BY bucket
+'''
+
+
+class Database(StorageBackend):
+    def __init__(
+            self,
+            db_url: str = settings.database_url,
+            pool_size: int = settings.db_pool_size,
+            latest_cache_validation_interval: float = settings.latest_cache_validation_interval,
+            hot_tier_window: int = settings.hot_tier_window,
+    ):
         self.db_url = db_url
-        self.conn = None
+        self.path = sqlite_path(db_url)
+        self.pool = ConnectionPool(self.path, size=pool_size)
+        self.latest_cache = LatestPriceCache()
+        self.latest_cache_validation_interval = latest_cache_validation_interval
+        self._latest_cache_checked_at = 0.0
+        self._latest_cache_lock = asyncio.Lock()
+        self.hot_tier = HotTier(hot_tier_window)
+        self._hot_tier_lock = asyncio.Lock()
+        # Горячий слой содержит все строки головы до _hot_tier_rowid при history_version = _hot_tier_history;
+        # _hot_tier_data_version — data_version соединения на запись на тот же момент.
+        self._hot_tier_rowid = 0
+        self._hot_tier_history: Optional[int] = None
+        self._hot_tier_data_version: Optional[int] = None
+        self._hot_tier_behind = False
+        self.shared_latest: Optional[SharedLatestPrices] = None
+        self._history_version = 0
+        self._history_checked_at: Optional[float] = None
 
     async def initialize(self):
-        os.makedirs(os.path.dirname(self.db_url), exist_ok=True)
-        async with aiosqlite.connect(self.db_url) as db:
-            LOG.info("Connected to database.")
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS crypto_prices (
-                    ticker TEXT,
-                    price REAL,
-                    timestamp INTEGER
+        db_dir = os.path.dirname(self.path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        await self.pool.open()
+        LOG.info("Connected to database.")
+        async with self.pool.writer() as db:
+            version = await migrate(db)
+            LOG.info(f"Database schema is at version {version}.")
+        await self.refresh_latest_cache()
+        LOG.info("Database initialization complete.")
+
+    def leader_lock(self) -> LeaderLock:
+        return FileLeaderLock(settings.leader_lock_path or f"{self.path}.leader")
+
+    def open_shared_latest(
+            self, name: Optional[str] = settings.shared_latest_name, capacity: int = settings.shared_latest_capacity
+    ):
+        """
+        Подключает последние цены в разделяемой памяти (app.shared_latest); пишет в них только процесс,
+        у которого shared_latest.writer, поэтому включать можно лишь при выборе ведущего.
+        """
+        try:
+            self.shared_latest = SharedLatestPrices(name or segment_name(self.path), capacity)
+        except (OSError, ValueError) as e:
+            LOG.warning(f"Shared memory latest prices are disabled: {e}")
+
+    def _publish_latest(self, tickers: Iterable[str]):
+        shared = self.shared_latest
+        if shared is None or not shared.writer:
+            return
+        for ticker in tickers:
+            price = self.latest_cache.get(ticker)
+            if price is not None:
+                shared.update(ticker, price.price, price.timestamp)
+
+    async def rebuild_shared_latest(self):
+        """
+        Делает процесс писателем в разделяемую память и заполняет её заново из базы. Вызывается новым
+        ведущим: сегмент мог остаться от прежнего ведущего, в том числе для пересозданной базы или
+        с ценами из будущего после воспроизведения.
+        """
+        if self.shared_latest is None:
+            return
+        self.shared_latest.writer = True
+        await self.refresh_latest_cache(replace=True)
+
+    @instrument("sqlite")
+    async def refresh_latest_cache(self, replace: bool = False):
+        """
+        Дополняет кэш последних цен из базы; при replace кэш и разделяемая память сначала очищаются,
+        чтобы не пережили цены, которых в базе уже нет.
+        """
+        async with self._latest_cache_lock:
+            data_version = await self.pool.data_version()
+            rows = []
+            async with self.pool.reader() as db:
+                # Одна читающая транзакция: перенос строк в секции не должен попасть между запросами.
+                await db.execute('BEGIN')
+                try:
+                    tables = [name for name, _, _ in await partitions.list_partitions(db)]
+                    for table in (*tables, partitions.HEAD_TABLE):
+                        async with db.execute(LATEST_PER_TICKER_QUERY.format(table=table)) as cursor:
+                            rows.extend(await cursor.fetchall())
+                    history, _ = await self._hot_tier_marks(db)
+                finally:
+                    await db.rollback()
+            # Между очисткой и заполнением нет await: читатели процесса не увидят пустой кэш.
+            if replace:
+                self.latest_cache.clear()
+                if self.shared_latest is not None and self.shared_latest.writer:
+                    self.shared_latest.reset()
+            self.latest_cache.merge(PriceResponse(ticker=row[0], price=row[1], timestamp=row[2]) for row in rows)
+            self.latest_cache.data_version = data_version
+            self._latest_cache_checked_at = time.monotonic()
+            self._publish_latest(self.latest_cache.tickers())
+            # Новые строки других процессов догружаются в горячий слой по rowid при следующем запросе;
+            # перечитывать окно целиком нужно, только если менялась закрытая история или строки переносились.
+            if history != self._hot_tier_history:
+                self.hot_tier.invalidate()
+            else:
+                self._hot_tier_behind = True
+
+    async def _validate_caches(self):
+        # Вставки этого процесса попадают в кэши сразу. Записи других процессов (несколько воркеров
+        # uvicorn) обнаруживаются по PRAGMA data_version не чаще раза в validation_interval.
+        if time.monotonic() - self._latest_cache_checked_at < self.latest_cache_validation_interval:
+            return
+        self._latest_cache_checked_at = time.monotonic()
+        if await self.pool.data_version() != self.latest_cache.data_version:
+            await self.refresh_latest_cache()
+
+    async def history_version(self) -> int:
+        # Счётчик меняют и другие процессы (импорт архива), поэтому он перечитывается не чаще раза
+        # в validation_interval; собственная запись сбрасывает отметку проверки.
+        checked_at = self._history_checked_at
+        if checked_at is None or time.monotonic() - checked_at >= self.latest_cache_validation_interval:
+            async with self.pool.reader() as db:
+                async with db.execute('SELECT version FROM history_version') as cursor:
+                    row = await cursor.fetchone()
+            self._history_version = row[0]
+            self._history_checked_at = time.monotonic()
+        return self._history_version
+
+    async def _write_rows(self, rows: Sequence[PriceRow]):
+        # Вставка и дополнение горячего слоя под одной блокировкой с его загрузкой, иначе строки
+        # могут попасть в слой дважды или потеряться. Слой дополняется напрямую, только если после
+        # его загрузки не было коммитов других процессов; иначе строки догрузятся вместе с их записями.
+        async with self._hot_tier_lock:
+            async with self.pool.writer() as db:
+                async with db.execute('PRAGMA data_version') as result:
+                    synced = not self._hot_tier_behind and (await result.fetchone())[0] == self._hot_tier_data_version
+                await db.executemany(
+                    'INSERT INTO crypto_prices (ticker, price, timestamp) VALUES (?, ?, ?)',
+                    rows
                 )
-            ''')
-            LOG.info("Table 'crypto_prices' ensured.")
-            await db.commit()
-            LOG.info("Database initialization complete.")
-
-    async def insert_price(self, ticker: str, price: float, timestamp: int):
-        if price < 0:
-            LOG.error(f"Attempted to insert negative price: {price}")
-            raise ValueError("Price cannot be negative.")
-
-        async with aiosqlite.connect(self.db_url) as db:
-            await db.execute(
-                'INSERT INTO crypto_prices (ticker, price, timestamp) VALUES (?, ?, ?)',
-                (ticker, price, timestamp)
+                async with db.execute('SELECT last_insert_rowid()') as result:
+                    last_rowid = (await result.fetchone())[0]
+                await rollups.apply_rows(db, rows)
+                history = rewrites_history(rows, time.time())
+                if history:
+                    await db.execute('UPDATE history_version SET version = version + 1')
+            if history:
+                self._history_checked_at = None
+            if synced:
+                self.hot_tier.extend(rows)
+                self._hot_tier_rowid = last_rowid
+            else:
+                self._hot_tier_behind = True
+
+    @staticmethod
+    async def _hot_tier_marks(db) -> Tuple[int, int]:
+        async with db.execute(
+            'SELECT (SELECT version FROM history_version), (SELECT MAX(rowid) FROM crypto_prices)'
+        ) as result:
+            history, last_rowid = await result.fetchone()
+        return history, last_rowid or 0
+
+    @instrument("sqlite")
+    async def reload_hot_tier(self):
+        async with self._hot_tier_lock:
+            if not self.hot_tier.stale:
+                return
+            since = int(time.time()) - self.hot_tier.window
+            data_version = await self.pool.data_version()
+            rows = []
+            async with self.pool.reader() as db:
+                await db.execute('BEGIN')
+                try:
+                    history, last_rowid = await self._hot_tier_marks(db)
+                    for ticker in self.latest_cache.tickers():
+                        async with db.execute(
+                            'SELECT ticker, price, timestamp FROM price_history WHERE ticker = ? AND timestamp >= ?',
+                            (ticker, since)
+                        ) as result:
+                            rows.extend(await result.fetchall())
+                finally:
+                    await db.rollback()
+            self.hot_tier.load(since, rows)
+            self._hot_tier_rowid, self._hot_tier_history = last_rowid, history
+            self._hot_tier_data_version = data_version
+            self._hot_tier_behind = False
+
+    @instrument("sqlite")
+    async def catch_up_hot_tier(self):
+        """
+        Догружает в горячий слой строки, вставленные другими процессами после последней загрузки:
+        новые строки всегда попадают в голову, поэтому достаточно прочитать её хвост по rowid.
+        """
+        async with self._hot_tier_lock:
+            if self.hot_tier.stale or not self._hot_tier_behind:
+                return
+            data_version = await self.pool.data_version()
+            rows = []
+            async with self.pool.reader() as db:
+                await db.execute('BEGIN')
+                try:
+                    history, last_rowid = await self._hot_tier_marks(db)
+                    if history == self._hot_tier_history:
+                        async with db.execute(
+                            'SELECT ticker, price, timestamp FROM crypto_prices WHERE rowid > ? AND timestamp >= ?',
+                            (self._hot_tier_rowid, self.hot_tier.since)
+                        ) as result:
+                            rows = await result.fetchall()
+                finally:
+                    await db.rollback()
+            if history != self._hot_tier_history:
+                self.hot_tier.invalidate()
+                return
+            self.hot_tier.extend(rows)
+            self._hot_tier_rowid = last_rowid
+            self._hot_tier_data_version = data_version
+            self._hot_tier_behind = False
+
+    async def _hot_tier_covers(self, lower: int) -> bool:
+        await self._validate_caches()
+        if self._hot_tier_behind:
+            await self.catch_up_hot_tier()
+        if self.hot_tier.stale and lower >= int(time.time()) - self.hot_tier.window:
+            await self.reload_hot_tier()
+        return not self._hot_tier_behind and self.hot_tier.covers(lower)
+
+    @instrument("sqlite")
+    async def insert_prices_bulk(self, rows: Iterable[PriceRow]) -> int:
+        rows: Sequence[PriceRow] = list(rows)
+        for row in rows:
+            validate_price_row(*row)
+        if not rows:
+            return 0
+
+        await self._write_rows(rows)
+        for ticker, price, timestamp in rows:
+            self.latest_cache.update(ticker, price, timestamp)
+        self._publish_latest({row[0] for row in rows})
+        return len(rows)
+
+    @instrument("sqlite")
+    async def import_prices_bulk(self, rows: Sequence[PriceRow]) -> int:
+        """
+        Вставка больших пачек без построчной валидации и обновления кэша последних цен:
+        вызывающий проверяет строки сам и после загрузки вызывает refresh_latest_cache.
+        """
+        await self._write_rows(rows)
+        return len(rows)
+
+    @staticmethod
+    def _price_filters(
+            ticker: str,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            after_timestamp: Optional[int] = None,
+            cursor: Optional[PageCursor] = None,
+    ) -> Tuple[str, List]:
+        conditions = ['ticker = ?']
+        params: List = [ticker]
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp <= ?')
+            params.append(end)
+        if after_timestamp is not None:
+            conditions.append('timestamp > ?')
+            params.append(after_timestamp)
+        if cursor is not None:
+            # Строки с ключом курсора пропускаются через OFFSET cursor.skip.
+            conditions.append('(timestamp, price) >= (?, ?)')
+            params += [cursor.timestamp, cursor.price]
+        return ' AND '.join(conditions), params
+
+    async def _select_rows(
+            self,
+            ticker: str,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            after_timestamp: Optional[int] = None,
+            limit: Optional[int] = None,
+            cursor: Optional[PageCursor] = None,
+    ) -> List[PriceRow]:
+        where, params = self._price_filters(ticker, start, end, after_timestamp, cursor)
+        query = f'SELECT ticker, price, timestamp FROM price_history WHERE {where} ORDER BY timestamp, price, rid'
+        if limit is not None or cursor is not None:
+            query += ' LIMIT ? OFFSET ?'
+            params += [-1 if limit is None else limit, 0 if cursor is None else cursor.skip]
+        async with self.pool.reader() as db:
+            async with db.execute(query, params) as result:
+                return await result.fetchall()
+
+    @instrument("sqlite", rows=True)
+    async def get_price_rows(
+            self,
+            ticker: str,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            after_timestamp: Optional[int] = None,
+            limit: Optional[int] = None,
+            cursor: Optional[PageCursor] = None,
+    ) -> List[PriceRow]:
+        """
+        Строки (ticker, price, timestamp) без построения PriceResponse — для быстрых форматов ответа.
+        """
+        bounds = [bound for bound in (
+            start,
+            None if after_timestamp is None else after_timestamp + 1,
+            None if cursor is None else cursor.timestamp,
+        ) if bound is not None]
+        lower = max(bounds) if bounds else None
+        if self.hot_tier.enabled and lower is not None and await self._hot_tier_covers(lower):
+            return self.hot_tier.query(ticker, lower, end, limit, cursor)
+        return await self._select_rows(ticker, start, end, after_timestamp, limit, cursor)
+
+    @instrument("sqlite", rows=True)
+    async def get_prices_batch(
+            self,
+            tickers: Sequence[str],
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            limit: Optional[int] = None,
+    ) -> Dict[str, List[PriceRow]]:
+        """
+        Диапазон цен по нескольким тикерам одним запросом: ticker IN (...), а limit применяется
+        к каждому тикеру отдельно через ROW_NUMBER() по порядку индекса.
+        """
+        result: Dict[str, List[PriceRow]] = {ticker: [] for ticker in tickers}
+        if not result:
+            return result
+        if self.hot_tier.enabled and start is not None and await self._hot_tier_covers(start):
+            return {ticker: self.hot_tier.query(ticker, start, end, limit) for ticker in result}
+
+        conditions = [f"ticker IN ({', '.join('?' * len(result))})"]
+        params: List = list(result)
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp <= ?')
+            params.append(end)
+        query = f'''
+            SELECT ticker, price, timestamp FROM (
+                SELECT ticker, price, timestamp,
+                       ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY timestamp, price, rid) AS position
+                FROM price_history WHERE {' AND '.join(conditions)}
             )
-            await db.commit()
-            LOG.info(f"Inserted price for {ticker}: {price} at {timestamp}")
-
-    async def get_all_prices(self, ticker: str) -> List[PriceResponse]:
-        async with aiosqlite.connect(self.db_url) as db:
-            async with db.execute(
-                    'SELECT ticker, price, timestamp FROM crypto_prices WHERE ticker = ?',
-                    (ticker,)
-            ) as cursor:
-                rows = await cursor.fetchall()
-        return [PriceResponse(ticker=row[0], price=row[1], timestamp=row[2]) for row in rows]
+        '''
+        if limit is not None:
+            query += ' WHERE position <= ?'
+            params.append(limit)
+        query += ' ORDER BY ticker, position'
+        async with self.pool.reader() as db:
+            async with db.execute(query, params) as cursor:
+                for row in await cursor.fetchall():
+                    result[row[0]].append(row)
+        return result
+
+    @instrument("sqlite", rows=True)
+    async def get_latest_prices(self, tickers: Sequence[str]) -> Dict[str, PriceResponse]:
+        result = {}
+        missing = tickers
+        if self.shared_latest is not None:
+            missing = []
+            for ticker in tickers:
+                price = self.shared_latest.get(ticker)
+                if price is None:
+                    missing.append(ticker)
+                else:
+                    result[ticker] = price
+            if not missing:
+                return result
+        await self._validate_caches()
+        for ticker in missing:
+            price = self.latest_cache.get(ticker)
+            if price is not None:
+                result[ticker] = price
+        return result
 
+    @instrument("sqlite")
     async def get_latest_price(self, ticker: str) -> Optional[PriceResponse]:
-        async with aiosqlite.connect(self.db_url) as db:
-            async with db.execute(
-                    '''SELECT ticker, price, timestamp FROM crypto_prices 
-                       WHERE ticker = ? ORDER BY timestamp DESC LIMIT 1''',
-                    (ticker,)
-            ) as cursor:
-                row = await cursor.fetchone()
-        if row:
-            return PriceResponse(ticker=row[0], price=row[1], timestamp=row[2])
-        return None
-
-    async def get_filtered_prices(self, ticker: str, start: Optional[int], end: Optional[int]) -> List[PriceResponse]:
-        async with aiosqlite.connect(self.db_url) as db:
-            if start and end:
-                query = '''
-                    SELECT ticker, price, timestamp FROM crypto_prices 
-                    WHERE ticker = ? AND timestamp BETWEEN ? AND ?
-                '''
-                params: Tuple = (ticker, start, end)
-            else:
-                query = 'SELECT ticker, price, timestamp FROM crypto_prices WHERE ticker = ?'
-                params = (ticker,)
-            async with db.execute(query, params) as cursor:
+        # Разделяемая память одинакова во всех воркерах и не требует проверки data_version;
+        # тикеры, которых в ней нет (не поместились или ведущий ещё не записал), берутся из кэша процесса.
+        if self.shared_latest is not None:
+            price = self.shared_latest.get(ticker)
+            if price is not None:
+                return price
+        await self._validate_caches()
+        return self.latest_cache.get(ticker)
+
+    async def iter_prices(
+            self,
+            ticker: str,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            after_timestamp: Optional[int] = None,
+            limit: Optional[int] = None,
+            chunk_size: int = settings.stream_chunk_size,
+            cursor: Optional[PageCursor] = None,
+    ) -> AsyncIterator[List[PriceRow]]:
+        """
+        Отдаёт строки пачками по chunk_size. Каждая пачка — отдельный keyset-запрос по ключу индекса
+        (timestamp, price, rid),
+        поэтому соединение не удерживается, пока клиент читает ответ, а память не зависит от размера диапазона.
+        """
+        where, params = self._price_filters(ticker, start, end, after_timestamp, cursor)
+        remaining = limit
+        # Уже отданные строки с ключом курсора пропускаются только в первой пачке.
+        skip = 0 if cursor is None else cursor.skip
+        last_key: Optional[Tuple[int, float, int]] = None
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            query = f'SELECT ticker, price, timestamp, rid FROM price_history WHERE {where}'
+            chunk_params = list(params)
+            if last_key is not None:
+                query += ' AND (timestamp, price, rid) > (?, ?, ?)'
+                chunk_params += last_key
+            query += ' ORDER BY timestamp, price, rid LIMIT ? OFFSET ?'
+            chunk_params += [size, skip]
+            skip = 0
+            started = time.perf_counter()
+            async with self.pool.reader() as db:
+                async with db.execute(query, chunk_params) as result:
+                    rows = await result.fetchall()
+            ITER_LATENCY.observe(time.perf_counter() - started)
+            ITER_ROWS.observe(len(rows))
+            if not rows:
+                return
+            last_key = (rows[-1][2], rows[-1][1], rows[-1][3])
+            yield [(row[0], row[1], row[2]) for row in rows]
+            if len(rows) < size:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+
+    @instrument("sqlite", rows=True)
+    async def get_ohlc(
+            self,
+            ticker: str,
+            bucket_seconds: int,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+    ) -> List[OHLCResponse]:
+        rollup = rollups.choose_rollup(bucket_seconds, start, end)
+        if rollup is not None:
+            where, params = rollups.rollup_filters(ticker, start, end)
+            query = rollups.ohlc_query(rollup).format(where=where)
+        else:
+            where, params = self._price_filters(ticker, start, end)
+            query = OHLC_QUERY.format(where=where)
+        async with self.pool.reader() as db:
+            async with db.execute(query, [bucket_seconds] * 3 + params) as cursor:
                 rows = await cursor.fetchall()
-        return [PriceResponse(ticker=row[0], price=row[1], timestamp=row[2]) for row in rows]
+        return [
+            OHLCResponse(
+                ticker=ticker, bucket=row[0], open=row[1], high=row[2], low=row[3], close=row[4],
+                count=row[5], mean=row[6],
+            )
+            for row in rows
+        ]
+
+    @instrument("sqlite")
+    async def rebuild_rollups(self, start: Optional[int] = None, end: Optional[int] = None):
+        async with self.pool.writer() as db:
+            # Свечи старше удалённых по сроку хранения секций — единственная копия этой истории.
+            watermark = await partitions.retention_watermark(db)
+            if watermark is not None and (start is None or start < watermark):
+                start = watermark
+            await rollups.rebuild(db, start, end)
+        LOG.info(f"Rebuilt OHLC rollups for range {start}..{end}.")
 
     async def close(self):
-        if self.conn:
-            await self.conn.close()
+        if self.shared_latest is not None:
+            self.shared_latest.close()
+            self.shared_latest = None
+        await self.pool.close()
@@ -0,0 +1,112 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PriceRow = Tuple[str, float, int]
+
+
+class _Series:
+    def __init__(self):
+        self.timestamps = array("q")
+        self.prices = array("d")
+
+    def add(self, price: float, timestamp: int):
+        # Порядок строк совпадает с ORDER BY timestamp, price, rid в SQLite.
+        timestamps, prices = self.timestamps, self.prices
+        if not timestamps or timestamp > timestamps[-1] or (timestamp == timestamps[-1] and price >= prices[-1]):
+            timestamps.append(timestamp)
+            prices.append(price)
+            return
+        lo = bisect_left(timestamps, timestamp)
+        hi = bisect_right(timestamps, timestamp, lo)
+        position = bisect_right(prices, price, lo, hi)
+        timestamps.insert(position, timestamp)
+        prices.insert(position, price)
+
+    def trim(self, since: int):
+        count = bisect_left(self.timestamps, since)
+        if count:
+            del self.timestamps[:count]
+            del self.prices[:count]
+
+
+class HotTier:
+    """
+    Недавняя история (последние window секунд) по каждому тикеру в виде массивов timestamp/price.
+
+    Запрос отдаётся из памяти, только если его нижняя граница не раньше since — момента,
+    начиная с которого в массивах гарантированно есть все строки базы. Старые строки
+    отрезаются, когда их набирается больше, чем trim_slack секунд сверх окна.
+    """
+
+    def __init__(self, window: int, trim_slack: Optional[int] = None):
+        self.window = window
+        self.trim_slack = window // 10 if trim_slack is None else trim_slack
+        self.since: Optional[int] = None
+        self.stale = True
+        self._series: Dict[str, _Series] = {}
+        self._newest: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def load(self, since: int, rows: Iterable[PriceRow]):
+        """
+        Заменяет содержимое строками из базы с timestamp >= since.
+        """
+        self._series = {}
+        self._newest = None
+        self.since = since
+        self.stale = False
+        self.extend(rows)
+
+    def invalidate(self):
+        self.stale = True
+
+    def extend(self, rows: Iterable[PriceRow]):
+        if self.since is None:
+            return
+        for ticker, price, timestamp in rows:
+            if timestamp < self.since:
+                continue
+            series = self._series.get(ticker)
+            if series is None:
+                series = self._series[ticker] = _Series()
+            series.add(price, timestamp)
+            if self._newest is None or timestamp > self._newest:
+                self._newest = timestamp
+        if self._newest is not None and self._newest - self.window - self.trim_slack > self.since:
+            self.since = self._newest - self.window
+            for series in self._series.values():
+                series.trim(self.since)
+
+    def covers(self, lower: Optional[int]) -> bool:
+        return self.enabled and not self.stale and lower is not None and self.since is not None and lower >= self.since
+
+    def query(
+            self,
+            ticker: str,
+            lower: int,
+            end: Optional[int] = None,
+            limit: Optional[int] = None,
+            cursor: Optional[Tuple[int, float, int]] = None,
+    ) -> List[PriceRow]:
+        """
+        cursor — (timestamp, price, skip) из app.storage.PageCursor: начать с ключа (timestamp, price),
+        пропустив skip строк ровно с этим ключом.
+        """
+        series = self._series.get(ticker)
+        if series is None:
+            return []
+        lo = bisect_left(series.timestamps, lower)
+        if cursor is not None:
+            timestamp, price, skip = cursor
+            first = bisect_left(series.timestamps, timestamp)
+            last = bisect_right(series.timestamps, timestamp, first)
+            lo = max(lo, bisect_left(series.prices, price, first, last) + skip)
+        hi = len(series.timestamps) if end is None else bisect_right(series.timestamps, end, lo)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return list(zip(repeat(ticker), series.prices[lo:hi], series.timestamps[lo:hi]))
@@ -0,0 +1,258 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from app.config import settings
+from app.scheduler import TickScheduler
+from app.storage import closed_range_age
+
+CACHEABLE_PATHS = frozenset({
+    "/prices", "/latest_price", "/latest_prices", "/filtered_prices", "/filtered_prices/batch", "/ohlc",
+})
+# Эндпоинты, которые фильтруют по end: только их ответ может относиться к закрытому диапазону.
+RANGE_PATHS = frozenset({"/filtered_prices", "/filtered_prices/batch", "/ohlc"})
+LATEST_PATHS = frozenset({"/latest_price", "/latest_prices"})
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class CachedResponse:
+    def __init__(
+            self,
+            status: int,
+            headers: Headers,
+            body: bytes,
+            last_modified: float,
+            expires_at: float,
+            immutable: bool,
+            history_version: Optional[int] = None,
+    ):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = make_etag(body)
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.immutable = immutable
+        self.history_version = history_version
+
+    def max_age(self, now: float) -> int:
+        return max(0, math.ceil(self.expires_at - now))
+
+
+class ResponseCache:
+    """
+    LRU-кэш готовых ответов, ограниченный и числом записей, и суммарным размером тел.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = settings.http_cache_max_entries,
+            max_bytes: int = settings.http_cache_max_bytes,
+            max_entry_bytes: int = settings.http_cache_max_entry_bytes,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= (time.time() if now is None else now):
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: CachedResponse):
+        if len(entry.body) > self.max_entry_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+response_cache = ResponseCache()
+
+
+def cache_key(path: str, query_string: bytes) -> str:
+    params = sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))
+    return f"{path}?{urlencode(params)}"
+
+
+def cache_ttl(path: str, params: Dict[str, str], now: float) -> Optional[Tuple[float, bool]]:
+    """
+    Время жизни ответа и признак неизменяемости; None — ответ не кэшируется.
+    Диапазон считается закрытым, когда его конец старше closed_range_age(): туда уже не пишут
+    ни загрузка, ни догрузка пропусков. Импорт и воспроизведение прошлого отслеживаются
+    по history_version хранилища.
+    Открытый ответ живёт до следующего тика загрузки (плюс HTTP_CACHE_TICK_GRACE на запись его данных).
+    В режиме websocket цены приходят между тиками, поэтому последние цены не кэшируются.
+    """
+    if path not in CACHEABLE_PATHS or "stream" in params:
+        return None
+    if path in LATEST_PATHS and settings.ingestion_mode == "websocket":
+        return None
+    end = params.get("end")
+    if end is not None and path in RANGE_PATHS:
+        try:
+            closed = int(end) + closed_range_age() < now
+        except ValueError:
+            return None
+        if closed:
+            return settings.http_cache_immutable_ttl, True
+    return next_tick_expiry(now) - now, False
+
+
+def next_tick_expiry(now: float) -> float:
+    """Граница тика загрузки, после которой данные открытого ответа уже могли обновиться."""
+    grace = settings.http_cache_tick_grace
+    return TickScheduler(settings.fetch_interval).next_boundary(now - grace) + grace
+
+
+def _cache_control(entry: CachedResponse, now: float) -> bytes:
+    if entry.immutable:
+        return f"public, max-age={entry.max_age(now)}, immutable".encode()
+    return f"public, max-age={entry.max_age(now)}".encode()
+
+
+def _not_modified(entry: CachedResponse, request_headers: Dict[bytes, bytes]) -> bool:
+    if_none_match = request_headers.get(b"if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.decode("latin-1").split(",")]
+        return "*" in tags or entry.etag in tags or f"W/{entry.etag}" in tags
+    if_modified_since = request_headers.get(b"if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since.decode("latin-1")).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(entry.last_modified) <= since
+    return False
+
+
+async def _history_version(scope) -> Optional[int]:
+    app = scope.get("app")
+    database = getattr(app.state, "database", None) if app is not None else None
+    return None if database is None else await database.history_version()
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI-middleware кэша ответов GET для эндпоинтов цен.
+
+    Ключ — путь и отсортированные параметры запроса. Открытые диапазоны и /latest_price живут
+    fetch_interval секунд, закрытые исторические диапазоны отдаются как immutable и действительны,
+    пока не изменился history_version хранилища из app.state.database. На кэшируемые
+    ответы добавляются ETag, Last-Modified и Cache-Control, If-None-Match/If-Modified-Since дают 304.
+    """
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        now = time.time()
+        params = dict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        ttl = cache_ttl(scope["path"], params, now)
+        if ttl is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        key = cache_key(scope["path"], scope["query_string"])
+        no_cache = b"no-cache" in request_headers.get(b"cache-control", b"")
+        version = await _history_version(scope) if ttl[1] else None
+        entry = None if no_cache else self.cache.get(key, now)
+        if entry is None or entry.history_version != version:
+            entry = await self._fetch(scope, receive, send, ttl, now)
+            if entry is None:
+                return
+            entry.history_version = version
+            self.cache.put(key, entry)
+        await self._send_entry(send, entry, request_headers, now)
+
+    async def _fetch(self, scope, receive, send, ttl: Tuple[float, bool], now: float) -> Optional[CachedResponse]:
+        # Ответ буферизуется целиком, чтобы посчитать ETag до отправки заголовков. Ответы не 200
+        # и слишком большие тела уходят клиенту как есть и в кэш не попадают.
+        start = None
+        chunks: List[bytes] = []
+        size = 0
+        passthrough = False
+
+        async def capture(message):
+            nonlocal start, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                if start["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                return
+            body = message.get("body", b"")
+            chunks.append(body)
+            size += len(body)
+            if size > self.cache.max_entry_bytes:
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                if not message.get("more_body", False):
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        await self.app(scope, receive, capture)
+        if passthrough or start is None:
+            return None
+        body = b"".join(chunks)
+        seconds, immutable = ttl
+        headers = [(name, value) for name, value in start["headers"] if name.lower() != b"content-length"]
+        return CachedResponse(
+            status=start["status"], headers=headers, body=body, last_modified=now, expires_at=now + seconds, immutable=immutable,
+        )
+
+    async def _send_entry(self, send, entry: CachedResponse, request_headers: Dict[bytes, bytes], now: float):
+        validators = [
+            (b"etag", entry.etag.encode()),
+            (b"last-modified", formatdate(entry.last_modified, usegmt=True).encode()),
+            (b"cache-control", _cache_control(entry, now)),
+        ]
+        if _not_modified(entry, request_headers):
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers = entry.headers + validators + [(b"content-length", str(len(entry.body)).encode())]
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,132 @@
+"""
+Выбор ведущего процесса среди воркеров uvicorn.
+
+Цены загружает и пишет только ведущий, остальные процессы лишь отвечают на запросы. Блокировку
+ведущего держит ОС (flock на файле рядом с базой SQLite) или сессия PostgreSQL (advisory lock),
+поэтому при гибели ведущего она освобождается сама и её забирает один из ведомых.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional
+
+from app.config import settings
+
+LOG = logging.getLogger(__name__)
+
+
+class LeaderLock(ABC):
+    @abstractmethod
+    async def acquire(self) -> bool:
+        """
+        Пытается взять блокировку без ожидания.
+        """
+
+    @abstractmethod
+    async def held(self) -> bool:
+        """
+        Проверяет, что уже взятая блокировка всё ещё принадлежит процессу.
+        """
+
+    @abstractmethod
+    async def release(self):
+        ...
+
+
+class FileLeaderLock(LeaderLock):
+    """
+    Эксклюзивный flock на файле. Работает для процессов одной машины.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    async def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    async def held(self) -> bool:
+        return self._fd is not None
+
+    async def release(self):
+        if self._fd is not None:
+            # Закрытие дескриптора снимает flock.
+            os.close(self._fd)
+            self._fd = None
+
+
+class LeaderElection:
+    """
+    Ведомый каждые interval секунд пытается взять блокировку, ведущий проверяет, что она всё ещё его.
+    При избрании вызывается on_elected, при потере блокировки или закрытии — on_demoted.
+    """
+
+    def __init__(
+            self,
+            lock: LeaderLock,
+            on_elected: Callable[[], Awaitable[None]],
+            on_demoted: Callable[[], Awaitable[None]],
+            interval: float = settings.leader_poll_interval,
+    ):
+        self.lock = lock
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.interval = interval
+        self.is_leader = False
+        self.task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> bool:
+        if self.is_leader:
+            if not await self.lock.held():
+                LOG.warning("Lost leadership, stopping ingestion.")
+                self.is_leader = False
+                await self.on_demoted()
+        elif await self.lock.acquire():
+            LOG.info(f"Process {os.getpid()} elected as leader, starting ingestion.")
+            self.is_leader = True
+            await self.on_elected()
+        return self.is_leader
+
+    async def _election_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                LOG.error(f"Error during leader election: {e}")
+
+    async def start(self):
+        # Первая попытка сразу, чтобы единственный процесс начал загрузку без задержки.
+        await self.run_once()
+        if not self.is_leader:
+            LOG.info(f"Process {os.getpid()} is a follower and serves reads only.")
+        self.task = asyncio.create_task(self._election_loop())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self.on_demoted()
+        await self.lock.release()
@@ -1,34 +1,146 @@
 from fastapi import FastAPI
 from app.database import Database
+from app.storage import StorageBackend, create_storage
 from app.services import PriceFetcher
-from app.routers import prices
+from app.sources import create_price_source, source_tickers
+from app.upstream import UpstreamClient
+from app.streaming import PriceStreamer
+from app.write_buffer import WriteBuffer
+from app.partitions import PartitionManager
+from app.routers import archive, metrics, prices, stream
+from app.pubsub import LatestPricePoller, PriceHub
+from app.leader import LeaderElection
+from app.http_cache import ResponseCacheMiddleware
+from app.metrics import MetricsMiddleware
 from app.config import settings
 from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import Request
 
 
+def create_price_fetcher(
+        db: StorageBackend,
+        buffer: Optional[WriteBuffer] = None,
+        hub: Optional[PriceHub] = None,
+        client: Optional[UpstreamClient] = None,
+) -> PriceFetcher:
+    if settings.ingestion_mode == "websocket":
+        return PriceStreamer(db=db, buffer=buffer, hub=hub, client=client)
+    return PriceFetcher(
+        db=db, buffer=buffer, hub=hub, client=client, source=create_price_source(settings.ingestion_mode)
+    )
+
+
+class Ingestion:
+    """
+    Загрузка цен, буфер записи и обслуживание секций — работают только в ведущем процессе.
+    """
+
+    def __init__(self, db: StorageBackend, hub: PriceHub, client: Optional[UpstreamClient] = None):
+        self.db = db
+        self.hub = hub
+        self.client = client
+        self.buffer: Optional[WriteBuffer] = None
+        self.price_fetcher: Optional[PriceFetcher] = None
+        self.partition_manager: Optional[PartitionManager] = None
+
+    async def start(self):
+        if isinstance(self.db, Database):
+            await self.db.rebuild_shared_latest()
+
+        if settings.write_buffer_enabled:
+            self.buffer = WriteBuffer(self.db)
+            await self.buffer.start()
+
+        self.price_fetcher = create_price_fetcher(self.db, self.buffer, self.hub, self.client)
+        await self.price_fetcher.start()
+
+        # Секционирование и сжатие файла нужны только SQLite.
+        if isinstance(self.db, Database):
+            self.partition_manager = PartitionManager(self.db)
+            await self.partition_manager.start()
+
+    async def stop(self):
+        if self.partition_manager is not None:
+            await self.partition_manager.close()
+            self.partition_manager = None
+        if self.price_fetcher is not None:
+            await self.price_fetcher.shutdown()
+            self.price_fetcher = None
+        if self.buffer is not None:
+            await self.buffer.close()
+            self.buffer = None
+        if isinstance(self.db, Database) and self.db.shared_latest is not None:
+            self.db.shared_latest.writer = False
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    db = Database()
+    db = create_storage(settings.database_url)
     await db.initialize()
 
-    price_fetcher = PriceFetcher(db=db)
-    await price_fetcher.start()
+    hub = PriceHub()
+    # Один пул соединений к Deribit на процесс; переживает смену ведущего.
+    upstream = UpstreamClient()
+    await upstream.start()
+    ingestion = Ingestion(db, hub, upstream)
+    election = None
+    poller = None
+    if settings.leader_election_enabled:
+        # Писатель в разделяемой памяти всегда один — ведущий, поэтому без выбора ведущего она не используется.
+        if settings.shared_latest_enabled and isinstance(db, Database):
+            db.open_shared_latest()
+        # Ведомые не загружают цены, а подпитывают свою шину из хранилища.
+        poller = LatestPricePoller(db, hub, await source_tickers())
+
+        async def on_elected():
+            await poller.close()
+            await ingestion.start()
+
+        async def on_demoted():
+            await ingestion.stop()
+            await poller.start()
+
+        await poller.start()
+        election = LeaderElection(db.leader_lock(), on_elected, on_demoted)
+        await election.start()
+    else:
+        await ingestion.start()
 
     app.state.database = db
+    app.state.hub = hub
+    app.state.upstream = upstream
+    app.state.election = election
 
     try:
         yield
     finally:
-        await price_fetcher.shutdown()
+        hub.close()
+        if election is not None:
+            await election.close()
+            await poller.close()
+        else:
+            await ingestion.stop()
+        await upstream.close()
+        await db.close()
 
 
 app = FastAPI(lifespan=lifespan)
 
+if settings.http_cache_enabled:
+    app.add_middleware(ResponseCacheMiddleware)
+if settings.metrics_enabled:
+    # Добавлен последним, то есть снаружи кэша: ответы из кэша тоже попадают в гистограмму.
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(prices.router)
+app.include_router(stream.router)
+app.include_router(archive.router)
+if settings.metrics_enabled:
+    app.include_router(metrics.router)
 
 
-async def get_db(request: Request) -> Database:
+async def get_db(request: Request) -> StorageBackend:
     return request.app.state.database
 
 
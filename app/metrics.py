@@ -0,0 +1,288 @@
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Счётчики и гистограммы — простые объекты в памяти без блокировок: всё выполняется в одном
+цикле событий, поэтому запись значения стоит единицы микросекунд (bisect по границам корзин
+и два сложения). Дочерняя серия для набора меток создаётся один раз и кэшируется, на горячих путях
+её стоит получить заранее через labels(). Каждый воркер uvicorn отдаёт свои значения.
+"""
+import functools
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    # Экранирование значения метки по текстовому формату Prometheus: \\, \" и \n.
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    @abstractmethod
+    def _new_child(self):
+        ...
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _samples(self) -> Iterable[str]:
+        ...
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for key, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Счётчики хранятся по корзинам, накопительные суммы считаются только при выдаче.
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self):
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts):
+                cumulative += count
+                labels = _format_labels((*self.labelnames, "le"), (*key, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+UPSTREAM_FETCH_SECONDS = REGISTRY.histogram(
+    "upstream_fetch_duration_seconds", "Time to fetch one ticker from Deribit, retries included.", ("ticker",)
+)
+UPSTREAM_FAILURES = REGISTRY.counter(
+    "upstream_fetch_failures_total", "Ticker fetches that returned no price.", ("ticker",)
+)
+UPSTREAM_RETRIES = REGISTRY.counter("upstream_retries_total", "Retried upstream requests.")
+CIRCUIT_REJECTIONS = REGISTRY.counter(
+    "upstream_circuit_rejections_total", "Upstream requests skipped while the circuit breaker was open."
+)
+UPSTREAM_REQUEST_SECONDS = REGISTRY.histogram(
+    "upstream_request_duration_seconds", "Latency of single upstream HTTP requests.", ("host",)
+)
+UPSTREAM_CONNECTIONS = REGISTRY.counter(
+    "upstream_connections_total", "Connections used for upstream requests, new or reused from the pool.",
+    ("host", "reused"),
+)
+UPSTREAM_CONNECT_SECONDS = REGISTRY.histogram(
+    "upstream_connect_duration_seconds", "Time to open a new upstream connection, TLS included.", ("host",)
+)
+UPSTREAM_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "upstream_pool_wait_seconds", "Time spent waiting for a free upstream connection.", ("host",)
+)
+TICK_SECONDS = REGISTRY.histogram("fetch_tick_duration_seconds", "Duration of a fetch tick, storage included.")
+TICK_LAG_SECONDS = REGISTRY.histogram("fetch_tick_lag_seconds", "Delay between a tick boundary and its start.")
+TICKS_SKIPPED = REGISTRY.counter("fetch_ticks_skipped_total", "Tick boundaries skipped after an overrun.")
+BACKFILLED_ROWS = REGISTRY.counter("fetch_backfilled_rows_total", "Prices restored from the history endpoint.")
+STORED_ROWS = REGISTRY.counter("fetch_stored_rows_total", "Prices handed to storage by the ingestion loop.")
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Latency of storage operations.", ("backend", "method")
+)
+DB_ROWS = REGISTRY.histogram(
+    "db_rows_returned", "Rows returned by storage reads.", ("backend", "method"), buckets=ROW_BUCKETS
+)
+DB_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection.", ("backend", "mode")
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latency of HTTP requests per route.", ("method", "route", "status")
+)
+
+
+def _row_count(result) -> int:
+    if isinstance(result, dict):
+        return sum(len(rows) if isinstance(rows, list) else 1 for rows in result.values())
+    if isinstance(result, list):
+        return len(result)
+    return 0 if result is None else 1
+
+
+def instrument(backend: str, method: Optional[str] = None, rows: bool = False) -> Callable:
+    """
+    Декоратор асинхронного метода хранилища: время выполнения и, при rows=True, число строк в ответе.
+    """
+
+    def decorator(func):
+        name = method or func.__name__
+        latency = DB_QUERY_SECONDS.labels(backend, name)
+        returned = DB_ROWS.labels(backend, name)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            finally:
+                latency.observe(time.perf_counter() - started)
+            if rows:
+                returned.observe(_row_count(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware времени ответа по шаблону маршрута (/prices, а не /prices?ticker=...), чтобы число
+    серий не зависело от параметров запросов. Для потоковых ответов учитывается время до конца тела.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            route = _route_label(scope)
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, status).observe(time.perf_counter() - started)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is None and "app" in scope:
+        # Ответ ушёл раньше маршрутизации (например, из кэша ответов): маршрут ищется по пути.
+        for candidate in scope["app"].router.routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or "unmatched"
@@ -0,0 +1,65 @@
+import logging
+from typing import List, Sequence, Tuple
+
+import aiosqlite
+
+from app import partitions, rollups
+
+LOG = logging.getLogger(__name__)
+
+# Версия схемы хранится в PRAGMA user_version. Миграции только добавляются в конец списка,
+# уже выпущенные миграции не редактируются.
+MIGRATIONS: List[Tuple[int, str, Sequence[str]]] = [
+    (1, "create crypto_prices", (
+        '''
+        CREATE TABLE IF NOT EXISTS crypto_prices (
+            ticker TEXT,
+            price REAL,
+            timestamp INTEGER
+        )
+        ''',
+    )),
+    (2, "covering index on crypto_prices (ticker, timestamp)", (
+        '''
+        CREATE INDEX IF NOT EXISTS idx_crypto_prices_ticker_timestamp
+        ON crypto_prices (ticker, timestamp, price)
+        ''',
+        'ANALYZE crypto_prices',
+    )),
+    (3, "OHLC rollup tables (1m/1h/1d) backfilled from crypto_prices", rollups.migration_statements()),
+    (4, "partition registry and price_history view", partitions.migration_statements()),
+    (5, "history_version counter for the response cache", (
+        'CREATE TABLE IF NOT EXISTS history_version (version INTEGER NOT NULL)',
+        'INSERT INTO history_version (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM history_version)',
+    )),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    async with db.execute('PRAGMA user_version') as cursor:
+        row = await cursor.fetchone()
+    return row[0]
+
+
+async def migrate(db: aiosqlite.Connection) -> int:
+    """
+    Применяет недостающие миграции. Каждая миграция выполняется в отдельной транзакции
+    BEGIN IMMEDIATE, поэтому несколько процессов, стартующих одновременно, не применят её дважды.
+    """
+    for version, description, statements in MIGRATIONS:
+        await db.execute('BEGIN IMMEDIATE')
+        try:
+            if await get_schema_version(db) >= version:
+                await db.rollback()
+                continue
+            LOG.info("Applying migration %d: %s", version, description)
+            for statement in statements:
+                await db.execute(statement)
+            await db.execute(f'PRAGMA user_version = {version}')
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+    return await get_schema_version(db)
@@ -1,3 +1,5 @@
+from typing import Dict, Literal
+
 from pydantic import BaseModel, ConfigDict
 
 
@@ -7,3 +9,26 @@ class PriceResponse(BaseModel):
     timestamp: int
 
     model_config = ConfigDict(from_attributes=True)
+
+
+OHLCBucket = Literal["1m", "5m", "1h", "1d"]
+
+BUCKET_SECONDS: Dict[str, int] = {
+    "1m": 60,
+    "5m": 5 * 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+
+class OHLCResponse(BaseModel):
+    ticker: str
+    bucket: int
+    open: float
+    high: float
+    low: float
+    close: float
+    count: int
+    mean: float
+
+    model_config = ConfigDict(from_attributes=True)
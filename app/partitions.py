@@ -0,0 +1,289 @@
+"""
+Помесячное секционирование истории цен.
+
+Новые цены всегда пишутся в crypto_prices («голова»). Фоновая задача PartitionManager переносит
+строки прошлых месяцев в таблицы crypto_prices_p<YYYYMM>, удаляет секции старше срока хранения
+(свечи в таблицах свёрток при этом остаются как прореженная история) и понемногу возвращает
+освободившиеся страницы файлу. Все чтения идут через представление price_history, которое
+объединяет секции и голову через UNION ALL и пересоздаётся в той же транзакции, что и набор секций.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from app.database import Database
+
+LOG = logging.getLogger(__name__)
+
+HEAD_TABLE = "crypto_prices"
+HISTORY_VIEW = "price_history"
+REGISTRY_TABLE = "price_partitions"
+
+
+def partition_name(timestamp: int) -> str:
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return f"{HEAD_TABLE}_p{moment.year:04d}{moment.month:02d}"
+
+
+def month_bounds(timestamp: int) -> Tuple[int, int]:
+    """
+    Границы календарного месяца (UTC), в который попадает timestamp: [start, end).
+    """
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    start = datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+    if moment.month == 12:
+        end = datetime(moment.year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        end = datetime(moment.year, moment.month + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def create_registry_sql() -> str:
+    return f'''
+        CREATE TABLE IF NOT EXISTS {REGISTRY_TABLE} (
+            name TEXT PRIMARY KEY,
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER NOT NULL,
+            dropped INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    '''
+
+
+def create_partition_sql(name: str) -> List[str]:
+    return [
+        f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            ticker TEXT,
+            price REAL,
+            timestamp INTEGER
+        )
+        ''',
+        f'''
+        CREATE INDEX IF NOT EXISTS idx_{name}_ticker_timestamp
+        ON {name} (ticker, timestamp, price)
+        ''',
+    ]
+
+
+def view_sql(partitions: Sequence[str]) -> List[str]:
+    # rid нужен как стабильный третий компонент keyset-ключа (timestamp, price, rid):
+    # с ним SQLite сливает ветки UNION ALL по индексам, не сортируя результат целиком.
+    branches = [
+        f"SELECT ticker, price, timestamp, rowid AS rid FROM {table}"
+        for table in (*partitions, HEAD_TABLE)
+    ]
+    return [
+        f"DROP VIEW IF EXISTS {HISTORY_VIEW}",
+        f"CREATE VIEW {HISTORY_VIEW} AS {' UNION ALL '.join(branches)}",
+    ]
+
+
+def migration_statements() -> List[str]:
+    return [create_registry_sql(), *view_sql([])]
+
+
+async def list_partitions(db: aiosqlite.Connection) -> List[Tuple[str, int, int]]:
+    query = f"SELECT name, start_ts, end_ts FROM {REGISTRY_TABLE} WHERE NOT dropped ORDER BY start_ts"
+    async with db.execute(query) as cursor:
+        return [tuple(row) for row in await cursor.fetchall()]
+
+
+async def retention_watermark(db: aiosqlite.Connection) -> Optional[int]:
+    """
+    Граница, ниже которой сырые данные удалены по сроку хранения и остались только свечи.
+    """
+    async with db.execute(f"SELECT MAX(end_ts) FROM {REGISTRY_TABLE} WHERE dropped") as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def refresh_view(db: aiosqlite.Connection):
+    partitions = [name for name, _, _ in await list_partitions(db)]
+    for statement in view_sql(partitions):
+        await db.execute(statement)
+
+
+async def ensure_partition(db: aiosqlite.Connection, timestamp: int) -> str:
+    name = partition_name(timestamp)
+    async with db.execute(f"SELECT dropped FROM {REGISTRY_TABLE} WHERE name = ?", (name,)) as cursor:
+        row = await cursor.fetchone()
+    if row is not None and not row[0]:
+        return name
+    start, end = month_bounds(timestamp)
+    for statement in create_partition_sql(name):
+        await db.execute(statement)
+    await db.execute(
+        f"INSERT OR REPLACE INTO {REGISTRY_TABLE} (name, start_ts, end_ts) VALUES (?, ?, ?)", (name, start, end)
+    )
+    await refresh_view(db)
+    return name
+
+
+class PartitionManager:
+    """
+    Фоновое обслуживание секций. Каждая порция работы — отдельная короткая транзакция
+    в pool.writer(), поэтому вставки цикла загрузки ждут не дольше одной порции.
+    """
+
+    def __init__(
+            self,
+            db: "Database",
+            interval: float = settings.partition_maintenance_interval,
+            retention_days: Optional[int] = settings.partition_retention_days,
+            chunk_size: int = settings.partition_move_chunk_size,
+            vacuum_pages: int = settings.partition_vacuum_pages,
+    ):
+        self.db = db
+        self.interval = interval
+        self.retention_days = retention_days
+        self.chunk_size = max(1, chunk_size)
+        self.vacuum_pages = max(1, vacuum_pages)
+        self.task: Optional[asyncio.Task] = None
+
+    async def _head_tickers(self) -> List[str]:
+        query = f'''
+            WITH RECURSIVE tickers(ticker) AS (
+                SELECT MIN(ticker) FROM {HEAD_TABLE}
+                UNION ALL
+                SELECT (SELECT MIN(ticker) FROM {HEAD_TABLE} WHERE ticker > tickers.ticker)
+                FROM tickers WHERE tickers.ticker IS NOT NULL
+            )
+            SELECT ticker FROM tickers WHERE ticker IS NOT NULL
+        '''
+        async with self.db.pool.reader() as conn:
+            async with conn.execute(query) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def _move_chunk(self, ticker: str, cutoff: int) -> int:
+        async with self.db.pool.writer() as conn:
+            async with conn.execute(
+                    f"SELECT MIN(timestamp) FROM {HEAD_TABLE} WHERE ticker = ? AND timestamp < ?", (ticker, cutoff)
+            ) as cursor:
+                oldest = (await cursor.fetchone())[0]
+            if oldest is None:
+                return 0
+            name = await ensure_partition(conn, oldest)
+            start, end = month_bounds(oldest)
+            # Обе выборки идут по одному индексу в одном порядке внутри одной транзакции,
+            # поэтому удаляются ровно те строки, что были скопированы.
+            selection = f'''
+                SELECT rowid FROM {HEAD_TABLE}
+                WHERE ticker = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp, price, rowid LIMIT ?
+            '''
+            params = (ticker, start, min(end, cutoff), self.chunk_size)
+            await conn.execute(
+                f"INSERT INTO {name} (ticker, price, timestamp) "
+                f"SELECT ticker, price, timestamp FROM {HEAD_TABLE} WHERE rowid IN ({selection}) "
+                f"ORDER BY timestamp, price, rowid",
+                params,
+            )
+            cursor = await conn.execute(f"DELETE FROM {HEAD_TABLE} WHERE rowid IN ({selection})", params)
+            # Освободившиеся rowid головы могут достаться новым строкам: горячий слой других процессов,
+            # который догружает голову по rowid, должен перечитать окно целиком.
+            await conn.execute("UPDATE history_version SET version = version + 1")
+            return cursor.rowcount
+
+    async def seal(self, now: Optional[int] = None) -> int:
+        """
+        Переносит строки головы, относящиеся к прошедшим месяцам, в помесячные секции.
+        """
+        cutoff, _ = month_bounds(int(now if now is not None else time.time()))
+        moved = 0
+        for ticker in await self._head_tickers():
+            while True:
+                count = await self._move_chunk(ticker, cutoff)
+                if not count:
+                    break
+                moved += count
+                await asyncio.sleep(0)
+        if moved:
+            LOG.info(f"Moved {moved} rows into monthly partitions.")
+        return moved
+
+    async def apply_retention(self, now: Optional[int] = None) -> List[str]:
+        """
+        Удаляет секции, целиком вышедшие за срок хранения. Свечи в таблицах свёрток не трогаются.
+        """
+        if self.retention_days is None:
+            return []
+        now = int(now if now is not None else time.time())
+        threshold = now - self.retention_days * 24 * 60 * 60
+        dropped = []
+        async with self.db.pool.writer() as conn:
+            for name, _, end in await list_partitions(conn):
+                if end > threshold:
+                    continue
+                await conn.execute(f"UPDATE {REGISTRY_TABLE} SET dropped = 1 WHERE name = ?", (name,))
+                await refresh_view(conn)
+                await conn.execute(f"DROP TABLE IF EXISTS {name}")
+                dropped.append(name)
+            if dropped:
+                await conn.execute("UPDATE history_version SET version = version + 1")
+        if dropped:
+            LOG.info(f"Dropped expired partitions: {', '.join(dropped)}")
+        return dropped
+
+    async def compact(self) -> int:
+        """
+        Возвращает свободные страницы файлу порциями PRAGMA incremental_vacuum и переносит WAL в базу
+        пассивным checkpoint, который не ждёт читателей и писателей.
+        Для баз, созданных без auto_vacuum = INCREMENTAL, нужен однократный VACUUM вручную.
+        """
+        async with self.db.pool.reader() as conn:
+            async with conn.execute("PRAGMA auto_vacuum") as cursor:
+                mode = (await cursor.fetchone())[0]
+        if mode != 2:
+            return 0
+        released = 0
+        while True:
+            async with self.db.pool.writer() as conn:
+                async with conn.execute("PRAGMA freelist_count") as cursor:
+                    free = (await cursor.fetchone())[0]
+                if not free:
+                    break
+                # Через execute() sqlite3 делает лишь один шаг прагмы и освобождает одну страницу;
+                # executescript() выполняет её до конца.
+                await conn.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+                async with conn.execute("PRAGMA freelist_count") as cursor:
+                    step = free - (await cursor.fetchone())[0]
+            if step <= 0:
+                break
+            released += step
+            await asyncio.sleep(0)
+        async with self.db.pool.writer() as conn:
+            async with conn.execute("PRAGMA wal_checkpoint(PASSIVE)") as cursor:
+                await cursor.fetchall()
+        return released
+
+    async def run_once(self, now: Optional[int] = None) -> Dict[str, int]:
+        moved = await self.seal(now)
+        dropped = await self.apply_retention(now)
+        released = await self.compact()
+        return {"moved": moved, "dropped": len(dropped), "released_pages": released}
+
+    async def _maintenance_loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                LOG.error(f"Error during partition maintenance: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        self.task = asyncio.create_task(self._maintenance_loop())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
@@ -0,0 +1,160 @@
+import asyncio
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
+
+from app.config import settings
+from app.metrics import DB_POOL_WAIT_SECONDS
+
+LOG = logging.getLogger(__name__)
+
+READER_WAIT = DB_POOL_WAIT_SECONDS.labels("sqlite", "reader")
+WRITER_WAIT = DB_POOL_WAIT_SECONDS.labels("sqlite", "writer")
+
+# auto_vacuum действует только для ещё пустой базы, поэтому идёт первым.
+PRAGMAS = (
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+)
+
+
+class PoolClosedError(RuntimeError):
+    pass
+
+
+class _PooledConnection:
+    def __init__(self, conn: aiosqlite.Connection):
+        self.conn = conn
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Пул соединений SQLite: одно соединение на запись и несколько соединений на чтение.
+
+    Соединения открываются один раз в open() и живут до close(), поэтому запросы не платят
+    за создание потока aiosqlite и открытие файла. Запись сериализуется блокировкой,
+    чтения идут параллельно благодаря режиму WAL.
+    """
+
+    def __init__(
+            self,
+            db_path: str,
+            size: int = settings.db_pool_size,
+            busy_timeout: int = settings.db_busy_timeout,
+            health_check_interval: float = settings.db_health_check_interval,
+    ):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.busy_timeout = busy_timeout
+        self.health_check_interval = health_check_interval
+        self._writer: Optional[_PooledConnection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: Optional[asyncio.Queue] = None
+        self._all_readers: List[_PooledConnection] = []
+        self._closed = True
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def _connect(self, readonly: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+        await conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        if readonly:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    async def open(self):
+        if not self._closed:
+            return
+        self._writer = _PooledConnection(await self._connect())
+        self._readers = asyncio.Queue()
+        self._all_readers = []
+        for _ in range(self.size):
+            reader = _PooledConnection(await self._connect(readonly=True))
+            self._all_readers.append(reader)
+            self._readers.put_nowait(reader)
+        self._closed = False
+        LOG.info("Connection pool opened: 1 writer, %d readers.", self.size)
+
+    async def _ensure_healthy(self, pooled: _PooledConnection, readonly: bool):
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return
+        try:
+            async with pooled.conn.execute("SELECT 1") as cursor:
+                await cursor.fetchone()
+        except Exception as e:
+            LOG.warning("Replacing unhealthy database connection: %s", e)
+            try:
+                await pooled.conn.close()
+            except Exception:
+                pass
+            pooled.conn = await self._connect(readonly=readonly)
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed.")
+        started = time.perf_counter()
+        pooled = await self._readers.get()
+        READER_WAIT.observe(time.perf_counter() - started)
+        try:
+            await self._ensure_healthy(pooled, readonly=True)
+            yield pooled.conn
+        finally:
+            pooled.last_used = time.monotonic()
+            self._readers.put_nowait(pooled)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Выдаёт соединение на запись; при успешном выходе транзакция фиксируется, при ошибке откатывается.
+        """
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed.")
+        started = time.perf_counter()
+        async with self._write_lock:
+            WRITER_WAIT.observe(time.perf_counter() - started)
+            pooled = self._writer
+            await self._ensure_healthy(pooled, readonly=False)
+            try:
+                yield pooled.conn
+                await pooled.conn.commit()
+            except BaseException:
+                await pooled.conn.rollback()
+                raise
+            finally:
+                pooled.last_used = time.monotonic()
+
+    async def data_version(self) -> int:
+        # data_version соединения на запись меняется только при коммитах других соединений
+        # (в том числе из других процессов), поэтому собственные вставки его не сбивают.
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed.")
+        async with self._writer.conn.execute("PRAGMA data_version") as cursor:
+            row = await cursor.fetchone()
+        return row[0]
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        async with self._write_lock:
+            await self._writer.conn.close()
+        # Дожидаемся возврата всех читателей, чтобы не закрыть соединение посреди запроса.
+        for _ in range(len(self._all_readers)):
+            pooled = await self._readers.get()
+            await pooled.conn.close()
+        self._writer = None
+        self._all_readers = []
+        LOG.info("Connection pool closed.")
@@ -0,0 +1,341 @@
+"""
+Хранилище цен в PostgreSQL (или TimescaleDB) через пул соединений asyncpg.
+
+В отличие от SQLite, здесь нет единственного писателя: несколько процессов загрузки пишут
+одновременно, пачки вставляются через COPY. Если в базе установлено расширение timescaledb,
+crypto_prices превращается в гипертаблицу с месячными чанками по timestamp.
+"""
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from app.config import settings
+from app.leader import FileLeaderLock, LeaderLock
+from app.metrics import DB_POOL_WAIT_SECONDS, DB_QUERY_SECONDS, DB_ROWS, instrument
+from app.models import OHLCResponse, PriceResponse
+from app.storage import (
+    PageCursor, PriceRow, StorageBackend, postgres_dsn, rewrites_history, validate_price_row
+)
+
+LOG = logging.getLogger(__name__)
+
+ITER_LATENCY = DB_QUERY_SECONDS.labels("postgres", "iter_prices")
+ITER_ROWS = DB_ROWS.labels("postgres", "iter_prices")
+POOL_WAIT = DB_POOL_WAIT_SECONDS.labels("postgres", "acquire")
+
+# Ключ pg_advisory_xact_lock: процессы, стартующие одновременно, создают схему по очереди.
+SCHEMA_LOCK_KEY = 0x63727970746f
+LEADER_LOCK_KEY = 0x6c6561646572
+
+HYPERTABLE_CHUNK_SECONDS = 30 * 24 * 60 * 60
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS crypto_prices (
+        id BIGINT GENERATED ALWAYS AS IDENTITY,
+        ticker TEXT NOT NULL,
+        price DOUBLE PRECISION NOT NULL,
+        timestamp BIGINT NOT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_crypto_prices_ticker_timestamp
+    ON crypto_prices (ticker, timestamp, price, id)
+    ''',
+    'CREATE TABLE IF NOT EXISTS history_version (version BIGINT NOT NULL)',
+    'INSERT INTO history_version (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM history_version)',
+)
+
+# Корзина округляется вниз и для отрицательных timestamp, open/close — первая и последняя цена
+# в порядке (timestamp, id), как в OHLC_QUERY для SQLite.
+OHLC_QUERY = '''
+    SELECT bucket,
+           (ARRAY_AGG(price ORDER BY timestamp, id))[1],
+           MAX(price), MIN(price),
+           (ARRAY_AGG(price ORDER BY timestamp DESC, id DESC))[1],
+           COUNT(*), AVG(price)
+    FROM (
+        SELECT price, timestamp, id, timestamp - ((timestamp % $1) + $1) % $1 AS bucket
+        FROM crypto_prices WHERE {where}
+    ) AS bucketed
+    GROUP BY bucket
+    ORDER BY bucket
+'''
+
+
+def _price_filters(
+        ticker: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        after_timestamp: Optional[int] = None,
+        cursor: Optional[PageCursor] = None,
+        first: int = 1,
+) -> Tuple[str, List]:
+    conditions = [f'ticker = ${first}']
+    params: List = [ticker]
+    for condition, value in (('timestamp >= ', start), ('timestamp <= ', end), ('timestamp > ', after_timestamp)):
+        if value is not None:
+            params.append(value)
+            conditions.append(f'{condition}${first + len(params) - 1}')
+    if cursor is not None:
+        # Строки с ключом курсора пропускаются через OFFSET cursor.skip.
+        params += [cursor.timestamp, cursor.price]
+        conditions.append(f'(timestamp, price) >= (${first + len(params) - 2}, ${first + len(params) - 1})')
+    return ' AND '.join(conditions), params
+
+
+class AdvisoryLeaderLock(LeaderLock):
+    """
+    Сессионный pg_advisory_lock на отдельном соединении. Блокировка снимается сервером, когда
+    соединение рвётся, поэтому ведущий проверяет соединение на каждой итерации выбора.
+    """
+
+    def __init__(self, dsn: str, key: int = LEADER_LOCK_KEY):
+        self.dsn = dsn
+        self.key = key
+        self.conn: Optional[asyncpg.Connection] = None
+        self._held = False
+
+    async def acquire(self) -> bool:
+        if self.conn is None or self.conn.is_closed():
+            self.conn = await asyncpg.connect(self.dsn)
+            self._held = False
+        if not self._held:
+            self._held = await self.conn.fetchval('SELECT pg_try_advisory_lock($1)', self.key)
+        return self._held
+
+    async def held(self) -> bool:
+        if not self._held or self.conn is None or self.conn.is_closed():
+            return False
+        try:
+            await self.conn.fetchval('SELECT 1')
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as e:
+            LOG.error(f"Leader lock connection failed: {e}")
+            self._held = False
+            self.conn.terminate()
+            self.conn = None
+        return self._held
+
+    async def release(self):
+        self._held = False
+        if self.conn is not None and not self.conn.is_closed():
+            await self.conn.close()
+        self.conn = None
+
+
+class PostgresStorage(StorageBackend):
+    def __init__(
+            self,
+            db_url: str = settings.database_url,
+            pool_size: int = settings.db_pool_size,
+            history_validation_interval: float = settings.latest_cache_validation_interval,
+    ):
+        self.db_url = db_url
+        self.dsn = postgres_dsn(db_url)
+        self.pool_size = pool_size
+        self.pool: Optional[asyncpg.Pool] = None
+        self.history_validation_interval = history_validation_interval
+        self._history_version = 0
+        self._history_checked_at: Optional[float] = None
+
+    async def initialize(self):
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+        LOG.info("Connected to database.")
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('SELECT pg_advisory_xact_lock($1)', SCHEMA_LOCK_KEY)
+                for statement in SCHEMA:
+                    await conn.execute(statement)
+                timescale = await conn.fetchval("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+                if timescale:
+                    await conn.execute(
+                        "SELECT create_hypertable('crypto_prices', 'timestamp', chunk_time_interval => $1::bigint, "
+                        "if_not_exists => TRUE, migrate_data => TRUE)",
+                        HYPERTABLE_CHUNK_SECONDS,
+                    )
+        LOG.info("Database initialization complete.")
+
+    @asynccontextmanager
+    async def _acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        started = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            POOL_WAIT.observe(time.perf_counter() - started)
+            yield conn
+
+    def leader_lock(self) -> LeaderLock:
+        if settings.leader_lock_path:
+            return FileLeaderLock(settings.leader_lock_path)
+        return AdvisoryLeaderLock(self.dsn)
+
+    @instrument("postgres")
+    async def insert_prices_bulk(self, rows: Iterable[PriceRow]) -> int:
+        rows: Sequence[PriceRow] = list(rows)
+        for row in rows:
+            validate_price_row(*row)
+        if not rows:
+            return 0
+        async with self._acquire() as conn:
+            if not rewrites_history(rows, time.time()):
+                await conn.copy_records_to_table('crypto_prices', records=rows, columns=('ticker', 'price', 'timestamp'))
+                return len(rows)
+            async with conn.transaction():
+                await conn.copy_records_to_table('crypto_prices', records=rows, columns=('ticker', 'price', 'timestamp'))
+                await conn.execute('UPDATE history_version SET version = version + 1')
+        self._history_checked_at = None
+        return len(rows)
+
+    async def history_version(self) -> int:
+        checked_at = self._history_checked_at
+        if checked_at is None or time.monotonic() - checked_at >= self.history_validation_interval:
+            async with self._acquire() as conn:
+                self._history_version = await conn.fetchval('SELECT version FROM history_version')
+            self._history_checked_at = time.monotonic()
+        return self._history_version
+
+    @instrument("postgres", rows=True)
+    async def get_price_rows(
+            self,
+            ticker: str,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            after_timestamp: Optional[int] = None,
+            limit: Optional[int] = None,
+            cursor: Optional[PageCursor] = None,
+    ) -> List[PriceRow]:
+        where, params = _price_filters(ticker, start, end, after_timestamp, cursor)
+        query = f'SELECT ticker, price, timestamp FROM crypto_prices WHERE {where} ORDER BY timestamp, price, id'
+        if limit is not None:
+            params.append(limit)
+            query += f' LIMIT ${len(params)}'
+        if cursor is not None:
+            params.append(cursor.skip)
+            query += f' OFFSET ${len(params)}'
+        async with self._acquire() as conn:
+            return [tuple(row) for row in await conn.fetch(query, *params)]
+
+    @instrument("postgres", rows=True)
+    async def get_prices_batch(
+            self,
+            tickers: Sequence[str],
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            limit: Optional[int] = None,
+    ) -> Dict[str, List[PriceRow]]:
+        result: Dict[str, List[PriceRow]] = {ticker: [] for ticker in tickers}
+        if not result:
+            return result
+        conditions = ['ticker = ANY($1::text[])']
+        params: List = [list(result)]
+        for condition, value in (('timestamp >= ', start), ('timestamp <= ', end)):
+            if value is not None:
+                params.append(value)
+                conditions.append(f'{condition}${len(params)}')
+        query = f'''
+            SELECT ticker, price, timestamp FROM (
+                SELECT ticker, price, timestamp,
+                       ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY timestamp, price, id) AS position
+                FROM crypto_prices WHERE {' AND '.join(conditions)}
+            ) AS numbered
+        '''
+        if limit is not None:
+            params.append(limit)
+            query += f' WHERE position <= ${len(params)}'
+        query += ' ORDER BY ticker, position'
+        async with self._acquire() as conn:
+            for row in await conn.fetch(query, *params):
+                result[row[0]].append(tuple(row))
+        return result
+
+    @instrument("postgres")
+    async def get_latest_price(self, ticker: str) -> Optional[PriceResponse]:
+        async with self._acquire() as conn:
+            row = await conn.fetchrow(
+                'SELECT ticker, price, timestamp FROM crypto_prices WHERE ticker = $1 '
+                'ORDER BY timestamp DESC, price DESC, id DESC LIMIT 1',
+                ticker,
+            )
+        if row is None:
+            return None
+        return PriceResponse(ticker=row[0], price=row[1], timestamp=row[2])
+
+    @instrument("postgres", rows=True)
+    async def get_latest_prices(self, tickers: Sequence[str]) -> Dict[str, PriceResponse]:
+        async with self._acquire() as conn:
+            rows = await conn.fetch(
+                'SELECT DISTINCT ON (ticker) ticker, price, timestamp FROM crypto_prices '
+                'WHERE ticker = ANY($1::text[]) ORDER BY ticker, timestamp DESC, price DESC, id DESC',
+                list(tickers),
+            )
+        latest = {row[0]: PriceResponse(ticker=row[0], price=row[1], timestamp=row[2]) for row in rows}
+        return {ticker: latest[ticker] for ticker in tickers if ticker in latest}
+
+    async def iter_prices(
+            self,
+            ticker: str,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            after_timestamp: Optional[int] = None,
+            limit: Optional[int] = None,
+            chunk_size: int = settings.stream_chunk_size,
+            cursor: Optional[PageCursor] = None,
+    ) -> AsyncIterator[List[PriceRow]]:
+        """
+        Keyset-пачки по (timestamp, price, id), как и в SQLite: соединение возвращается в пул между пачками.
+        """
+        where, params = _price_filters(ticker, start, end, after_timestamp, cursor)
+        remaining = limit
+        last_key: Optional[Tuple[int, float, int]] = None
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            query = f'SELECT ticker, price, timestamp, id FROM crypto_prices WHERE {where}'
+            chunk_params = list(params)
+            if last_key is not None:
+                first = len(chunk_params) + 1
+                query += f' AND (timestamp, price, id) > (${first}, ${first + 1}, ${first + 2})'
+                chunk_params += last_key
+            chunk_params.append(size)
+            query += f' ORDER BY timestamp, price, id LIMIT ${len(chunk_params)}'
+            if cursor is not None and last_key is None:
+                # Уже отданные строки с ключом курсора пропускаются только в первой пачке.
+                chunk_params.append(cursor.skip)
+                query += f' OFFSET ${len(chunk_params)}'
+            started = time.perf_counter()
+            async with self._acquire() as conn:
+                rows = await conn.fetch(query, *chunk_params)
+            ITER_LATENCY.observe(time.perf_counter() - started)
+            ITER_ROWS.observe(len(rows))
+            if not rows:
+                return
+            last_key = (rows[-1][2], rows[-1][1], rows[-1][3])
+            yield [(row[0], row[1], row[2]) for row in rows]
+            if len(rows) < size:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+
+    @instrument("postgres", rows=True)
+    async def get_ohlc(
+            self,
+            ticker: str,
+            bucket_seconds: int,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+    ) -> List[OHLCResponse]:
+        where, params = _price_filters(ticker, start, end, first=2)
+        async with self._acquire() as conn:
+            rows = await conn.fetch(OHLC_QUERY.format(where=where), bucket_seconds, *params)
+        return [
+            OHLCResponse(
+                ticker=ticker, bucket=row[0], open=row[1], high=row[2], low=row[3], close=row[4],
+                count=row[5], mean=row[6],
+            )
+            for row in rows
+        ]
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
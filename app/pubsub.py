@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Sequence, Set
+
+from app.config import settings
+from app.models import PriceResponse
+from app.storage import StorageBackend
+
+LOG = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, hub: "PriceHub", ticker: str, queue_size: int):
+        self.hub = hub
+        self.ticker = ticker
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+        self.closed = False
+
+    def _push(self, item: PriceResponse) -> bool:
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _terminate(self):
+        # Очередь очищается, чтобы гарантированно поместить маркер конца потока.
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[PriceResponse]:
+        if self.closed and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> PriceResponse:
+        item = await self.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class PriceHub:
+    """
+    Внутрипроцессная шина обновлений цен для потоковых подписок.
+
+    Публикация никогда не ждёт подписчиков: у каждого своя ограниченная очередь, и подписчик,
+    не успевший её разобрать, отключается, чтобы не задерживать цикл получения цен.
+    """
+
+    def __init__(self, queue_size: int = settings.stream_queue_size):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._latest: Dict[str, PriceResponse] = {}
+        self.dropped_subscribers = 0
+
+    def subscribe(self, ticker: str) -> Subscription:
+        subscription = Subscription(self, ticker, self.queue_size)
+        self._subscribers.setdefault(ticker, set()).add(subscription)
+        latest = self._latest.get(ticker)
+        if latest is not None:
+            subscription._push(latest)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.ticker)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.ticker]
+        if not subscription.closed:
+            subscription._terminate()
+
+    def subscriber_count(self, ticker: Optional[str] = None) -> int:
+        if ticker is not None:
+            return len(self._subscribers.get(ticker, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, ticker: str, price: float, timestamp: int):
+        current = self._latest.get(ticker)
+        if current is not None and timestamp < current.timestamp:
+            return
+        item = PriceResponse(ticker=ticker, price=price, timestamp=timestamp)
+        self._latest[ticker] = item
+        for subscription in list(self._subscribers.get(ticker, ())):
+            if not subscription._push(item):
+                LOG.warning(f"Dropping slow subscriber for {ticker}")
+                subscription.dropped = True
+                self.dropped_subscribers += 1
+                self.unsubscribe(subscription)
+
+    def publish_rows(self, rows: Iterable):
+        for ticker, price, timestamp in rows:
+            self.publish(ticker, price, timestamp)
+
+    def close(self):
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                self.unsubscribe(subscription)
+
+
+class LatestPricePoller:
+    """
+    Источник обновлений для шины ведомого процесса: цены пишет ведущий, а здесь раз в interval
+    секунд читаются последние цены из хранилища и публикуются только более новые.
+    Подписчики ведомого получают последнюю цену на момент опроса, промежуточные могут пропускаться.
+    """
+
+    def __init__(
+            self,
+            db: StorageBackend,
+            hub: PriceHub,
+            tickers: Optional[Sequence[str]] = None,
+            interval: float = settings.follower_poll_interval,
+    ):
+        self.db = db
+        self.hub = hub
+        self.tickers = list(tickers or settings.tickers)
+        self.interval = interval
+        self._published: Dict[str, int] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    async def poll_once(self) -> int:
+        published = 0
+        for ticker, price in (await self.db.get_latest_prices(self.tickers)).items():
+            last = self._published.get(ticker)
+            if last is None or price.timestamp > last:
+                self._published[ticker] = price.timestamp
+                self.hub.publish(ticker, price.price, price.timestamp)
+                published += 1
+        return published
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                LOG.error(f"Error polling latest prices: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        self.task = asyncio.create_task(self._poll_loop())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
@@ -0,0 +1,80 @@
+import logging
+import random
+import time
+from typing import Callable
+
+LOG = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Экспоненциальная задержка перед повтором номер attempt (с нуля) со случайным разбросом в половину,
+    чтобы процессы и тикеры не повторяли запросы синхронно.
+    """
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для обращений к внешнему сервису.
+
+    После failure_threshold ошибок подряд цепь размыкается (open), и вызовы отклоняются без запроса
+    reset_timeout секунд. Затем пропускается один пробный вызов (half_open): успех замыкает цепь,
+    ошибка снова размыкает её на reset_timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int,
+            reset_timeout: float,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            LOG.info(f"Circuit for {self.name} closed.")
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def cancel_trial(self):
+        """Пробный вызов прерван без результата: следующий вызов снова может стать пробным."""
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+            LOG.warning(f"Circuit for {self.name} opened after {self.failures} failures.")
+            self.opened_at = self.clock()
+        self._trial = False
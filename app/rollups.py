@@ -0,0 +1,253 @@
+"""
+Предрассчитанные свечи (1m/1h/1d) по каждому тикеру.
+
+Таблицы crypto_prices_<rollup> обновляются инкрементально в той же транзакции, что и вставка
+сырых цен, поэтому всегда согласованы с crypto_prices. Пересчёт по существующей истории:
+
+    python -m app.rollups backfill [--start TS] [--end TS]
+"""
+import argparse
+import asyncio
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+from app.config import settings
+
+ROLLUPS: Dict[str, int] = {
+    "1m": 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+RollupKey = Tuple[str, int]
+# open, open_ts, high, low, close, close_ts, count, total
+RollupState = List
+
+
+def rollup_table(name: str) -> str:
+    return f"crypto_prices_{name}"
+
+
+def floor_bucket(timestamp: int, seconds: int) -> int:
+    return timestamp - timestamp % seconds
+
+
+def create_table_sql(name: str) -> str:
+    return f'''
+        CREATE TABLE IF NOT EXISTS {rollup_table(name)} (
+            ticker TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            count INTEGER NOT NULL,
+            total REAL NOT NULL,
+            open_ts INTEGER NOT NULL,
+            close_ts INTEGER NOT NULL,
+            PRIMARY KEY (ticker, bucket)
+        ) WITHOUT ROWID
+    '''
+
+
+def backfill_sql(name: str, where: str = "1", source: str = "crypto_prices", rid: str = "rowid") -> str:
+    seconds = ROLLUPS[name]
+    bucket = f"timestamp - ((timestamp % {seconds}) + {seconds}) % {seconds}"
+    return f'''
+        INSERT OR REPLACE INTO {rollup_table(name)}
+            (ticker, bucket, open, high, low, close, count, total, open_ts, close_ts)
+        SELECT ticker, bucket, open, MAX(price), MIN(price), close, COUNT(*), SUM(price), MIN(timestamp), MAX(timestamp)
+        FROM (
+            SELECT ticker, price, timestamp, bucket,
+                   FIRST_VALUE(price) OVER (PARTITION BY ticker, bucket ORDER BY timestamp, rid) AS open,
+                   FIRST_VALUE(price) OVER (PARTITION BY ticker, bucket ORDER BY timestamp DESC, rid DESC) AS close
+            FROM (SELECT ticker, price, timestamp, {rid} AS rid, {bucket} AS bucket FROM {source} WHERE {where})
+        )
+        GROUP BY ticker, bucket
+    '''
+
+
+def upsert_sql(name: str) -> str:
+    # В SET все ссылки на столбцы без excluded. означают старые значения строки.
+    return f'''
+        INSERT INTO {rollup_table(name)}
+            (ticker, bucket, open, high, low, close, count, total, open_ts, close_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (ticker, bucket) DO UPDATE SET
+            open = CASE WHEN excluded.open_ts < open_ts THEN excluded.open ELSE open END,
+            open_ts = MIN(open_ts, excluded.open_ts),
+            high = MAX(high, excluded.high),
+            low = MIN(low, excluded.low),
+            close = CASE WHEN excluded.close_ts >= close_ts THEN excluded.close ELSE close END,
+            close_ts = MAX(close_ts, excluded.close_ts),
+            count = count + excluded.count,
+            total = total + excluded.total
+    '''
+
+
+def migration_statements() -> List[str]:
+    statements = []
+    for name in ROLLUPS:
+        statements.append(create_table_sql(name))
+        statements.append(backfill_sql(name))
+    return statements
+
+
+def aggregate(rows: Sequence[Tuple[str, float, int]], seconds: int) -> Dict[RollupKey, RollupState]:
+    """
+    Сворачивает пачку строк в частичные свечи, чтобы на каждую корзину приходился один upsert.
+    """
+    buckets: Dict[RollupKey, RollupState] = {}
+    for ticker, price, timestamp in rows:
+        key = (ticker, floor_bucket(timestamp, seconds))
+        state = buckets.get(key)
+        if state is None:
+            buckets[key] = [price, timestamp, price, price, price, timestamp, 1, price]
+            continue
+        if timestamp < state[1]:
+            state[0], state[1] = price, timestamp
+        if price > state[2]:
+            state[2] = price
+        if price < state[3]:
+            state[3] = price
+        if timestamp >= state[5]:
+            state[4], state[5] = price, timestamp
+        state[6] += 1
+        state[7] += price
+    return buckets
+
+
+def coarsen(states: Dict[RollupKey, RollupState], seconds: int) -> Dict[RollupKey, RollupState]:
+    """
+    Собирает частичные свечи более крупной свёртки из свечей более мелкой, кратной ей.
+    """
+    buckets: Dict[RollupKey, RollupState] = {}
+    for (ticker, bucket), part in states.items():
+        key = (ticker, floor_bucket(bucket, seconds))
+        state = buckets.get(key)
+        if state is None:
+            buckets[key] = list(part)
+            continue
+        if part[1] < state[1]:
+            state[0], state[1] = part[0], part[1]
+        if part[2] > state[2]:
+            state[2] = part[2]
+        if part[3] < state[3]:
+            state[3] = part[3]
+        if part[5] >= state[5]:
+            state[4], state[5] = part[4], part[5]
+        state[6] += part[6]
+        state[7] += part[7]
+    return buckets
+
+
+async def apply_rows(db: aiosqlite.Connection, rows: Sequence[Tuple[str, float, int]]):
+    # Строки сворачиваются только в самую мелкую свёртку, крупные собираются из её корзин.
+    states: Optional[Dict[RollupKey, RollupState]] = None
+    for name, seconds in sorted(ROLLUPS.items(), key=lambda item: item[1]):
+        states = aggregate(rows, seconds) if states is None else coarsen(states, seconds)
+        params = [
+            (ticker, bucket, s[0], s[2], s[3], s[4], s[6], s[7], s[1], s[5])
+            for (ticker, bucket), s in states.items()
+        ]
+        await db.executemany(upsert_sql(name), params)
+
+
+async def rebuild(db: aiosqlite.Connection, start: Optional[int] = None, end: Optional[int] = None):
+    """
+    Пересчитывает свечи по сырым данным. Диапазон расширяется до границ корзин каждой свёртки,
+    чтобы пересчитанные корзины были полными.
+    """
+    for name, seconds in ROLLUPS.items():
+        bucket_conditions, raw_conditions, params = [], [], []
+        if start is not None:
+            bucket_conditions.append("bucket >= ?")
+            raw_conditions.append("timestamp >= ?")
+            params.append(floor_bucket(start, seconds))
+        if end is not None:
+            bucket_conditions.append("bucket <= ?")
+            raw_conditions.append("timestamp < ?")
+            params.append(floor_bucket(end, seconds))
+        raw_params = list(params)
+        if end is not None:
+            raw_params[-1] += seconds
+        await db.execute(
+            f"DELETE FROM {rollup_table(name)} WHERE {' AND '.join(bucket_conditions) or '1'}", params
+        )
+        where = " AND ".join(raw_conditions) or "1"
+        await db.execute(backfill_sql(name, where, source="price_history", rid="rid"), raw_params)
+
+
+def choose_rollup(bucket_seconds: int, start: Optional[int], end: Optional[int]) -> Optional[str]:
+    """
+    Выбирает самую грубую свёртку, из которой можно собрать свечи запрошенного размера
+    без искажения границ диапазона; None — считать по сырым данным.
+    """
+    for name, seconds in sorted(ROLLUPS.items(), key=lambda item: -item[1]):
+        if bucket_seconds % seconds:
+            continue
+        if start is not None and start % seconds:
+            continue
+        if end is not None and (end + 1) % seconds:
+            continue
+        return name
+    return None
+
+
+def ohlc_query(name: str) -> str:
+    return f'''
+        SELECT target, open, MAX(high), MIN(low), close, SUM(count), SUM(total) / SUM(count)
+        FROM (
+            SELECT high, low, count, total, target,
+                   FIRST_VALUE(open) OVER (PARTITION BY target ORDER BY bucket) AS open,
+                   FIRST_VALUE(close) OVER (PARTITION BY target ORDER BY bucket DESC) AS close
+            FROM (
+                SELECT open, high, low, close, count, total, bucket,
+                       bucket - ((bucket % ?) + ?) % ? AS target
+                FROM {rollup_table(name)} WHERE {{where}}
+            )
+        )
+        GROUP BY target
+        ORDER BY target
+    '''
+
+
+def rollup_filters(ticker: str, start: Optional[int], end: Optional[int]) -> Tuple[str, List]:
+    conditions = ["ticker = ?"]
+    params: List = [ticker]
+    if start is not None:
+        conditions.append("bucket >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("bucket <= ?")
+        params.append(end)
+    return " AND ".join(conditions), params
+
+
+async def _backfill(db_url: str, start: Optional[int], end: Optional[int]):
+    from app.database import Database
+
+    db = Database(db_url=db_url)
+    await db.initialize()
+    try:
+        await db.rebuild_rollups(start, end)
+    finally:
+        await db.close()
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.rollups", description="Maintain OHLC rollup tables.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill = subparsers.add_parser("backfill", help="Rebuild rollups from crypto_prices.")
+    backfill.add_argument("--db", default=settings.database_url)
+    backfill.add_argument("--start", type=int, default=None)
+    backfill.add_argument("--end", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        asyncio.run(_backfill(args.db, args.start, args.end))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+
+from app.archive import MEDIA_TYPE, iter_export
+from app.routers.prices import get_db
+from app.storage import StorageBackend
+
+router = APIRouter()
+
+
+@router.get("/export")
+async def export_prices(
+        ticker: List[str] = Query(..., description="Тикеры для выгрузки, параметр можно повторять"),
+        start: Optional[int] = Query(None, description="Начальный timestamp"),
+        end: Optional[int] = Query(None, description="Конечный timestamp"),
+        db: StorageBackend = Depends(get_db)
+):
+    return StreamingResponse(
+        iter_export(db, ticker, start, end),
+        media_type=MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="prices.cpa"'},
+    )
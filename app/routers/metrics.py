@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.metrics import CONTENT_TYPE, REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
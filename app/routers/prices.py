@@ -1,30 +1,106 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from typing import List, Optional
-from app.models import PriceResponse
-from app.database import Database
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Literal, Optional
+from app.config import settings
+from app.models import BUCKET_SECONDS, OHLCBucket, OHLCResponse, PriceResponse
+from app.storage import PageCursor, PriceRow, StorageBackend
+from app.serialization import (
+    JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE, dump_columns, dump_rows, iter_json_array, iter_ndjson
+)
 
 router = APIRouter()
 
+NEXT_PAGE_HEADER = "X-Next-Cursor"
 
-async def get_db(request: Request) -> Database:
+StreamFormat = Literal["ndjson", "json"]
+# model — проверка через response_model, fast — те же строки сериализуются напрямую orjson,
+# columnar — {"ticker", "timestamps": [...], "prices": [...]}.
+ResponseFormat = Literal["model", "fast", "columnar"]
+
+
+async def get_db(request: Request) -> StorageBackend:
     return request.app.state.database
 
 
+def _streaming_response(chunks, stream: StreamFormat) -> StreamingResponse:
+    if stream == "ndjson":
+        return StreamingResponse(iter_ndjson(chunks), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(iter_json_array(chunks), media_type=JSON_MEDIA_TYPE)
+
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[PageCursor]:
+    if cursor is None:
+        return None
+    try:
+        return PageCursor.decode(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _set_next_page_header(
+        response: Response, rows: List[PriceRow], limit: Optional[int], cursor: Optional[PageCursor]
+):
+    if limit is not None and len(rows) == limit:
+        response.headers[NEXT_PAGE_HEADER] = PageCursor.after(rows, cursor).encode()
+
+
+def _parse_tickers(tickers: str) -> List[str]:
+    parsed = list(dict.fromkeys(ticker.strip() for ticker in tickers.split(",") if ticker.strip()))
+    if not parsed:
+        raise HTTPException(status_code=422, detail="At least one ticker is required")
+    if len(parsed) > settings.max_batch_tickers:
+        raise HTTPException(status_code=422, detail=f"At most {settings.max_batch_tickers} tickers per request")
+    return parsed
+
+
+def _fast_response(
+        ticker: str,
+        rows: List[PriceRow],
+        response_format: ResponseFormat,
+        limit: Optional[int],
+        cursor: Optional[PageCursor],
+) -> Response:
+    content = dump_columns(ticker, rows) if response_format == "columnar" else dump_rows(rows)
+    response = Response(content=content, media_type=JSON_MEDIA_TYPE)
+    _set_next_page_header(response, rows, limit, cursor)
+    return response
+
+
+def _model_rows(prices: List[PriceResponse]) -> List[PriceRow]:
+    return [(price.ticker, price.price, price.timestamp) for price in prices]
+
+
 @router.get("/prices", response_model=List[PriceResponse])
 async def get_all_prices(
+        response: Response,
         ticker: str = Query(..., description="Тикер валюты (например, 'btc_usd')"),
-        db: Database = Depends(get_db)
+        after_timestamp: Optional[int] = Query(None, description="Вернуть записи строго после этого timestamp"),
+        limit: Optional[int] = Query(None, ge=1, le=settings.max_page_size, description="Размер страницы"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        stream: Optional[StreamFormat] = Query(None, description="Потоковая выдача: 'ndjson' или 'json'"),
+        response_format: ResponseFormat = Query("model", alias="format", description="Формат ответа"),
+        db: StorageBackend = Depends(get_db)
 ):
-    prices = await db.get_all_prices(ticker)
+    page_cursor = _parse_cursor(cursor)
+    if stream is not None:
+        chunks = db.iter_prices(ticker, after_timestamp=after_timestamp, limit=limit, cursor=page_cursor)
+        return _streaming_response(chunks, stream)
+    if response_format != "model":
+        rows = await db.get_price_rows(ticker, after_timestamp=after_timestamp, limit=limit, cursor=page_cursor)
+        if not rows:
+            raise HTTPException(status_code=404, detail="No data found for the specified ticker")
+        return _fast_response(ticker, rows, response_format, limit, page_cursor)
+    prices = await db.get_all_prices(ticker, after_timestamp=after_timestamp, limit=limit, cursor=page_cursor)
     if not prices:
         raise HTTPException(status_code=404, detail="No data found for the specified ticker")
+    _set_next_page_header(response, _model_rows(prices), limit, page_cursor)
     return prices
 
 
 @router.get("/latest_price", response_model=PriceResponse)
 async def get_latest_price(
         ticker: str = Query(..., description="Тикер валюты (например, 'btc_usd')"),
-        db: Database = Depends(get_db)
+        db: StorageBackend = Depends(get_db)
 ):
     price = await db.get_latest_price(ticker)
     if not price:
@@ -32,14 +108,76 @@ async def get_latest_price(
     return price
 
 
+@router.get("/latest_prices", response_model=Dict[str, PriceResponse])
+async def get_latest_prices(
+        tickers: str = Query(..., description="Тикеры через запятую (например, 'btc_usd,eth_usd')"),
+        db: StorageBackend = Depends(get_db)
+):
+    prices = await db.get_latest_prices(_parse_tickers(tickers))
+    if not prices:
+        raise HTTPException(status_code=404, detail="No data found for the specified tickers")
+    return prices
+
+
 @router.get("/filtered_prices", response_model=List[PriceResponse])
 async def get_filtered_prices(
+        response: Response,
         ticker: str = Query(..., description="Тикер валюты (например, 'btc_usd')"),
         start: Optional[int] = Query(None, description="Начальный timestamp"),
         end: Optional[int] = Query(None, description="Конечный timestamp"),
-        db: Database = Depends(get_db)
+        after_timestamp: Optional[int] = Query(None, description="Вернуть записи строго после этого timestamp"),
+        limit: Optional[int] = Query(None, ge=1, le=settings.max_page_size, description="Размер страницы"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        stream: Optional[StreamFormat] = Query(None, description="Потоковая выдача: 'ndjson' или 'json'"),
+        response_format: ResponseFormat = Query("model", alias="format", description="Формат ответа"),
+        db: StorageBackend = Depends(get_db)
 ):
-    prices = await db.get_filtered_prices(ticker, start, end)
+    page_cursor = _parse_cursor(cursor)
+    if stream is not None:
+        chunks = db.iter_prices(ticker, start, end, after_timestamp=after_timestamp, limit=limit, cursor=page_cursor)
+        return _streaming_response(chunks, stream)
+    if response_format != "model":
+        rows = await db.get_price_rows(
+            ticker, start, end, after_timestamp=after_timestamp, limit=limit, cursor=page_cursor
+        )
+        if not rows:
+            raise HTTPException(status_code=404, detail="No data found for the specified ticker and/or timeframe")
+        return _fast_response(ticker, rows, response_format, limit, page_cursor)
+    prices = await db.get_filtered_prices(
+        ticker, start, end, after_timestamp=after_timestamp, limit=limit, cursor=page_cursor
+    )
     if not prices:
         raise HTTPException(status_code=404, detail="No data found for the specified ticker and/or timeframe")
+    _set_next_page_header(response, _model_rows(prices), limit, page_cursor)
     return prices
+
+
+@router.get("/filtered_prices/batch", response_model=Dict[str, List[PriceResponse]])
+async def get_filtered_prices_batch(
+        tickers: str = Query(..., description="Тикеры через запятую (например, 'btc_usd,eth_usd')"),
+        start: Optional[int] = Query(None, description="Начальный timestamp"),
+        end: Optional[int] = Query(None, description="Конечный timestamp"),
+        limit: Optional[int] = Query(None, ge=1, le=settings.max_page_size, description="Лимит строк на тикер"),
+        db: StorageBackend = Depends(get_db)
+):
+    rows = await db.get_prices_batch(_parse_tickers(tickers), start, end, limit)
+    if not any(rows.values()):
+        raise HTTPException(status_code=404, detail="No data found for the specified tickers and/or timeframe")
+    return {
+        ticker: [PriceResponse(ticker=row[0], price=row[1], timestamp=row[2]) for row in ticker_rows]
+        for ticker, ticker_rows in rows.items()
+    }
+
+
+@router.get("/ohlc", response_model=List[OHLCResponse])
+async def get_ohlc(
+        ticker: str = Query(..., description="Тикер валюты (например, 'btc_usd')"),
+        bucket: OHLCBucket = Query("1h", description="Размер свечи: 1m, 5m, 1h или 1d"),
+        start: Optional[int] = Query(None, description="Начальный timestamp"),
+        end: Optional[int] = Query(None, description="Конечный timestamp"),
+        db: StorageBackend = Depends(get_db)
+):
+    candles = await db.get_ohlc(ticker, BUCKET_SECONDS[bucket], start, end)
+    if not candles:
+        raise HTTPException(status_code=404, detail="No data found for the specified ticker and/or timeframe")
+    return candles
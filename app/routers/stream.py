@@ -0,0 +1,88 @@
+import asyncio
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.requests import HTTPConnection
+
+from app.config import settings
+from app.pubsub import PriceHub, Subscription
+
+router = APIRouter()
+
+# Код закрытия 1013 ("Try Again Later") — клиент не успевал читать обновления и был отключён.
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+async def get_hub(connection: HTTPConnection) -> PriceHub:
+    return connection.app.state.hub
+
+
+@router.websocket("/ws/prices")
+async def stream_prices_ws(
+        websocket: WebSocket,
+        ticker: str = Query(..., description="Тикер валюты (например, 'btc_usd')"),
+        hub: PriceHub = Depends(get_hub)
+):
+    await websocket.accept()
+    subscription = hub.subscribe(ticker)
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        while True:
+            getter = asyncio.create_task(subscription.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                message = receiver.result()
+                if message["type"] == "websocket.disconnect":
+                    return
+                receiver = asyncio.create_task(websocket.receive())
+                continue
+            price = getter.result()
+            if price is None:
+                if subscription.dropped:
+                    await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                else:
+                    await websocket.close()
+                return
+            await websocket.send_json(price.model_dump())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        subscription.close()
+
+
+async def sse_events(
+        subscription: Subscription,
+        request: Request,
+        keepalive_interval: float = settings.sse_keepalive_interval
+) -> AsyncIterator[str]:
+    try:
+        while not await request.is_disconnected():
+            try:
+                price = await asyncio.wait_for(subscription.get(), timeout=keepalive_interval)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if price is None:
+                if subscription.dropped:
+                    yield "event: dropped\ndata: {}\n\n"
+                return
+            yield f"event: price\ndata: {price.model_dump_json()}\n\n"
+    finally:
+        subscription.close()
+
+
+@router.get("/stream/prices")
+async def stream_prices_sse(
+        request: Request,
+        ticker: str = Query(..., description="Тикер валюты (например, 'btc_usd')"),
+        hub: PriceHub = Depends(get_hub)
+):
+    subscription = hub.subscribe(ticker)
+    return StreamingResponse(
+        sse_events(subscription, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import math
+import time
+from typing import AsyncIterator, Awaitable, Callable, Literal, NamedTuple
+
+from app.config import settings
+from app.metrics import TICKS_SKIPPED
+
+LOG = logging.getLogger(__name__)
+
+MissedTickPolicy = Literal["skip", "catch_up"]
+
+
+class Tick(NamedTuple):
+    scheduled: float
+    lag: float
+
+
+class TickScheduler:
+    """
+    Тики на границах интервала по часам UTC: при интервале 60 секунд — в начале каждой минуты.
+
+    Следующий тик отсчитывается от сетки, а не от окончания работы предыдущего, поэтому длительность
+    загрузки и записи не сдвигает расписание. Если работа заняла больше интервала, пропущенные границы
+    либо пропускаются (skip), либо выполняются подряд без ожидания (catch_up), но не больше
+    max_catch_up штук — остальные пропускаются.
+    """
+
+    def __init__(
+            self,
+            interval: float,
+            policy: MissedTickPolicy = settings.fetch_missed_tick_policy,
+            max_catch_up: int = settings.fetch_max_catch_up,
+            clock: Callable[[], float] = time.time,
+            sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        if interval <= 0:
+            raise ValueError("Tick interval must be positive.")
+        self.interval = interval
+        self.policy = policy
+        self.max_catch_up = max(0, max_catch_up)
+        self.clock = clock
+        self.sleep = sleep
+        self.ticks = 0
+        self.skipped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def next_boundary(self, now: float) -> float:
+        return (math.floor(now / self.interval) + 1) * self.interval
+
+    def _after_tick(self, scheduled: float) -> float:
+        following = scheduled + self.interval
+        now = self.clock()
+        if now < following:
+            return following
+        missed = math.floor((now - following) / self.interval) + 1
+        allowed = self.max_catch_up if self.policy == "catch_up" else 0
+        skipped = max(0, missed - allowed)
+        if skipped:
+            self.skipped += skipped
+            TICKS_SKIPPED.inc(skipped)
+            LOG.warning(f"Tick overran its interval, skipping {skipped} missed tick(s).")
+        return following + skipped * self.interval
+
+    async def __aiter__(self) -> AsyncIterator[Tick]:
+        scheduled = self.next_boundary(self.clock())
+        while True:
+            delay = scheduled - self.clock()
+            if delay > 0:
+                await self.sleep(delay)
+            lag = max(0.0, self.clock() - scheduled)
+            self.ticks += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            yield Tick(scheduled, lag)
+            scheduled = self._after_tick(scheduled)
@@ -0,0 +1,41 @@
+from typing import AsyncIterator, List, Sequence
+
+import orjson
+
+from app.storage import PriceRow
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+
+
+def _row_json(row: PriceRow) -> str:
+    return orjson.dumps({"ticker": row[0], "price": row[1], "timestamp": row[2]}).decode()
+
+
+async def iter_ndjson(chunks: AsyncIterator[List[PriceRow]]) -> AsyncIterator[str]:
+    async for chunk in chunks:
+        yield "".join(_row_json(row) + "\n" for row in chunk)
+
+
+async def iter_json_array(chunks: AsyncIterator[List[PriceRow]]) -> AsyncIterator[str]:
+    yield "["
+    separator = ""
+    async for chunk in chunks:
+        yield separator + ",".join(_row_json(row) for row in chunk)
+        separator = ","
+    yield "]"
+
+
+def dump_rows(rows: Sequence[PriceRow]) -> bytes:
+    """
+    Тот же JSON, что и у List[PriceResponse], но без построения и валидации моделей.
+    """
+    return orjson.dumps([{"ticker": row[0], "price": row[1], "timestamp": row[2]} for row in rows])
+
+
+def dump_columns(ticker: str, rows: Sequence[PriceRow]) -> bytes:
+    return orjson.dumps({
+        "ticker": ticker,
+        "timestamps": [row[2] for row in rows],
+        "prices": [row[1] for row in rows],
+    })
@@ -1,56 +1,299 @@
 import asyncio
+import math
 import time
+from bisect import bisect_left
+
 import aiohttp
 import logging
-from typing import Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 from app.config import settings
-from app.database import Database
+from app.storage import PriceRow, StorageBackend
+from app.write_buffer import WriteBuffer
+from app.pubsub import PriceHub
+from app.resilience import CircuitBreaker, backoff_delay
+from app.metrics import (
+    BACKFILLED_ROWS, CIRCUIT_REJECTIONS, STORED_ROWS, TICK_LAG_SECONDS, TICK_SECONDS, UPSTREAM_FAILURES,
+    UPSTREAM_FETCH_SECONDS, UPSTREAM_RETRIES,
+)
+from app.scheduler import MissedTickPolicy, Tick, TickScheduler
+from app.sources import PriceSource
+from app.upstream import UpstreamClient, UpstreamStatusError
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+# Ответы, после которых запрос имеет смысл повторить; остальные ошибки HTTP считаются окончательными.
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+# Допустимые значения range у public/get_index_chart_data и их длительность в секундах.
+HISTORY_RANGES = (("1h", 60 * 60), ("1d", 24 * 60 * 60), ("2d", 2 * 24 * 60 * 60), ("1m", 31 * 24 * 60 * 60))
+
+
+class Quote(NamedTuple):
+    price: float
+    # Время ответа биржи (usOut), секунды; None, если биржа его не прислала.
+    timestamp: Optional[int]
+
+
+def parse_quote(data: Any) -> Optional[Quote]:
+    """
+    Цена и время из ответа get_index_price; None, если ответ не похож на ожидаемый.
+    """
+    result = data.get('result') if isinstance(data, dict) else None
+    price = result.get('index_price') if isinstance(result, dict) else None
+    if not isinstance(price, (int, float)) or isinstance(price, bool):
+        return None
+    us_out = data.get('usOut')
+    try:
+        return Quote(float(price), None if us_out is None else int(us_out) // 1_000_000)
+    except (TypeError, ValueError):
+        return None
+
+
 class PriceFetcher:
-    def __init__(self, db: Database, interval: int = settings.fetch_interval):
+    def __init__(
+            self,
+            db: StorageBackend,
+            interval: int = settings.fetch_interval,
+            buffer: Optional[WriteBuffer] = None,
+            tickers: Optional[Sequence[str]] = None,
+            api_url: str = settings.deribit_api_url,
+            concurrency: int = settings.fetch_concurrency,
+            timeout: float = settings.fetch_timeout,
+            hub: Optional[PriceHub] = None,
+            missed_tick_policy: MissedTickPolicy = settings.fetch_missed_tick_policy,
+            retries: int = settings.fetch_retries,
+            retry_base_delay: float = settings.fetch_retry_base_delay,
+            retry_max_delay: float = settings.fetch_retry_max_delay,
+            breaker: Optional[CircuitBreaker] = None,
+            backfill_enabled: bool = settings.backfill_enabled,
+            backfill_max_age: int = settings.backfill_max_age,
+            source: Optional[PriceSource] = None,
+            client: Optional[UpstreamClient] = None,
+    ):
         self.db = db
+        self.buffer = buffer
+        self.hub = hub
         self.interval = interval
-        self.url_btc = "https://www.deribit.com/api/v2/public/get_index_price?index_name=btc_usd"
-        self.url_eth = "https://www.deribit.com/api/v2/public/get_index_price?index_name=eth_usd"
-        self.session = aiohttp.ClientSession()
+        self.scheduler = TickScheduler(interval, policy=missed_tick_policy)
+        self.tickers = list(tickers or settings.tickers)
+        self.api_url = api_url.rstrip("/")
+        self.retries = max(0, retries)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.breaker = breaker or CircuitBreaker(
+            self.api_url, settings.circuit_failure_threshold, settings.circuit_reset_timeout
+        )
+        # С источником вместо Deribit пропуски заполнять неоткуда.
+        self.source = source
+        self.backfill_enabled = backfill_enabled and source is None
+        self.backfill_max_age = backfill_max_age
+        # Тик последней сохранённой цены и ещё не заполненные пропуски (после, до) по каждому тикеру.
+        self.last_stored: Dict[str, int] = {}
+        self.gaps: Dict[str, List[Tuple[float, float]]] = {}
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        # Общий клиент приложения закрывает lifespan; собственный (тесты, бенчмарки) — shutdown().
+        self.client = client or UpstreamClient(timeout=timeout)
+        self._owns_client = client is None
         self.task: Optional[asyncio.Task] = None
 
-    async def fetch_price(self, url: str) -> Optional[float]:
-        try:
-            async with self.session.get(url) as response:
-                data = await response.json()
-                price = data.get('result', {}).get('index_price')
-                if price is None:
-                    logger.warning(f"Price not found in response from {url}")
-                return price
-        except Exception as e:
-            logger.error(f"Error fetching price from {url}: {e}")
+    def ticker_url(self, ticker: str) -> str:
+        return f"{self.api_url}/public/get_index_price?index_name={ticker}"
+
+    def history_url(self, ticker: str, range_name: str) -> str:
+        return f"{self.api_url}/public/get_index_chart_data?index_name={ticker}&range={range_name}"
+
+    async def _get_json(self, url: str) -> Any:
+        """
+        Запрос с повторами при сетевых ошибках, таймаутах и ответах 429/5xx. Пока предохранитель
+        разомкнут, запрос не выполняется; None — ответа нет.
+        """
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                CIRCUIT_REJECTIONS.inc()
+                logger.warning(f"Circuit for {self.breaker.name} is open, skipping {url}")
+                return None
+            try:
+                data = await self.client.get_json(url, RETRYABLE_STATUSES)
+            except (*RETRYABLE_ERRORS, UpstreamStatusError) as e:
+                self.breaker.record_failure()
+                logger.warning(f"Attempt {attempt + 1} to fetch {url} failed: {e!r}")
+                if attempt < self.retries:
+                    UPSTREAM_RETRIES.inc()
+                    await asyncio.sleep(backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay))
+                continue
+            except asyncio.CancelledError:
+                # Незавершённый пробный вызов не должен держать предохранитель полуоткрытым.
+                self.breaker.cancel_trial()
+                raise
+            except Exception as e:
+                # Негодный ответ (не JSON, слишком большой) — тоже сбой сервиса.
+                self.breaker.record_failure()
+                logger.error(f"Error fetching price from {url}: {e}")
+                return None
+            self.breaker.record_success()
+            return data
+        logger.error(f"Error fetching price from {url}: no response after {self.retries + 1} attempts")
+        return None
+
+    async def fetch_quote(self, url: str) -> Optional[Quote]:
+        data = await self._get_json(url)
+        if data is None:
             return None
+        # Ошибка разбора одного ответа не должна срывать gather в fetch_quotes и весь тик.
+        quote = parse_quote(data)
+        if quote is None:
+            logger.warning(f"Price not found in response from {url}")
+        return quote
 
-    async def fetch_prices_loop(self):
-        while True:
+    async def fetch_price(self, url: str) -> Optional[float]:
+        quote = await self.fetch_quote(url)
+        return None if quote is None else quote.price
+
+    async def _fetch_ticker_quote(self, ticker: str) -> Optional[Quote]:
+        async with self.semaphore:
+            started = time.perf_counter()
+            quote = await self.fetch_quote(self.ticker_url(ticker))
+        UPSTREAM_FETCH_SECONDS.labels(ticker).observe(time.perf_counter() - started)
+        if quote is None:
+            UPSTREAM_FAILURES.labels(ticker).inc()
+        return quote
+
+    async def fetch_quotes(self) -> Dict[str, Optional[Quote]]:
+        quotes = await asyncio.gather(*(self._fetch_ticker_quote(ticker) for ticker in self.tickers))
+        return dict(zip(self.tickers, quotes))
+
+    async def fetch_tick(self) -> Dict[str, Optional[float]]:
+        quotes = await self.fetch_quotes()
+        return {ticker: None if quote is None else quote.price for ticker, quote in quotes.items()}
+
+    async def store_prices(self, rows: List[PriceRow]):
+        if self.buffer is not None:
+            await self.buffer.add(rows)
+        else:
+            await self.db.insert_prices_bulk(rows)
+        STORED_ROWS.inc(len(rows))
+        if self.hub is not None:
+            self.hub.publish_rows(rows)
+
+    async def fetch_history(self, ticker: str, since: float) -> Optional[List[Tuple[int, float]]]:
+        """
+        История индекса из public/get_index_chart_data за наименьший range, покрывающий since.
+        """
+        age = time.time() - since
+        range_name = next((name for name, seconds in HISTORY_RANGES if seconds >= age), HISTORY_RANGES[-1][0])
+        data = await self._get_json(self.history_url(ticker, range_name))
+        if not isinstance(data, dict) or not isinstance(data.get('result'), list):
+            return None
+        points = []
+        for point in data['result']:
             try:
-                btc_price = await self.fetch_price(self.url_btc)
-                eth_price = await self.fetch_price(self.url_eth)
+                points.append((int(point[0]) // 1000, float(point[1])))
+            except (TypeError, ValueError, IndexError, KeyError):
+                continue
+        if len(points) < len(data['result']):
+            logger.warning(f"Skipped {len(data['result']) - len(points)} malformed history points for {ticker}")
+        return sorted(points)
+
+    def _track_gap(self, ticker: str, scheduled: float):
+        """
+        Пропуск отсчитывается по сетке тиков: время биржи может отставать от наших часов, и по нему
+        каждый тик выглядел бы пропуском.
+        """
+        last = self.last_stored.get(ticker)
+        self.last_stored[ticker] = max(scheduled, last or scheduled)
+        if last is not None and scheduled - last > self.interval * 1.5:
+            self.gaps.setdefault(ticker, []).append((last, scheduled))
 
-                if btc_price is not None and eth_price is not None:
-                    timestamp = int(time.time())
-                    await self.db.insert_price("btc_usd", btc_price, timestamp)
-                    await self.db.insert_price("eth_usd", eth_price, timestamp)
-                    logger.info(f"Saved btc_usd: {btc_price}, eth_usd: {eth_price} at {timestamp}")
-                else:
-                    logger.warning("Failed to fetch one or both prices.")
+    async def backfill(self, ticker: str) -> int:
+        """
+        Заполняет пропущенные тики тикера по истории биржи: на каждую границу сетки, для которой
+        нет цены, берётся первая точка истории внутри её интервала. Пропуски старше backfill_max_age
+        отбрасываются, при ошибке запроса истории остаются до следующего успешного тика.
+        """
+        horizon = time.time() - self.backfill_max_age
+        gaps = [(max(after, horizon), before) for after, before in self.gaps.get(ticker, ()) if before > horizon]
+        if not gaps:
+            self.gaps.pop(ticker, None)
+            return 0
+        history = await self.fetch_history(ticker, min(after for after, _ in gaps))
+        if history is None:
+            return 0
+        timestamps = [point[0] for point in history]
+        rows = []
+        for after, before in gaps:
+            boundary = (math.floor(after / self.interval) + 1) * self.interval
+            while boundary < before:
+                index = bisect_left(timestamps, boundary)
+                if index < len(history) and history[index][0] < boundary + self.interval:
+                    rows.append((ticker, history[index][1], history[index][0]))
+                boundary += self.interval
+        del self.gaps[ticker]
+        if rows:
+            await self.store_prices(rows)
+            BACKFILLED_ROWS.inc(len(rows))
+        logger.info(f"Backfilled {len(rows)} missed prices for {ticker}")
+        return len(rows)
 
+    async def run_tick(self, tick: Tick) -> List[PriceRow]:
+        if self.source is not None:
+            rows = await self.source.read(tick)
+            if rows:
+                await self.store_prices(rows)
+            return rows
+        quotes = await self.fetch_quotes()
+        missing = [ticker for ticker, quote in quotes.items() if quote is None]
+        # Время биржи, а если его нет — граница тика, а не момент получения ответа.
+        rows = [
+            (ticker, quote.price, int(tick.scheduled) if quote.timestamp is None else quote.timestamp)
+            for ticker, quote in quotes.items() if quote is not None
+        ]
+        if rows:
+            # Цены, полученные успешно, сохраняются, даже если по другим тикерам тик не удался.
+            await self.store_prices(rows)
+            # Строка пишется на каждый тик, поэтому форматируется лениво, только если уровень INFO включён.
+            logger.info("Saved %d prices for tick %d (lag %.3fs)", len(rows), tick.scheduled, tick.lag)
+        if missing:
+            logger.warning(f"Failed to fetch prices for: {', '.join(missing)}")
+        if self.backfill_enabled:
+            for ticker, _, _ in rows:
+                self._track_gap(ticker, tick.scheduled)
+                if ticker in self.gaps:
+                    await self.backfill(ticker)
+        return rows
+
+    async def fetch_prices_loop(self):
+        async for tick in self.scheduler:
+            TICK_LAG_SECONDS.observe(tick.lag)
+            started = time.perf_counter()
+            try:
+                await self.run_tick(tick)
             except Exception as e:
                 logger.error(f"Error in fetch_prices_loop: {e}")
+            TICK_SECONDS.observe(time.perf_counter() - started)
+            if self.source is not None and self.source.exhausted:
+                logger.info("Price source exhausted, ingestion stopped.")
+                return
 
-            await asyncio.sleep(self.interval)
+    async def _load_last_stored(self):
+        # Пропуск за время, пока процесс не работал, тоже заполняется по истории. Время биржи
+        # округляется до ближайшей границы сетки, с которой сравниваются тики.
+        try:
+            latest = await self.db.get_latest_prices(self.tickers)
+            for ticker, price in latest.items():
+                self.last_stored[ticker] = round(price.timestamp / self.interval) * self.interval
+        except Exception as e:
+            logger.error(f"Error loading latest stored prices: {e}")
 
     async def start(self):
+        await self.client.start()
+        if self.source is not None:
+            await self.source.open()
+            self.tickers = list(self.source.tickers)
+        if self.backfill_enabled:
+            await self._load_last_stored()
         self.task = asyncio.create_task(self.fetch_prices_loop())
         logger.info("PriceFetcher started.")
 
@@ -61,5 +304,8 @@ class PriceFetcher:
                 await self.task
             except asyncio.CancelledError:
                 logger.info("PriceFetcher task cancelled.")
-        await self.session.close()
+        if self.source is not None:
+            await self.source.close()
+        if self._owns_client:
+            await self.client.close()
         logger.info("PriceFetcher shutdown.")
@@ -0,0 +1,369 @@
+"""
+Последние цены в разделяемой памяти, общей для всех воркеров uvicorn на одной машине.
+
+Сегмент пишет только ведущий процесс (тот, что загружает цены), остальные читают его без блокировок
+и без обращения к SQLite. Раскладка:
+
+    заголовок, 64 байта:  magic (8s) | version (u32) | capacity (u32) | count (u64) | generation (u64)
+    слот i, 64 байта:     seq (u64) | ticker (32s, UTF-8) | price (f64) | timestamp (i64)
+
+Слоты заполняются по порядку и не освобождаются: тикер получает слот при первой записи,
+после чего писатель увеличивает count, поэтому читатель видит имя тикера раньше, чем слот попадает в count.
+Цена и время в слоте защищены seqlock: писатель делает seq нечётным, записывает значения и снова делает
+его чётным; читатель повторяет чтение, пока seq до и после совпадают и чётны.
+
+Сегмент переживает и смену базы (файл пересоздан, воспроизведение записало цены из будущего), поэтому
+новый ведущий очищает его через reset() и заполняет заново из базы. Очистка — тот же seqlock на уровне
+заголовка: generation нечётно, пока слоты обнуляются; читатель, заметив другое поколение, забывает
+свои номера слотов, а на время очистки отвечает None.
+
+Барьеров памяти из Python не поставить, и seqlock корректен только при порядке записей и чтений,
+который гарантирует x86 (TSO). На других архитектурах (ARM) сегмент не открывается.
+
+Сегмент переживает перезапуск воркеров: resource_tracker не должен удалять его при выходе
+процесса, который его создал, поэтому до Python 3.13 сегмент снимается с учёта вручную,
+а в 3.13+ открывается с track=False. Вместо этого каждый подключённый процесс держит разделяемый
+flock на файле держателей (<tmp>/<имя>.holders); ОС снимает его и при аварийном выходе. Закрывая сегмент,
+процесс пробует взять эксклюзивный flock: получилось — он последний и удаляет сегмент и файл. Сегмент,
+оставшийся после kill -9 всех процессов, удаляет python -m app.shared_latest unlink.
+"""
+import argparse
+import fcntl
+import hashlib
+import logging
+import os
+import platform
+import struct
+import sys
+import tempfile
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.models import PriceResponse
+from app.storage import sqlite_path
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b"CPLATEST"
+VERSION = 2
+TICKER_BYTES = 32
+HEADER_SIZE = 64
+SLOT_SIZE = 64
+
+_HEADER = struct.Struct("<8sII")
+_COUNT = struct.Struct("<Q")
+_COUNT_OFFSET = _HEADER.size
+_GENERATION = struct.Struct("<Q")
+_GENERATION_OFFSET = _COUNT_OFFSET + _COUNT.size
+_SEQ = struct.Struct("<Q")
+_TICKER = struct.Struct(f"<{TICKER_BYTES}s")
+_VALUE = struct.Struct("<dq")
+_TICKER_OFFSET = _SEQ.size
+_VALUE_OFFSET = _SEQ.size + TICKER_BYTES
+
+# Запись в слот занимает доли микросекунды; столько попыток без успеха значит, что писатель умер
+# посреди записи, и слот до следующей записи считается пустым.
+READ_RETRIES = 1000
+ATTACH_TIMEOUT = 1.0
+
+X86_MACHINES = frozenset({"x86_64", "amd64", "i386", "i686", "x86"})
+
+
+def segment_name(db_path: str) -> str:
+    # Имя зависит от файла базы, чтобы разные базы на одной машине не делили сегмент.
+    # Не длиннее 30 символов: ограничение имён POSIX shm на macOS.
+    digest = hashlib.blake2b(os.path.abspath(db_path).encode(), digest_size=8).hexdigest()
+    return f"cpl_{digest}"
+
+
+def _open_segment(name: str, size: int) -> Tuple[SharedMemory, bool]:
+    kwargs = {"track": False} if sys.version_info >= (3, 13) else {}
+    try:
+        shm, created = SharedMemory(name, create=True, size=size, **kwargs), True
+    except FileExistsError:
+        shm, created = SharedMemory(name, **kwargs), False
+    if sys.version_info < (3, 13):
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm, created
+
+
+def _holders_path(name: str) -> str:
+    return os.path.join(tempfile.gettempdir(), f"{name}.holders")
+
+
+def _hold(name: str) -> int:
+    """
+    Разделяемый flock на файле держателей сегмента. Пока последний процесс удаляет сегмент, flock
+    ждёт; после этого файл уже удалён, и блокировка берётся заново на новом файле.
+    """
+    path = _holders_path(name)
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        try:
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def _remove(name: str) -> bool:
+    # Вызывать под эксклюзивным flock на файле держателей; False — сегмента уже нет.
+    try:
+        os.unlink(_holders_path(name))
+    except FileNotFoundError:
+        pass
+    kwargs = {"track": False} if sys.version_info >= (3, 13) else {}
+    try:
+        shm = SharedMemory(name, **kwargs)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    # До 3.13 подключение ставит сегмент на учёт resource_tracker, а unlink() снимает его с учёта.
+    shm.unlink()
+    return True
+
+
+def unlink_segment(name: str) -> bool:
+    """
+    Удаляет сегмент и файл держателей, если к сегменту не подключён ни один процесс.
+    False — сегмента нет; ValueError — он ещё используется.
+    """
+    fd = os.open(_holders_path(name), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ValueError(f"Shared memory segment {name} is still in use")
+        return _remove(name)
+    finally:
+        os.close(fd)
+
+
+class SharedLatestPrices:
+    def __init__(self, name: str, capacity: int = settings.shared_latest_capacity):
+        machine = platform.machine()
+        if machine.lower() not in X86_MACHINES:
+            raise ValueError(f"Shared memory latest prices need x86 memory ordering, not {machine or 'unknown'}")
+        self.name = name
+        self._holder: Optional[int] = _hold(name)
+        try:
+            self.shm, created = _open_segment(name, HEADER_SIZE + capacity * SLOT_SIZE)
+        except BaseException:
+            self._release(remove=False)
+            raise
+        self.buf = self.shm.buf
+        if created:
+            # magic пишется последним: присоединившийся процесс ждёт его, а не читает полузаполненный заголовок.
+            _COUNT.pack_into(self.buf, _COUNT_OFFSET, 0)
+            _GENERATION.pack_into(self.buf, _GENERATION_OFFSET, 0)
+            _HEADER.pack_into(self.buf, 0, b"\0" * 8, VERSION, capacity)
+            self.buf[:8] = MAGIC
+        else:
+            self._wait_initialized()
+        _, version, self.capacity = _HEADER.unpack_from(self.buf, 0)
+        if version != VERSION:
+            # Сегмент другой раскладки мог открыть процесс прежней версии, который не держит файл держателей.
+            self.close(remove=False)
+            raise ValueError(f"Shared memory segment {name} has layout version {version}, expected {VERSION}")
+        self.writer = False
+        self._generation = 0
+        self._slots: Dict[str, int] = {}
+        self._known = 0
+        self._responses: Dict[int, Tuple[int, PriceResponse]] = {}
+        self._full_warned = False
+
+    def _wait_initialized(self):
+        deadline = time.monotonic() + ATTACH_TIMEOUT
+        while bytes(self.buf[:8]) != MAGIC:
+            if time.monotonic() > deadline:
+                self.close(remove=False)
+                raise ValueError(f"Shared memory segment {self.name} is not a latest price store")
+            time.sleep(0.01)
+
+    def _current_generation(self) -> int:
+        return _GENERATION.unpack_from(self.buf, _GENERATION_OFFSET)[0]
+
+    def _sync_generation(self) -> bool:
+        # False — идёт очистка сегмента; при смене поколения номера слотов и ответы сбрасываются.
+        generation = self._current_generation()
+        if generation & 1:
+            return False
+        if generation != self._generation:
+            self._generation = generation
+            self._forget()
+        return True
+
+    def _forget(self):
+        self._slots.clear()
+        self._known = 0
+        self._responses.clear()
+
+    def _count(self) -> int:
+        return min(_COUNT.unpack_from(self.buf, _COUNT_OFFSET)[0], self.capacity)
+
+    def _scan(self):
+        count = self._count()
+        for index in range(self._known, count):
+            raw = _TICKER.unpack_from(self.buf, HEADER_SIZE + index * SLOT_SIZE + _TICKER_OFFSET)[0]
+            self._slots[raw.rstrip(b"\0").decode()] = index
+        self._known = count
+
+    def _slot(self, ticker: str) -> Optional[int]:
+        index = self._slots.get(ticker)
+        if index is None and self._known < self._count():
+            self._scan()
+            index = self._slots.get(ticker)
+        return index
+
+    def tickers(self) -> List[str]:
+        if not self._sync_generation():
+            return []
+        self._scan()
+        return list(self._slots)
+
+    def get(self, ticker: str) -> Optional[PriceResponse]:
+        if not self._sync_generation():
+            return None
+        generation = self._generation
+        index = self._slot(ticker)
+        if index is None:
+            return None
+        offset = HEADER_SIZE + index * SLOT_SIZE
+        buf = self.buf
+        for _ in range(READ_RETRIES):
+            seq = _SEQ.unpack_from(buf, offset)[0]
+            if seq & 1:
+                continue
+            cached = self._responses.get(index)
+            if cached is not None and cached[0] == seq:
+                return cached[1]
+            price, timestamp = _VALUE.unpack_from(buf, offset + _VALUE_OFFSET)
+            if _SEQ.unpack_from(buf, offset)[0] != seq:
+                continue
+            if self._current_generation() != generation:
+                # Сегмент очистили, пока читался слот: номер слота мог достаться другому тикеру.
+                return None
+            if seq == 0:
+                return None
+            response = PriceResponse(ticker=ticker, price=price, timestamp=timestamp)
+            self._responses[index] = (seq, response)
+            return response
+        return None
+
+    def _allocate(self, ticker: str) -> Optional[int]:
+        name = ticker.encode()
+        count = self._count()
+        if len(name) > TICKER_BYTES or count >= self.capacity:
+            if not self._full_warned:
+                LOG.warning(f"Ticker {ticker} does not fit into shared memory segment {self.name}.")
+                self._full_warned = True
+            return None
+        _TICKER.pack_into(self.buf, HEADER_SIZE + count * SLOT_SIZE + _TICKER_OFFSET, name)
+        _COUNT.pack_into(self.buf, _COUNT_OFFSET, count + 1)
+        self._slots[ticker] = count
+        self._known = count + 1
+        return count
+
+    def update(self, ticker: str, price: float, timestamp: int):
+        """
+        Запись последней цены; как и LatestPriceCache, не откатывает цену на более старый timestamp.
+        Вызывать только из процесса-писателя.
+        """
+        index = self._slot(ticker)
+        if index is None:
+            index = self._allocate(ticker)
+            if index is None:
+                return
+        offset = HEADER_SIZE + index * SLOT_SIZE
+        seq = _SEQ.unpack_from(self.buf, offset)[0]
+        if seq and not seq & 1 and _VALUE.unpack_from(self.buf, offset + _VALUE_OFFSET)[1] > timestamp:
+            return
+        # Нечётный seq остаётся от писателя, умершего посреди записи; следующий чётный его закрывает.
+        seq |= 1
+        _SEQ.pack_into(self.buf, offset, seq)
+        _VALUE.pack_into(self.buf, offset + _VALUE_OFFSET, price, timestamp)
+        _SEQ.pack_into(self.buf, offset, seq + 1)
+
+    def reset(self):
+        """
+        Очищает все слоты под новым поколением. Вызывать только из процесса-писателя.
+        """
+        generation = self._current_generation() | 1
+        _GENERATION.pack_into(self.buf, _GENERATION_OFFSET, generation)
+        _COUNT.pack_into(self.buf, _COUNT_OFFSET, 0)
+        self.buf[HEADER_SIZE:HEADER_SIZE + self.capacity * SLOT_SIZE] = bytes(self.capacity * SLOT_SIZE)
+        _GENERATION.pack_into(self.buf, _GENERATION_OFFSET, generation + 1)
+        self._generation = generation + 1
+        self._forget()
+        self._full_warned = False
+
+    def merge(self, prices: Iterable[PriceResponse]):
+        for item in prices:
+            self.update(item.ticker, item.price, item.timestamp)
+
+    def close(self, remove: bool = True):
+        """
+        Отключается от сегмента; последний подключённый процесс удаляет его, если remove.
+        """
+        self.buf = None
+        self._responses.clear()
+        self.shm.close()
+        self._release(remove)
+
+    def _release(self, remove: bool):
+        fd, self._holder = self._holder, None
+        if fd is None:
+            return
+        try:
+            # Разделяемый flock снимается перед попыткой взять эксклюзивный: из двух процессов, закрывающихся
+            # одновременно, последний снявший обязательно его получит.
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            if not remove:
+                return
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            if _remove(self.name):
+                LOG.info(f"Removed shared memory segment {self.name}: no processes are attached.")
+        finally:
+            os.close(fd)
+
+    def unlink(self):
+        # unlink() в Python < 3.13 сам снимает сегмент с учёта resource_tracker, а он снят уже при открытии.
+        legacy = sys.version_info < (3, 13)
+        if legacy:
+            resource_tracker.register(self.shm._name, "shared_memory")
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            if legacy:
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.shared_latest", description="Manage the shared memory table of latest prices.",
+    )
+    parser.add_argument("--db", default=settings.database_url)
+    parser.add_argument("--name", default=settings.shared_latest_name)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("unlink", help="Remove a segment left behind by killed processes.")
+    args = parser.parse_args(argv)
+
+    if args.command == "unlink":
+        name = args.name or segment_name(sqlite_path(args.db))
+        try:
+            removed = unlink_segment(name)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"Removed {name}" if removed else f"No shared memory segment {name}")
+
+
+if __name__ == "__main__":
+    main()
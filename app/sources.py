@@ -0,0 +1,218 @@
+"""
+Источники цен для PriceFetcher вместо опроса Deribit: синтетическое случайное блуждание и воспроизведение
+записанной истории из архива (app.archive). Строки проходят обычный путь PriceFetcher.store_prices —
+буфер записи, хранилище и шину цен, — поэтому нагрузку на запись можно измерять без сети.
+
+    INGESTION_MODE=synthetic SYNTHETIC_TICKERS=500 SYNTHETIC_RATE=20 FETCH_INTERVAL=1
+    INGESTION_MODE=replay REPLAY_PATH=prices.cpa REPLAY_SPEED=60 REPLAY_REBASE=false
+"""
+import asyncio
+import heapq
+import logging
+import math
+import random
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app import archive
+from app.config import settings
+from app.scheduler import Tick
+from app.storage import PriceRow
+
+LOG = logging.getLogger(__name__)
+
+
+class PriceSource(ABC):
+    """
+    Источник отдаёт строки (ticker, price, timestamp) на каждый тик планировщика PriceFetcher.
+    """
+
+    tickers: List[str] = []
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @property
+    def exhausted(self) -> bool:
+        return False
+
+    @abstractmethod
+    async def read(self, tick: Tick) -> List[PriceRow]:
+        ...
+
+
+class SyntheticSource(PriceSource):
+    """
+    Геометрическое случайное блуждание по каждому тикеру с частотой rate цен в секунду на тикер.
+
+    Частота не привязана к интервалу тиков: за тик выдаются все цены, накопившиеся с предыдущего тика,
+    с timestamp, равномерно распределёнными по прошедшему интервалу. Пропущенные планировщиком тики
+    не уменьшают итоговую частоту, а увеличивают следующую пачку.
+    """
+
+    def __init__(
+            self,
+            tickers: Sequence[str],
+            rate: float = settings.synthetic_rate,
+            volatility: float = settings.synthetic_volatility,
+            start_price: float = 1000.0,
+            seed: Optional[int] = settings.synthetic_seed,
+    ):
+        if rate <= 0:
+            raise ValueError("Synthetic rate must be positive.")
+        self.tickers = list(tickers)
+        self.rate = rate
+        self.volatility = volatility
+        self.random = random.Random(seed)
+        self.prices: Dict[str, float] = {ticker: start_price for ticker in self.tickers}
+        self._last_tick: Optional[float] = None
+        self._pending = 0.0
+
+    async def read(self, tick: Tick) -> List[PriceRow]:
+        elapsed = 1 / self.rate if self._last_tick is None else tick.scheduled - self._last_tick
+        self._last_tick = tick.scheduled
+        self._pending += self.rate * elapsed
+        count = int(self._pending)
+        self._pending -= count
+        if not count:
+            return []
+        since = tick.scheduled - elapsed
+        timestamps = [int(since + elapsed * (i + 1) / count) for i in range(count)]
+        gauss = self.random.gauss
+        rows = []
+        for ticker in self.tickers:
+            price = self.prices[ticker]
+            for timestamp in timestamps:
+                price *= math.exp(gauss(0.0, self.volatility))
+                rows.append((ticker, price, timestamp))
+            self.prices[ticker] = price
+        return rows
+
+
+def synthetic_tickers(count: int) -> List[str]:
+    return [f"synthetic{i}_usd" for i in range(count)]
+
+
+def index_archive(path: str) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    Смещения и размеры блоков архива по тикерам в порядке их первого появления в файле.
+    """
+    blocks: Dict[str, List[Tuple[int, int]]] = {}
+    with open(path, "rb") as stream:
+        for ticker, offset, count in archive.index_blocks(stream):
+            blocks.setdefault(ticker, []).append((offset, count))
+    return blocks
+
+
+class ReplaySource(PriceSource):
+    """
+    Воспроизводит архив истории в порядке timestamp с ускорением speed: за тик, наступивший через
+    t секунд после первого, выдаются строки, записанные в первые t * speed секунд истории, но не больше
+    max_rows_per_tick — остаток переходит на следующие тики.
+
+    Экспорт пишет блоки тикеров друг за другом, поэтому файл сначала индексируется, а затем блоки
+    каждого тикера читаются лениво и сливаются по времени; в памяти держится по одному блоку на тикер.
+    При rebase записанные timestamp сдвигаются так, что первая строка приходится на первый тик, и
+    интервалы между строками сохраняются. Со speed > 1 сдвинутая история обогнала бы часы, поэтому
+    такое сочетание не допускается.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            speed: float = settings.replay_speed,
+            max_rows_per_tick: int = settings.replay_max_rows_per_tick,
+            rebase: bool = settings.replay_rebase,
+    ):
+        if speed <= 0:
+            raise ValueError("Replay speed must be positive.")
+        if rebase and speed > 1:
+            raise ValueError("A rebased replay cannot run faster than the clock; disable rebase or set speed to 1.")
+        self.path = path
+        self.speed = speed
+        self.max_rows_per_tick = max(1, max_rows_per_tick)
+        self.rebase = rebase
+        self.replayed = 0
+        self._files: List[BinaryIO] = []
+        self._rows: Optional[Iterator[Tuple[int, str, float]]] = None
+        self._next: Optional[Tuple[int, str, float]] = None
+        self._started: Optional[float] = None
+        self._origin: Optional[int] = None
+        self._offset = 0
+
+    def _ticker_rows(self, ticker: str, blocks: List[Tuple[int, int]]) -> Iterator[Tuple[int, str, float]]:
+        stream = open(self.path, "rb")
+        self._files.append(stream)
+        for offset, count in blocks:
+            timestamps, prices = archive.read_columns(stream, offset, count)
+            for timestamp, price in zip(timestamps, prices):
+                yield timestamp, ticker, price
+
+    def _open(self):
+        blocks = index_archive(self.path)
+        self.tickers = list(blocks)
+        self._rows = heapq.merge(*(self._ticker_rows(ticker, offsets) for ticker, offsets in blocks.items()))
+        self._next = next(self._rows, None)
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+        LOG.info(f"Replaying {self.path} for {len(self.tickers)} tickers at {self.speed}x.")
+
+    async def close(self):
+        for stream in self._files:
+            stream.close()
+        self._files = []
+
+    @property
+    def exhausted(self) -> bool:
+        return self._next is None
+
+    def _take(self, until: float) -> List[PriceRow]:
+        rows = []
+        while self._next is not None and self._next[0] <= until and len(rows) < self.max_rows_per_tick:
+            timestamp, ticker, price = self._next
+            rows.append((ticker, price, timestamp + self._offset))
+            self._next = next(self._rows, None)
+        return rows
+
+    async def read(self, tick: Tick) -> List[PriceRow]:
+        if self._next is None:
+            return []
+        if self._started is None:
+            self._started = tick.scheduled
+            self._origin = self._next[0]
+            self._offset = int(tick.scheduled) - self._origin if self.rebase else 0
+        until = self._origin + (tick.scheduled - self._started) * self.speed
+        rows = await asyncio.to_thread(self._take, until)
+        self.replayed += len(rows)
+        return rows
+
+
+def create_price_source(mode: str = settings.ingestion_mode) -> Optional[PriceSource]:
+    """
+    Источник для режимов synthetic и replay; для rest и websocket — None, цены берутся с Deribit.
+    """
+    if mode == "synthetic":
+        tickers = synthetic_tickers(settings.synthetic_tickers) if settings.synthetic_tickers else settings.tickers
+        return SyntheticSource(tickers)
+    if mode == "replay":
+        if not settings.replay_path:
+            raise ValueError("REPLAY_PATH is required in replay mode.")
+        return ReplaySource(settings.replay_path)
+    return None
+
+
+async def source_tickers(mode: str = settings.ingestion_mode) -> List[str]:
+    """
+    Тикеры, которые пишет загрузка в режиме mode: ведомому процессу нужен тот же набор, что у ведущего.
+    Для replay он известен только из индекса архива.
+    """
+    source = create_price_source(mode)
+    if isinstance(source, ReplaySource):
+        return list(await asyncio.to_thread(index_archive, source.path))
+    if source is not None:
+        return list(source.tickers)
+    return list(settings.tickers)
@@ -0,0 +1,123 @@
+import asyncio
+import math
+import random
+import logging
+from typing import Any, Optional, Tuple
+
+import aiohttp
+import orjson
+
+from app.config import settings
+from app.services import PriceFetcher
+
+logger = logging.getLogger(__name__)
+
+INDEX_CHANNEL_PREFIX = "deribit_price_index."
+
+
+def parse_index_notification(data: Any) -> Optional[Tuple[float, int]]:
+    """
+    Цена и время (в секундах) из данных уведомления deribit_price_index; None, если они не похожи на ожидаемые.
+    """
+    if not isinstance(data, dict):
+        return None
+    price, timestamp = data.get("price"), data.get("timestamp")
+    if not isinstance(price, (int, float)) or isinstance(price, bool) or not math.isfinite(price) or price <= 0:
+        return None
+    if not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool) or not math.isfinite(timestamp):
+        return None
+    return float(price), int(timestamp) // 1000
+
+
+class PriceStreamer(PriceFetcher):
+    """
+    Режим приёма цен через JSON-RPC WebSocket Deribit вместо опроса REST.
+
+    Подписывается на каналы deribit_price_index.<ticker>, отвечает на heartbeat-запросы сервера,
+    при обрыве соединения переподключается с экспоненциальной задержкой и заново оформляет подписку.
+    Полученные цены сохраняются через тот же store_prices, что и в режиме REST.
+    """
+
+    def __init__(
+            self,
+            *args,
+            ws_url: str = settings.deribit_ws_url,
+            heartbeat_interval: int = settings.ws_heartbeat_interval,
+            reconnect_min_delay: float = settings.ws_reconnect_min_delay,
+            reconnect_max_delay: float = settings.ws_reconnect_max_delay,
+            **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.ws_url = ws_url
+        self.heartbeat_interval = heartbeat_interval
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self._request_id = 0
+        self.connections = 0
+
+    def _next_request(self, method: str, params: dict) -> dict:
+        self._request_id += 1
+        return {"jsonrpc": "2.0", "id": self._request_id, "method": method, "params": params}
+
+    async def _subscribe(self, ws: aiohttp.ClientWebSocketResponse):
+        await ws.send_json(self._next_request("public/set_heartbeat", {"interval": self.heartbeat_interval}))
+        channels = [f"{INDEX_CHANNEL_PREFIX}{ticker}" for ticker in self.tickers]
+        await ws.send_json(self._next_request("public/subscribe", {"channels": channels}))
+
+    async def _handle_message(self, ws: aiohttp.ClientWebSocketResponse, message: dict):
+        method = message.get("method")
+        params = message.get("params")
+        if not isinstance(params, dict):
+            params = {}
+        if method == "heartbeat":
+            if params.get("type") == "test_request":
+                await ws.send_json(self._next_request("public/test", {}))
+        elif method == "subscription":
+            channel = params.get("channel")
+            if not isinstance(channel, str) or not channel.startswith(INDEX_CHANNEL_PREFIX):
+                return
+            # Одно испорченное уведомление пропускается, а не рвёт соединение через fetch_prices_loop.
+            parsed = parse_index_notification(params.get("data"))
+            if parsed is None:
+                logger.warning(f"Skipping malformed notification on {channel}: {params.get('data')!r}")
+                return
+            price, timestamp = parsed
+            await self.store_prices([(channel[len(INDEX_CHANNEL_PREFIX):], price, timestamp)])
+        elif "error" in message:
+            logger.error(f"Deribit WebSocket error: {message['error']}")
+
+    async def _run_connection(self) -> bool:
+        subscribed = False
+        async with self.client.session.ws_connect(self.ws_url, heartbeat=None) as ws:
+            self.connections += 1
+            await self._subscribe(ws)
+            logger.info(f"Subscribed to {len(self.tickers)} index channels via {self.ws_url}")
+            while True:
+                # Сервер шлёт heartbeat каждые heartbeat_interval секунд; тишина вдвое дольше — мёртвое соединение.
+                msg = await ws.receive(timeout=self.heartbeat_interval * 2)
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    logger.warning(f"WebSocket closed: {msg.type.name}")
+                    return subscribed
+                message = orjson.loads(msg.data)
+                if not isinstance(message, dict):
+                    logger.warning(f"Skipping non-object WebSocket message: {msg.data[:200]!r}")
+                    continue
+                if message.get("method") == "subscription":
+                    subscribed = True
+                await self._handle_message(ws, message)
+
+    async def fetch_prices_loop(self):
+        delay = self.reconnect_min_delay
+        while True:
+            try:
+                if await self._run_connection():
+                    delay = self.reconnect_min_delay
+            except asyncio.TimeoutError:
+                logger.warning("No messages from Deribit WebSocket, reconnecting.")
+            except aiohttp.ClientError as e:
+                logger.error(f"Deribit WebSocket connection failed: {e}")
+            except Exception as e:
+                logger.error(f"Error in WebSocket stream: {e}")
+
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.reconnect_max_delay)
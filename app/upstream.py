@@ -0,0 +1,178 @@
+"""
+Общий HTTP-клиент к внешним API (Deribit) с одним пулом соединений на процесс.
+
+Сессия aiohttp создаётся внутри работающего цикла событий — в lifespan или при первом запросе, —
+а не в конструкторе. Тела ответов читаются с ограничением размера и разбираются orjson прямо из байтов.
+Через TraceConfig по каждому хосту считаются запросы, новые и переиспользованные соединения, время
+установки соединения и ожидания свободного соединения в пуле; те же значения попадают в /metrics.
+"""
+import logging
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+import aiohttp
+import orjson
+
+from app.config import settings
+from app.metrics import (
+    UPSTREAM_CONNECT_SECONDS, UPSTREAM_CONNECTIONS, UPSTREAM_POOL_WAIT_SECONDS, UPSTREAM_REQUEST_SECONDS,
+)
+
+LOG = logging.getLogger(__name__)
+
+
+class UpstreamStatusError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class ResponseTooLargeError(Exception):
+    pass
+
+
+class HostStats:
+    __slots__ = (
+        "requests", "errors", "new_connections", "reused_connections", "request_seconds", "max_request_seconds",
+        "connect_seconds", "pool_wait_seconds",
+    )
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.request_seconds = 0.0
+        self.max_request_seconds = 0.0
+        self.connect_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        stats = {name: getattr(self, name) for name in self.__slots__}
+        stats["mean_request_seconds"] = self.request_seconds / self.requests if self.requests else 0.0
+        return stats
+
+
+class UpstreamClient:
+    def __init__(
+            self,
+            pool_size: int = settings.fetch_connection_limit,
+            limit_per_host: int = settings.fetch_limit_per_host,
+            keepalive_timeout: float = settings.fetch_keepalive_timeout,
+            dns_cache_ttl: int = settings.fetch_dns_cache_ttl,
+            timeout: float = settings.fetch_timeout,
+            connect_timeout: Optional[float] = settings.fetch_connect_timeout,
+            max_response_bytes: int = settings.fetch_max_response_bytes,
+    ):
+        self.pool_size = pool_size
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_response_bytes = max_response_bytes
+        self.hosts: Dict[str, HostStats] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def _host(self, host: str) -> HostStats:
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = HostStats()
+        return stats
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace())
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host or ""
+            ctx.started = time.perf_counter()
+
+        async def on_request_end(session, ctx, params):
+            elapsed = time.perf_counter() - ctx.started
+            stats = self._host(ctx.host)
+            stats.requests += 1
+            stats.request_seconds += elapsed
+            stats.max_request_seconds = max(stats.max_request_seconds, elapsed)
+            UPSTREAM_REQUEST_SECONDS.labels(ctx.host).observe(elapsed)
+
+        async def on_request_exception(session, ctx, params):
+            self._host(ctx.host).errors += 1
+
+        async def on_queued_start(session, ctx, params):
+            ctx.queued = time.perf_counter()
+
+        async def on_queued_end(session, ctx, params):
+            waited = time.perf_counter() - ctx.queued
+            self._host(ctx.host).pool_wait_seconds += waited
+            UPSTREAM_POOL_WAIT_SECONDS.labels(ctx.host).observe(waited)
+
+        async def on_create_start(session, ctx, params):
+            ctx.connecting = time.perf_counter()
+
+        async def on_create_end(session, ctx, params):
+            elapsed = time.perf_counter() - ctx.connecting
+            stats = self._host(ctx.host)
+            stats.new_connections += 1
+            stats.connect_seconds += elapsed
+            UPSTREAM_CONNECTIONS.labels(ctx.host, "false").inc()
+            UPSTREAM_CONNECT_SECONDS.labels(ctx.host).observe(elapsed)
+
+        async def on_reuse(session, ctx, params):
+            self._host(ctx.host).reused_connections += 1
+            UPSTREAM_CONNECTIONS.labels(ctx.host, "true").inc()
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        trace.on_connection_create_start.append(on_create_start)
+        trace.on_connection_create_end.append(on_create_end)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+
+    async def start(self):
+        if self.session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout, trace_configs=[self._trace_config()],
+        )
+
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        if response.content_length is not None and response.content_length > self.max_response_bytes:
+            raise ResponseTooLargeError(f"Response of {response.content_length} bytes from {response.url}")
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_any():
+            size += len(chunk)
+            if size > self.max_response_bytes:
+                raise ResponseTooLargeError(f"Response from {response.url} exceeds {self.max_response_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def get_json(self, url: str, error_statuses: frozenset = frozenset()) -> Any:
+        """
+        GET с разбором JSON; при статусе из error_statuses тело не читается и бросается UpstreamStatusError.
+        """
+        if self.session is None:
+            await self.start()
+        async with self.session.get(url) as response:
+            if response.status in error_statuses:
+                raise UpstreamStatusError(response.status)
+            return orjson.loads(await self._read_body(response))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {host: stats.as_dict() for host, stats in self.hosts.items()}
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            for host, stats in self.hosts.items():
+                LOG.info(f"Upstream {host}: {stats.requests} requests, {stats.new_connections} connections opened")
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from typing import Iterable, List, Optional
+
+from app.config import settings
+from app.storage import PriceRow, StorageBackend, validate_price_row
+
+LOG = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    """
+    Буфер отложенной записи: накапливает строки между тиками и записывает их одной транзакцией
+    через StorageBackend.insert_prices_bulk при достижении max_rows, по таймеру flush_interval и при закрытии.
+    """
+
+    def __init__(
+            self,
+            db: StorageBackend,
+            max_rows: int = settings.write_buffer_max_rows,
+            flush_interval: float = settings.write_buffer_flush_interval,
+    ):
+        self.db = db
+        self.max_rows = max(1, max_rows)
+        self.flush_interval = flush_interval
+        self._rows: List[PriceRow] = []
+        self._flush_lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    async def add(self, rows: Iterable[PriceRow]) -> int:
+        rows = list(rows)
+        for row in rows:
+            validate_price_row(*row)
+        self._rows.extend(rows)
+        if len(self._rows) >= self.max_rows:
+            await self.flush()
+        return len(rows)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._rows:
+                return 0
+            rows, self._rows = self._rows, []
+            try:
+                return await self.db.insert_prices_bulk(rows)
+            except Exception:
+                # Возвращаем строки в начало буфера, чтобы не потерять их до следующей попытки.
+                self._rows[:0] = rows
+                raise
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                LOG.error(f"Error flushing write buffer ({len(self._rows)} rows pending): {e}")
+
+    async def start(self):
+        self.task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
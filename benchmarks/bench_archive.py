@@ -0,0 +1,77 @@
+"""
+Бенчмарк архивной выгрузки и загрузки истории цен.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_archive --rows 1000000 5000000
+
+Для каждого размера база заполняется минутными тиками, затем измеряются экспорт в архивный
+формат (app.archive), импорт в пустую базу вместе с пересчётом свечей и, для сравнения,
+выгрузка той же истории в JSON страницами по MAX_PAGE_SIZE.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+
+from app import archive
+from app.config import settings
+from app.database import Database
+from app.serialization import _row_json
+from benchmarks.bench_lookup import TICKERS, seed
+
+
+def rate(rows: int, seconds: float) -> int:
+    return int(rows / seconds) if seconds else 0
+
+
+async def run(rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, "source.db")
+        seed(source_path, rows, with_index=True)
+        source = Database(db_url=source_path)
+        target = Database(db_url=os.path.join(tmp, "target.db"))
+        await source.initialize()
+        await target.initialize()
+        try:
+            started = time.perf_counter()
+            data = b"".join([chunk async for chunk in archive.iter_export(source, TICKERS)])
+            export_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            json_size = 0
+            for ticker in TICKERS:
+                async for chunk in source.iter_prices(ticker, chunk_size=settings.max_page_size):
+                    json_size += len("[" + ",".join(_row_json(row) for row in chunk) + "]")
+            json_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            imported = await archive.import_blocks(target, archive.read_blocks(io.BytesIO(data)))
+            import_seconds = time.perf_counter() - started
+        finally:
+            await source.close()
+            await target.close()
+    return {
+        "rows": imported,
+        "archive_bytes": len(data),
+        "json_bytes": json_size,
+        "export_rows_per_s": rate(imported, export_seconds),
+        "json_rows_per_s": rate(imported, json_seconds),
+        "import_rows_per_s": rate(imported, import_seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        print(json.dumps(asyncio.run(run(rows))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Бенчмарк длительной загрузки цен без сети: PriceFetcher с синтетическим источником (app.sources)
+пишет в пустую базу SQLite через обычный путь store_prices.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_ingestion --tickers 500 --rate 20 --interval 1 --duration 30 [--write-buffer]
+
+Тики идут по тому же TickScheduler, что и в сервисе. В отчёте — записанные строки в секунду, длительность
+тика (чтение источника и запись) и опоздание тиков; пропущенные тики значат, что база не успевает
+за заданной частотой.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from app.database import Database
+from app.scheduler import TickScheduler
+from app.services import PriceFetcher
+from app.sources import SyntheticSource, synthetic_tickers
+from app.write_buffer import WriteBuffer
+from benchmarks import report
+
+
+async def run(tickers: int, rate: float, interval: float, duration: float, write_buffer: bool, seed: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_url=os.path.join(tmp, "ingestion.db"))
+        await db.initialize()
+        buffer = WriteBuffer(db) if write_buffer else None
+        if buffer is not None:
+            await buffer.start()
+        source = SyntheticSource(synthetic_tickers(tickers), rate=rate, seed=seed)
+        fetcher = PriceFetcher(db=db, buffer=buffer, source=source)
+        scheduler = TickScheduler(interval)
+        tick_samples, lag_samples = [], []
+        stored = 0
+        try:
+            started = None
+            async for tick in scheduler:
+                if started is None:
+                    started = time.perf_counter()
+                tick_started = time.perf_counter()
+                stored += len(await fetcher.run_tick(tick))
+                tick_samples.append((time.perf_counter() - tick_started) * 1e6)
+                lag_samples.append(tick.lag * 1e6)
+                if time.perf_counter() - started >= duration:
+                    break
+            if buffer is not None:
+                await buffer.close()
+                buffer = None
+            elapsed = time.perf_counter() - started
+        finally:
+            if buffer is not None:
+                await buffer.close()
+            await fetcher.shutdown()
+            await db.close()
+    return {
+        "tickers": tickers,
+        "rate_per_ticker": rate,
+        "interval_s": interval,
+        "write_buffer": write_buffer,
+        "rows": stored,
+        "rows_per_s": round(stored / elapsed, 1),
+        "target_rows_per_s": tickers * rate,
+        "skipped_ticks": scheduler.skipped,
+        "tick": report.summarize(tick_samples),
+        "lag": report.summarize(lag_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=10.0, help="Цен в секунду на тикер")
+    parser.add_argument("--interval", type=float, default=1.0, help="Интервал тиков, секунды")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность прогона, секунды")
+    parser.add_argument("--write-buffer", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(json.dumps(asyncio.run(run(
+        args.tickers, args.rate, args.interval, args.duration, args.write_buffer, args.seed
+    ))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Бенчмарк задержки поиска по crypto_prices в зависимости от размера истории.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_lookup --rows 10000 100000 1000000 10000000
+
+Для каждого размера создаётся временная база, заполняется минутными тиками для нескольких
+тикеров, применяются миграции, после чего измеряются get_latest_price и get_filtered_prices
+(окно в один час). Флаг --no-index пропускает индекс для сравнения со старой схемой.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from app.database import Database
+
+TICKERS = ("btc_usd", "eth_usd", "sol_usd", "xrp_usd")
+START_TS = 1_600_000_000
+STEP = 60
+
+
+def seed(db_path: str, rows: int, with_index: bool):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("CREATE TABLE crypto_prices (ticker TEXT, price REAL, timestamp INTEGER)")
+    per_ticker = rows // len(TICKERS)
+
+    def generate():
+        for i in range(per_ticker):
+            ts = START_TS + i * STEP
+            for n, ticker in enumerate(TICKERS):
+                yield ticker, 1000.0 * (n + 1) + (i % 1000), ts
+
+    conn.executemany("INSERT INTO crypto_prices (ticker, price, timestamp) VALUES (?, ?, ?)", generate())
+    conn.commit()
+    if not with_index:
+        # Помечаем схему как уже мигрированную, чтобы Database.initialize() не построил индекс.
+        conn.execute("PRAGMA user_version = 1000")
+    conn.close()
+    return per_ticker
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def measure(coro_factory, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return {
+        "p50_us": round(statistics.median(samples), 1),
+        "p99_us": round(percentile(samples, 0.99), 1),
+    }
+
+
+async def run(rows: int, iterations: int, with_index: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        per_ticker = seed(db_path, rows, with_index)
+        seed_seconds = time.perf_counter() - started
+
+        db = Database(db_url=db_path)
+        started = time.perf_counter()
+        await db.initialize()
+        migrate_seconds = time.perf_counter() - started
+
+        last_ts = START_TS + (per_ticker - 1) * STEP
+        try:
+            result = {
+                "rows": rows,
+                "index": with_index,
+                "seed_s": round(seed_seconds, 2),
+                "migrate_s": round(migrate_seconds, 2),
+                "get_latest_price": await measure(lambda: db.get_latest_price("eth_usd"), iterations),
+                "get_filtered_prices_1h": await measure(
+                    lambda: db.get_filtered_prices("eth_usd", last_ts - 3600, last_ts), iterations
+                ),
+            }
+        finally:
+            await db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--no-index", action="store_true")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        print(json.dumps(asyncio.run(run(rows, args.iterations, not args.no_index))))
+
+
+if __name__ == "__main__":
+    main()
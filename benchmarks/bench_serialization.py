@@ -0,0 +1,70 @@
+"""
+Бенчмарк форматов ответа /filtered_prices: model (response_model=List[PriceResponse]),
+fast (строки сериализуются orjson напрямую) и columnar ({timestamps, prices}).
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_serialization --rows 10000 100000
+
+Запросы идут через ASGI-приложение целиком (httpx + ASGITransport) к временной базе,
+горячий слой отключён, чтобы сравнивались только пути сериализации.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+
+from httpx import ASGITransport, AsyncClient
+
+from app.database import Database
+from app.main import app
+from app.routers.prices import get_db
+from benchmarks.bench_lookup import START_TS, TICKERS, measure, seed
+
+FORMATS = ("model", "fast", "columnar")
+
+
+async def run(rows: int, iterations: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, rows * len(TICKERS), with_index=True)
+        db = Database(db_url=db_path, hot_tier_window=0)
+        await db.initialize()
+
+        async def override_get_db():
+            return db
+
+        app.dependency_overrides[get_db] = override_get_db
+        result = {"rows": rows}
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+                for response_format in FORMATS:
+                    params = {"ticker": TICKERS[0], "start": START_TS, "format": response_format}
+                    response = await client.get("/filtered_prices", params=params)
+                    timings = await measure(lambda: client.get("/filtered_prices", params=params), iterations)
+                    result[response_format] = {
+                        **timings,
+                        "bytes": len(response.content),
+                        "rows_per_s": int(rows / (timings["p50_us"] / 1e6)),
+                    }
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+            await db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for rows in args.rows:
+        print(json.dumps(asyncio.run(run(rows, args.iterations))))
+
+
+if __name__ == "__main__":
+    main()
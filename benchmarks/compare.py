@@ -0,0 +1,73 @@
+"""
+Сравнение двух отчётов benchmarks.suite, например до и после изменения:
+
+    python -m benchmarks.compare baseline.json report.json --threshold 0.10
+
+Для каждой общей метрики печатается изменение в процентах. Рост p50_us/p99_us или падение ops_per_s
+больше порога считается регрессией, и тогда скрипт завершается с кодом 1.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, List, Tuple
+
+LOWER_IS_BETTER = ("p50_us", "p99_us")
+HIGHER_IS_BETTER = ("ops_per_s",)
+
+
+def flatten(results: Dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif key in LOWER_IS_BETTER + HIGHER_IS_BETTER and isinstance(value, (int, float)):
+            yield path, value
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Dict]:
+    """
+    Строки сравнения по метрикам, которые есть в обоих отчётах; change — относительное изменение,
+    regression — ухудшение больше threshold.
+    """
+    before = dict(flatten(baseline["results"]))
+    rows = []
+    for path, value in flatten(current["results"]):
+        if path not in before or not before[path]:
+            continue
+        change = (value - before[path]) / before[path]
+        worse = change if path.endswith(LOWER_IS_BETTER) else -change
+        rows.append({
+            "metric": path, "baseline": before[path], "current": value, "change": change,
+            "regression": worse > threshold,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"baseline {baseline['environment'].get('commit')}, current {current['environment'].get('commit')}")
+    rows = compare(baseline, current, args.threshold)
+    width = max((len(row["metric"]) for row in rows), default=0)
+    for row in rows:
+        marker = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['metric']:<{width}}  {row['baseline']:>12.1f}  {row['current']:>12.1f}"
+            f"  {row['change']:>+8.1%}{marker}"
+        )
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{len(rows)} metrics compared, {regressions} regressions over {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Локальный HTTP-сервер с эндпоинтами Deribit get_index_price и get_index_chart_data для бенчмарков
+загрузчика и сервера: цены детерминированы, задержку ответа можно задать.
+"""
+import asyncio
+import time
+import zlib
+
+from aiohttp import web
+
+
+class FakeDeribit:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.requests = 0
+        self.runner = None
+        self.url = None
+
+    async def handle_index_price(self, request):
+        self.requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        ticker = request.query.get("index_name", "")
+        price = 1000.0 + zlib.crc32(ticker.encode()) % 1000
+        return web.json_response({
+            "jsonrpc": "2.0", "result": {"index_price": price}, "usOut": int(time.time() * 1_000_000),
+        })
+
+    async def handle_index_chart_data(self, request):
+        return web.json_response({"jsonrpc": "2.0", "result": []})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/v2/public/get_index_price", self.handle_index_price)
+        app.router.add_get("/api/v2/public/get_index_chart_data", self.handle_index_chart_data)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/api/v2"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,68 @@
+"""
+Сводка замеров и JSON-отчёт бенчмарков.
+
+Латентности считаются в микросекундах (p50_us, p99_us, max_us), пропускная способность — в операциях
+в секунду (ops_per_s). Отчёт содержит коммит и окружение, чтобы результаты разных коммитов
+можно было сравнить через benchmarks.compare.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(samples_us: List[float], seconds: Optional[float] = None, operations: Optional[int] = None) -> Dict:
+    """
+    p50/p99/max по выборке задержек; ops_per_s — число операций за всё время прогона, а не 1/p50,
+    поэтому при параллельной нагрузке учитывается конкурентность.
+    """
+    if not samples_us:
+        return {"count": 0}
+    seconds = sum(samples_us) / 1e6 if seconds is None else seconds
+    operations = len(samples_us) if operations is None else operations
+    return {
+        "count": len(samples_us),
+        "p50_us": round(statistics.median(samples_us), 1),
+        "p99_us": round(percentile(samples_us, 0.99), 1),
+        "max_us": round(max(samples_us), 1),
+        "ops_per_s": round(operations / seconds, 1) if seconds else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def environment() -> Dict:
+    return {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save(report: Dict, path: Optional[str]):
+    text = json.dumps(report, indent=2)
+    if path is None:
+        print(text)
+        return
+    with open(path, "w") as f:
+        f.write(text + "\n")
@@ -0,0 +1,326 @@
+"""
+Воспроизводимый набор бенчмарков API, хранилища и загрузчика с JSON-отчётом.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.suite --rows 1k 1M 50M --output report.json
+    python -m benchmarks.compare baseline.json report.json
+
+Для каждого размера истории создаётся временная база SQLite с минутными тиками (benchmarks.bench_lookup.seed),
+строки переносятся в помесячные секции, как это делает обслуживание секций в работающем сервисе, и измеряются:
+
+- database — методы Database по одному вызову за раз;
+- asgi — /prices, /latest_price и /filtered_prices через приложение в том же процессе (httpx + ASGITransport)
+  с --concurrency одновременными запросами;
+- http — те же эндпоинты у сервера uvicorn в отдельном процессе через --connections соединений aiohttp.
+  Сервер загружает цены из локального имитатора Deribit, а не с биржи.
+
+Оба варианта идут через HTTP-кэш ответов, если он включён; для замера самих запросов к базе
+запускайте с HTTP_CACHE_ENABLED=false.
+
+Отдельно измеряется тик PriceFetcher на --fetcher-tickers тикерах против имитатора Deribit.
+Параметры запросов (тикер, окно, курсор) берутся из random.Random(--seed), поэтому при одинаковых
+аргументах все прогоны выполняют одну и ту же последовательность запросов.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import aiohttp
+from httpx import ASGITransport, AsyncClient
+
+from app.config import settings
+from app.database import Database
+from app.main import app
+from app.partitions import PartitionManager
+from app.routers.prices import get_db
+from app.scheduler import Tick
+from app.services import PriceFetcher
+from app.shared_latest import segment_name, unlink_segment
+from app.storage import sqlite_path
+from benchmarks import report
+from benchmarks.bench_lookup import START_TS, STEP, TICKERS, seed
+from benchmarks.fake_upstream import FakeDeribit
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+WINDOW = 3600
+PAGE_SIZE = 100
+
+Request = Tuple[str, Dict]
+
+
+def parse_size(value: str) -> int:
+    suffix = value[-1:].lower()
+    if suffix in SIZE_SUFFIXES:
+        return int(float(value[:-1]) * SIZE_SUFFIXES[suffix])
+    return int(value)
+
+
+def workload(rng: random.Random, last_ts: int) -> Dict[str, Callable[[], Request]]:
+    def window_start() -> int:
+        return rng.randrange(START_TS, max(START_TS + 1, last_ts - WINDOW))
+
+    def prices() -> Request:
+        return "/prices", {"ticker": rng.choice(TICKERS), "after_timestamp": window_start(), "limit": PAGE_SIZE}
+
+    def latest_price() -> Request:
+        return "/latest_price", {"ticker": rng.choice(TICKERS)}
+
+    def filtered_prices() -> Request:
+        start = window_start()
+        return "/filtered_prices", {"ticker": rng.choice(TICKERS), "start": start, "end": start + WINDOW}
+
+    return {"prices": prices, "latest_price": latest_price, "filtered_prices_1h": filtered_prices}
+
+
+async def drive(
+        send: Callable[[str, Dict], Awaitable[int]],
+        make_request: Callable[[], Request],
+        requests: int,
+        concurrency: int,
+) -> Dict:
+    """
+    Выполняет requests запросов в concurrency параллельных потоков; ответы не 200 считаются ошибками.
+    """
+    samples: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            path, params = make_request()
+            started = time.perf_counter()
+            status = await send(path, params)
+            samples.append((time.perf_counter() - started) * 1e6)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return {**report.summarize(samples, time.perf_counter() - started), "errors": errors}
+
+
+async def time_calls(factory: Callable[[], Awaitable], iterations: int) -> Dict:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await factory()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return report.summarize(samples)
+
+
+async def bench_database(db: Database, rng: random.Random, last_ts: int, iterations: int) -> Dict:
+    def window_start() -> int:
+        return rng.randrange(START_TS, max(START_TS + 1, last_ts - 24 * 3600))
+
+    async def iterate():
+        async for _ in db.iter_prices(rng.choice(TICKERS), start=window_start(), limit=10_000):
+            pass
+
+    inserted = iter(range(1, iterations + 1))
+
+    def insert():
+        ts = last_ts + next(inserted) * STEP
+        return db.insert_prices_bulk([(ticker, 1000.0, ts + i) for i in range(25) for ticker in TICKERS])
+
+    operations = {
+        "get_latest_price": lambda: db.get_latest_price(rng.choice(TICKERS)),
+        "get_latest_prices": lambda: db.get_latest_prices(TICKERS),
+        "get_price_rows_1h": lambda: (lambda s: db.get_price_rows(rng.choice(TICKERS), s, s + WINDOW))(window_start()),
+        "get_prices_batch_1h": lambda: (lambda s: db.get_prices_batch(TICKERS, s, s + WINDOW))(window_start()),
+        "get_ohlc_1d_hourly": lambda: (lambda s: db.get_ohlc(rng.choice(TICKERS), 3600, s, s + 24 * 3600))(
+            window_start()
+        ),
+        "iter_prices_10k": iterate,
+        # Последним: вставки сдвигают последнюю цену, но не попадают в окна чтения.
+        "insert_prices_bulk_100": insert,
+    }
+    return {name: await time_calls(factory, iterations) for name, factory in operations.items()}
+
+
+async def bench_asgi(db: Database, rng: random.Random, last_ts: int, requests: int, concurrency: int) -> Dict:
+    async def override_get_db():
+        return db
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            async def send(path: str, params: Dict) -> int:
+                return (await client.get(path, params=params)).status_code
+
+            return {
+                name: await drive(send, make_request, requests, concurrency)
+                for name, make_request in workload(rng, last_ts).items()
+            }
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                async with session.get(f"{url}/latest_price", params={"ticker": TICKERS[0]}) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+async def bench_http(
+        db_path: str,
+        upstream: FakeDeribit,
+        rng: random.Random,
+        last_ts: int,
+        requests: int,
+        connections: int,
+        workers: int,
+) -> Dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": db_path,
+        "DERIBIT_API_URL": upstream.url,
+        "TICKERS": json.dumps(list(TICKERS)),
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_ready(url, process)
+        connector = aiohttp.TCPConnector(limit=connections)
+        async with aiohttp.ClientSession(url, connector=connector) as session:
+            async def send(path: str, params: Dict) -> int:
+                async with session.get(path, params=params) as response:
+                    await response.read()
+                    return response.status
+
+            return {
+                name: await drive(send, make_request, requests, connections)
+                for name, make_request in workload(rng, last_ts).items()
+            }
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        # Воркеры удаляют сегмент последних цен при штатном выходе; этот удаляет и оставшийся после убитых.
+        unlink_segment(segment_name(sqlite_path(db_path)))
+
+
+async def bench_fetcher(tickers: int, ticks: int, delay: float) -> Dict:
+    upstream = FakeDeribit(delay=delay)
+    await upstream.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_url=os.path.join(tmp, "fetcher.db"))
+        await db.initialize()
+        fetcher = PriceFetcher(
+            db=db, tickers=[f"coin{i}_usd" for i in range(tickers)], api_url=upstream.url, backfill_enabled=False
+        )
+        try:
+            fetch_samples, tick_samples = [], []
+            for _ in range(ticks):
+                started = time.perf_counter()
+                await fetcher.fetch_quotes()
+                fetch_samples.append((time.perf_counter() - started) * 1e6)
+                started = time.perf_counter()
+                await fetcher.run_tick(Tick(time.time(), 0.0))
+                tick_samples.append((time.perf_counter() - started) * 1e6)
+        finally:
+            await fetcher.shutdown()
+            await db.close()
+            await upstream.stop()
+    return {
+        "tickers": tickers,
+        "upstream_delay_s": delay,
+        "fetch_quotes": report.summarize(fetch_samples),
+        "run_tick": report.summarize(tick_samples),
+    }
+
+
+async def run_size(rows: int, args) -> Dict:
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        per_ticker = seed(db_path, rows, with_index=True)
+        result = {"rows": rows, "seed_s": round(time.perf_counter() - started, 2)}
+        last_ts = START_TS + (per_ticker - 1) * STEP
+
+        db = Database(db_url=db_path)
+        started = time.perf_counter()
+        await db.initialize()
+        await PartitionManager(db, chunk_size=100_000).seal()
+        result["prepare_s"] = round(time.perf_counter() - started, 2)
+        try:
+            result["database"] = await bench_database(db, rng, last_ts, args.iterations)
+            result["asgi"] = await bench_asgi(db, rng, last_ts, args.requests, args.concurrency)
+        finally:
+            await db.close()
+
+        if not args.no_http:
+            upstream = FakeDeribit()
+            await upstream.start()
+            try:
+                result["http"] = await bench_http(
+                    db_path, upstream, rng, last_ts, args.requests, args.connections, args.workers
+                )
+            finally:
+                await upstream.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=parse_size, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=200, help="Вызовов каждого метода Database")
+    parser.add_argument("--requests", type=int, default=2000, help="Запросов к каждому эндпоинту")
+    parser.add_argument("--concurrency", type=int, default=16, help="Параллельных запросов через ASGI")
+    parser.add_argument("--connections", type=int, default=32, help="Соединений HTTP-нагрузки")
+    parser.add_argument("--workers", type=int, default=1, help="Воркеров uvicorn")
+    parser.add_argument("--no-http", action="store_true", help="Пропустить нагрузку на отдельный сервер")
+    parser.add_argument("--fetcher-tickers", type=int, default=50)
+    parser.add_argument("--fetcher-ticks", type=int, default=50)
+    parser.add_argument("--fetcher-delay", type=float, default=0.005, help="Задержка имитатора Deribit, секунды")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл отчёта; по умолчанию отчёт печатается")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {}
+    for rows in args.rows:
+        results[str(rows)] = asyncio.run(run_size(rows, args))
+        print(f"{rows} rows done", file=sys.stderr)
+    results["fetcher"] = asyncio.run(bench_fetcher(args.fetcher_tickers, args.fetcher_ticks, args.fetcher_delay))
+    environment = {**report.environment(), "http_cache_enabled": settings.http_cache_enabled}
+    report.save({"environment": environment, "arguments": vars(args), "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
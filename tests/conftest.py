@@ -1,10 +1,14 @@
+import asyncio
 import os
 import shutil
 import tempfile
+import time
 
 import pytest
+from aiohttp import web
 from httpx import AsyncClient, ASGITransport
 from app.main import app
+from app.http_cache import response_cache
 from app.database import Database
 from unittest.mock import AsyncMock
 from app.routers.prices import get_db
@@ -20,6 +24,10 @@ async def mock_db():
     mock.get_all_prices.return_value = []
     mock.get_latest_price.return_value = None
     mock.get_filtered_prices.return_value = []
+    mock.get_price_rows.return_value = []
+    mock.get_latest_prices.return_value = {}
+    mock.get_prices_batch.return_value = {}
+    mock.get_ohlc.return_value = []
     return mock
 
 
@@ -33,11 +41,13 @@ async def client(mock_db):
         return mock_db
 
     app.dependency_overrides[get_db] = override_get_db
+    response_cache.clear()
 
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
         yield c
 
     app.dependency_overrides.pop(get_db, None)
+    response_cache.clear()
 
 
 @pytest.fixture
@@ -62,3 +72,73 @@ async def price_fetcher(test_db):
     fetcher = PriceFetcher(db=test_db, interval=0.1)
     yield fetcher
     await fetcher.shutdown()
+
+
+@pytest.fixture
+async def deribit_stub():
+    """
+    Фикстура для запуска локального HTTP-сервера, имитирующего эндпоинты Deribit get_index_price
+    и get_index_chart_data. Задержку ответа, цены по тикерам, число ближайших ответов с ошибкой 503,
+    историю и произвольные тела ответов по тикерам (bytes отдаются как есть) можно менять через атрибуты stub.delay, stub.prices,
+    stub.failures, stub.history и stub.payloads.
+    """
+    stub = DeribitStub()
+    await stub.start()
+    yield stub
+    await stub.stop()
+
+
+class DeribitStub:
+    def __init__(self):
+        self.delay = 0.0
+        self.prices = {}
+        self.server_time = None
+        self.failures = 0
+        self.history = {}
+        self.payloads = {}
+        self.requests = 0
+        self.history_requests = 0
+        self.runner = None
+        self.url = None
+
+    async def handle_index_price(self, request):
+        self.requests += 1
+        ticker = request.query.get("index_name")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            return web.json_response({"jsonrpc": "2.0", "error": {"message": "Internal error"}}, status=503)
+        if ticker in self.payloads:
+            payload = self.payloads[ticker]
+            if isinstance(payload, bytes):
+                return web.Response(body=payload, content_type="application/json")
+            return web.json_response(payload)
+        price = self.prices.get(ticker, 1000.0)
+        us_out = int((self.server_time or time.time()) * 1_000_000)
+        return web.json_response({"jsonrpc": "2.0", "result": {"index_price": price}, "usOut": us_out})
+
+    async def handle_index_chart_data(self, request):
+        self.history_requests += 1
+        ticker = request.query["index_name"]
+        if ticker in self.payloads:
+            payload = self.payloads[ticker]
+            if isinstance(payload, bytes):
+                return web.Response(body=payload, content_type="application/json")
+            return web.json_response(payload)
+        points = [[int(timestamp * 1000), price] for timestamp, price in self.history.get(ticker, [])]
+        return web.json_response({"jsonrpc": "2.0", "result": points})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/v2/public/get_index_price", self.handle_index_price)
+        app.router.add_get("/api/v2/public/get_index_chart_data", self.handle_index_chart_data)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/api/v2"
+
+    async def stop(self):
+        await self.runner.cleanup()
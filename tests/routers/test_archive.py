@@ -0,0 +1,26 @@
+import io
+
+import pytest
+from app import archive
+from tests.routers.test_prices import chunks_of
+
+
+@pytest.mark.asyncio
+async def test_export_streams_archive(client, mock_db):
+    """
+    Тестирует, что эндпоинт /export отдаёт архив с блоком на каждую пачку строк.
+    """
+    mock_db.iter_prices = chunks_of(
+        [("btc_usd", 50000.0, 1625077800), ("btc_usd", 50500.0, 1625078400)],
+        [("btc_usd", 51000.0, 1625079000)]
+    )
+
+    response = await client.get("/export", params={"ticker": "btc_usd"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == archive.MEDIA_TYPE
+    blocks = list(archive.read_blocks(io.BytesIO(response.content)))
+    assert [(ticker, list(ts), list(prices)) for ticker, ts, prices in blocks] == [
+        ("btc_usd", [1625077800, 1625078400], [50000.0, 50500.0]),
+        ("btc_usd", [1625079000], [51000.0]),
+    ]
@@ -0,0 +1,57 @@
+import pytest
+
+from app import metrics
+from app.models import PriceResponse
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_route_latency(client, mock_db):
+    """
+    Тестирует, что /metrics отдаёт метрики в текстовом формате Prometheus с временем ответа
+    по шаблону маршрута, а не по полному URL с параметрами.
+    """
+    mock_db.get_latest_price.return_value = PriceResponse(ticker="btc_usd", price=50000.0, timestamp=1625077800)
+    child = metrics.HTTP_REQUEST_SECONDS.labels("GET", "/latest_price", 200)
+    before = child.count
+
+    await client.get("/latest_price", params={"ticker": "btc_usd"})
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert child.count == before + 1
+    assert 'http_request_duration_seconds_count{method="GET",route="/latest_price",status="200"}' in response.text
+    assert "# TYPE db_query_duration_seconds histogram" in response.text
+    assert "ticker=btc_usd" not in response.text
+
+
+@pytest.mark.asyncio
+async def test_unknown_paths_share_one_series(client):
+    """
+    Тестирует, что запросы к несуществующим путям не порождают новые серии.
+    """
+    child = metrics.HTTP_REQUEST_SECONDS.labels("GET", "unmatched", 404)
+    before = child.count
+
+    await client.get("/no-such-path-1")
+    await client.get("/no-such-path-2")
+
+    assert child.count == before + 2
+
+
+@pytest.mark.asyncio
+async def test_cached_responses_keep_route_label(client, mock_db):
+    """
+    Тестирует, что ответ из кэша учитывается под шаблоном маршрута, а не как unmatched.
+    """
+    mock_db.get_latest_price.return_value = PriceResponse(ticker="btc_usd", price=50000.0, timestamp=1625077800)
+    child = metrics.HTTP_REQUEST_SECONDS.labels("GET", "/latest_price", 200)
+    unmatched = metrics.HTTP_REQUEST_SECONDS.labels("GET", "unmatched", 200)
+    before, unmatched_before = child.count, unmatched.count
+
+    for _ in range(3):
+        await client.get("/latest_price", params={"ticker": "btc_usd"})
+
+    mock_db.get_latest_price.assert_awaited_once()
+    assert child.count == before + 3
+    assert unmatched.count == unmatched_before
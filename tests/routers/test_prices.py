@@ -1,5 +1,7 @@
+import json
 import pytest
-from app.models import PriceResponse
+from app.models import OHLCResponse, PriceResponse
+from app.storage import PageCursor
 
 
 @pytest.mark.asyncio
@@ -363,3 +365,269 @@ async def test_get_all_prices_empty_ticker(client, mock_db):
     assert response.status_code == 404, f"Expected status 404, got {response.status_code}"
     data = response.json()
     assert data["detail"] == "No data found for the specified ticker"
+
+
+def chunks_of(*chunks):
+    async def iter_prices(*args, **kwargs):
+        for chunk in chunks:
+            yield chunk
+
+    return iter_prices
+
+
+@pytest.mark.asyncio
+async def test_get_all_prices_sets_next_page_header(client, mock_db):
+    """
+    Тестирует, что при заполненной странице эндпоинт /prices возвращает курсор следующей страницы.
+    """
+    mock_db.get_all_prices.return_value = [
+        PriceResponse(ticker="btc_usd", price=50000.0, timestamp=1625077800),
+        PriceResponse(ticker="btc_usd", price=50500.0, timestamp=1625078400)
+    ]
+
+    response = await client.get("/prices", params={"ticker": "btc_usd", "limit": 2, "after_timestamp": 1625077000})
+
+    assert response.status_code == 200
+    assert PageCursor.decode(response.headers["X-Next-Cursor"]) == (1625078400, 50500.0, 1)
+    mock_db.get_all_prices.assert_awaited_once_with("btc_usd", after_timestamp=1625077000, limit=2, cursor=None)
+
+
+@pytest.mark.asyncio
+async def test_get_all_prices_last_page_has_no_next_header(client, mock_db):
+    """
+    Тестирует, что на последней (неполной) странице заголовок следующей страницы отсутствует.
+    """
+    mock_db.get_all_prices.return_value = [PriceResponse(ticker="btc_usd", price=50000.0, timestamp=1625077800)]
+
+    response = await client.get("/prices", params={"ticker": "btc_usd", "limit": 2})
+
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_get_all_prices_passes_cursor(client, mock_db):
+    """
+    Тестирует, что курсор из заголовка передаётся в хранилище, а некорректный курсор отклоняется с 422.
+    """
+    cursor = PageCursor(1625077800, 50000.0, 2)
+    mock_db.get_all_prices.return_value = [PriceResponse(ticker="btc_usd", price=50000.0, timestamp=1625077800)]
+
+    response = await client.get("/prices", params={"ticker": "btc_usd", "limit": 1, "cursor": cursor.encode()})
+
+    assert response.status_code == 200
+    mock_db.get_all_prices.assert_awaited_once_with("btc_usd", after_timestamp=None, limit=1, cursor=cursor)
+    # Страница снова целиком из строк того же ключа: пропуск накапливается.
+    assert PageCursor.decode(response.headers["X-Next-Cursor"]) == (1625077800, 50000.0, 3)
+
+    response = await client.get("/prices", params={"ticker": "btc_usd", "cursor": "not a cursor"})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_all_prices_invalid_limit(client, mock_db):
+    """
+    Тестирует, что эндпоинт /prices возвращает 422 при нулевом размере страницы.
+    """
+    response = await client.get("/prices", params={"ticker": "btc_usd", "limit": 0})
+
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_filtered_prices_stream_ndjson(client, mock_db):
+    """
+    Тестирует потоковую выдачу /filtered_prices в формате NDJSON.
+    """
+    mock_db.iter_prices = chunks_of(
+        [("btc_usd", 50000.0, 1625077800), ("btc_usd", 50500.0, 1625078400)],
+        [("btc_usd", 51000.0, 1625079000)]
+    )
+
+    response = await client.get("/filtered_prices", params={"ticker": "btc_usd", "stream": "ndjson"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["price"] for line in lines] == [50000.0, 50500.0, 51000.0]
+    assert lines[0] == {"ticker": "btc_usd", "price": 50000.0, "timestamp": 1625077800}
+
+
+@pytest.mark.asyncio
+async def test_get_all_prices_stream_json_array(client, mock_db):
+    """
+    Тестирует потоковую выдачу /prices в виде JSON-массива, в том числе пустого.
+    """
+    mock_db.iter_prices = chunks_of(
+        [("btc_usd", 50000.0, 1625077800)],
+        [("btc_usd", 50500.0, 1625078400)]
+    )
+
+    response = await client.get("/prices", params={"ticker": "btc_usd", "stream": "json"})
+
+    assert response.status_code == 200
+    assert [item["price"] for item in response.json()] == [50000.0, 50500.0]
+
+    mock_db.iter_prices = chunks_of()
+    response = await client.get("/prices", params={"ticker": "btc_usd", "stream": "json"})
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_get_ohlc(client, mock_db):
+    """
+    Тестирует, что эндпоинт /ohlc передаёт размер корзины в секундах и возвращает свечи.
+    """
+    mock_db.get_ohlc.return_value = [
+        OHLCResponse(ticker="btc_usd", bucket=1625076000, open=1.0, high=3.0, low=0.5, close=2.0, count=60, mean=1.5)
+    ]
+
+    response = await client.get("/ohlc", params={"ticker": "btc_usd", "bucket": "5m", "start": 1, "end": 2})
+
+    assert response.status_code == 200
+    assert response.json()[0]["close"] == 2.0
+    mock_db.get_ohlc.assert_awaited_once_with("btc_usd", 300, 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_get_ohlc_invalid_bucket(client, mock_db):
+    """
+    Тестирует, что эндпоинт /ohlc возвращает 422 для неподдерживаемого размера корзины.
+    """
+    response = await client.get("/ohlc", params={"ticker": "btc_usd", "bucket": "7m"})
+
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_ohlc_not_found(client, mock_db):
+    """
+    Тестирует, что эндпоинт /ohlc возвращает 404, если данных нет.
+    """
+    response = await client.get("/ohlc", params={"ticker": "btc_usd"})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_all_prices_fast_format_matches_model(client, mock_db):
+    """
+    Тестирует, что format=fast отдаёт тот же JSON, что и обычный ответ, без построения моделей.
+    """
+    rows = [("btc_usd", 50000.0, 1625077800), ("btc_usd", 50500.5, 1625078400)]
+    mock_db.get_all_prices.return_value = [PriceResponse(ticker=t, price=p, timestamp=ts) for t, p, ts in rows]
+    mock_db.get_price_rows.return_value = rows
+
+    model = await client.get("/prices", params={"ticker": "btc_usd"})
+    fast = await client.get("/prices", params={"ticker": "btc_usd", "format": "fast"})
+
+    assert fast.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == model.json()
+    mock_db.get_price_rows.assert_awaited_once_with("btc_usd", after_timestamp=None, limit=None, cursor=None)
+
+
+@pytest.mark.asyncio
+async def test_get_filtered_prices_columnar_format(client, mock_db):
+    """
+    Тестирует колоночный формат ответа и заголовок следующей страницы.
+    """
+    mock_db.get_price_rows.return_value = [("btc_usd", 50000.0, 1625077800), ("btc_usd", 50500.0, 1625078400)]
+
+    response = await client.get("/filtered_prices", params={
+        "ticker": "btc_usd",
+        "start": 1625077000,
+        "limit": 2,
+        "format": "columnar"
+    })
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "ticker": "btc_usd",
+        "timestamps": [1625077800, 1625078400],
+        "prices": [50000.0, 50500.0],
+    }
+    assert PageCursor.decode(response.headers["X-Next-Cursor"]) == (1625078400, 50500.0, 1)
+    mock_db.get_price_rows.assert_awaited_once_with(
+        "btc_usd", 1625077000, None, after_timestamp=None, limit=2, cursor=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_fast_format_not_found(client, mock_db):
+    """
+    Тестирует, что быстрые форматы возвращают 404 при отсутствии данных, как и обычный ответ.
+    """
+    response = await client.get("/filtered_prices", params={"ticker": "btc_usd", "format": "fast"})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "No data found for the specified ticker and/or timeframe"
+
+
+@pytest.mark.asyncio
+async def test_get_latest_prices_batch(client, mock_db):
+    """
+    Тестирует эндпоинт /latest_prices: тикеры разбираются из строки через запятую без повторов.
+    """
+    mock_db.get_latest_prices.return_value = {
+        "btc_usd": PriceResponse(ticker="btc_usd", price=50000.0, timestamp=1625077800),
+        "eth_usd": PriceResponse(ticker="eth_usd", price=3000.0, timestamp=1625077800),
+    }
+
+    response = await client.get("/latest_prices", params={"tickers": "btc_usd, eth_usd,btc_usd"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "btc_usd": {"ticker": "btc_usd", "price": 50000.0, "timestamp": 1625077800},
+        "eth_usd": {"ticker": "eth_usd", "price": 3000.0, "timestamp": 1625077800},
+    }
+    mock_db.get_latest_prices.assert_awaited_once_with(["btc_usd", "eth_usd"])
+
+
+@pytest.mark.asyncio
+async def test_get_latest_prices_batch_not_found(client, mock_db):
+    """
+    Тестирует, что /latest_prices возвращает 404, если ни по одному тикеру нет данных.
+    """
+    response = await client.get("/latest_prices", params={"tickers": "xrp_usd"})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_filtered_prices_batch(client, mock_db):
+    """
+    Тестирует эндпоинт /filtered_prices/batch: ответ сгруппирован по тикерам, лимит передаётся на тикер.
+    """
+    mock_db.get_prices_batch.return_value = {
+        "btc_usd": [("btc_usd", 50000.0, 1625077800)],
+        "eth_usd": [],
+    }
+
+    response = await client.get("/filtered_prices/batch", params={
+        "tickers": "btc_usd,eth_usd",
+        "start": 1625077000,
+        "limit": 5
+    })
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "btc_usd": [{"ticker": "btc_usd", "price": 50000.0, "timestamp": 1625077800}],
+        "eth_usd": [],
+    }
+    mock_db.get_prices_batch.assert_awaited_once_with(["btc_usd", "eth_usd"], 1625077000, None, 5)
+
+
+@pytest.mark.asyncio
+async def test_batch_tickers_validation(client, mock_db, monkeypatch):
+    """
+    Тестирует, что пустой список тикеров и превышение лимита тикеров дают 422.
+    """
+    monkeypatch.setattr("app.routers.prices.settings.max_batch_tickers", 2)
+
+    empty = await client.get("/latest_prices", params={"tickers": " , "})
+    too_many = await client.get("/filtered_prices/batch", params={"tickers": "a,b,c"})
+
+    assert empty.status_code == 422
+    assert too_many.status_code == 422
+    mock_db.get_prices_batch.assert_not_awaited()
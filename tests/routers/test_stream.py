@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app.main import app
+from app.pubsub import PriceHub
+from app.routers.stream import get_hub, sse_events
+
+
+@pytest.fixture
+def hub():
+    """
+    Фикстура для подмены шины цен в приложении.
+    """
+    test_hub = PriceHub(queue_size=10)
+    app.dependency_overrides[get_hub] = lambda: test_hub
+    yield test_hub
+    app.dependency_overrides.pop(get_hub, None)
+
+
+class FakeRequest:
+    def __init__(self, disconnect_after: int):
+        self.checks = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.checks > self.disconnect_after
+
+
+def test_websocket_sends_latest_price(hub):
+    """
+    Тестирует, что WebSocket-подписка сразу отдаёт последнюю цену тикера.
+    """
+    hub.publish("btc_usd", 50000.0, 1625077800)
+
+    with TestClient(app).websocket_connect("/ws/prices?ticker=btc_usd") as websocket:
+        data = websocket.receive_json()
+
+    assert data == {"ticker": "btc_usd", "price": 50000.0, "timestamp": 1625077800}
+
+
+def test_websocket_requires_ticker(hub):
+    """
+    Тестирует, что подписка без параметра 'ticker' отклоняется.
+    """
+    with pytest.raises(WebSocketDisconnect):
+        with TestClient(app).websocket_connect("/ws/prices") as websocket:
+            websocket.receive_json()
+
+
+@pytest.mark.asyncio
+async def test_sse_events_format():
+    """
+    Тестирует формат событий Server-Sent Events для обновлений цены.
+    """
+    test_hub = PriceHub(queue_size=10)
+    test_hub.publish("btc_usd", 50000.0, 1625077800)
+    subscription = test_hub.subscribe("btc_usd")
+
+    events = [event async for event in sse_events(subscription, FakeRequest(disconnect_after=1))]
+
+    assert len(events) == 1
+    assert events[0].startswith("event: price\ndata: ")
+    payload = json.loads(events[0].split("data: ", 1)[1])
+    assert payload == {"ticker": "btc_usd", "price": 50000.0, "timestamp": 1625077800}
+    assert test_hub.subscriber_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_sse_events_keepalive_and_drop():
+    """
+    Тестирует, что при отсутствии обновлений отправляется keep-alive, а отключённый подписчик получает событие dropped.
+    """
+    test_hub = PriceHub(queue_size=1)
+    subscription = test_hub.subscribe("btc_usd")
+
+    events = sse_events(subscription, FakeRequest(disconnect_after=10), keepalive_interval=0.01)
+    assert await events.__anext__() == ": keep-alive\n\n"
+
+    test_hub.publish("btc_usd", 50000.0, 1625077800)
+    test_hub.publish("btc_usd", 50001.0, 1625077801)
+
+    assert await events.__anext__() == "event: dropped\ndata: {}\n\n"
+    with pytest.raises(StopAsyncIteration):
+        await events.__anext__()
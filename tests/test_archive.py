@@ -0,0 +1,112 @@
+import io
+import os
+from array import array
+
+import pytest
+from app import archive
+from app.database import Database
+
+BASE = 1625011200
+
+
+@pytest.fixture
+async def db(tmp_path):
+    """
+    Фикстура для создания временной базы данных.
+    """
+    test_db = Database(db_url=os.path.join(tmp_path, "archive.db"))
+    await test_db.initialize()
+    yield test_db
+    await test_db.close()
+
+
+@pytest.fixture
+async def target_db(tmp_path):
+    """
+    Фикстура для второй, пустой базы данных, в которую загружается архив.
+    """
+    test_db = Database(db_url=os.path.join(tmp_path, "imported.db"))
+    await test_db.initialize()
+    yield test_db
+    await test_db.close()
+
+
+async def export_bytes(db, tickers, start=None, end=None, chunk_size=1000):
+    return b"".join([data async for data in archive.iter_export(db, tickers, start, end, chunk_size=chunk_size)])
+
+
+def test_block_roundtrip():
+    """
+    Тестирует запись и чтение блоков: колонки восстанавливаются без потерь.
+    """
+    data = (
+        archive.encode_header()
+        + archive.encode_block("btc_usd", array("q", [BASE, BASE + 60]), array("d", [50000.5, 50001.25]))
+        + archive.encode_block("eth_usd", array("q"), array("d"))
+    )
+
+    blocks = list(archive.read_blocks(io.BytesIO(data)))
+
+    assert blocks == [
+        ("btc_usd", array("q", [BASE, BASE + 60]), array("d", [50000.5, 50001.25])),
+        ("eth_usd", array("q"), array("d")),
+    ]
+    # 16 байт на строку плюс заголовки блоков.
+    assert len(data) == 8 + (10 + 7 + 32) + (10 + 7)
+
+
+def test_read_blocks_rejects_corrupt_archive():
+    """
+    Тестирует ошибки формата: чужой файл и обрезанный блок.
+    """
+    with pytest.raises(archive.ArchiveFormatError):
+        list(archive.read_blocks(io.BytesIO(b"not an archive")))
+
+    block = archive.encode_block("btc_usd", array("q", [BASE]), array("d", [1.0]))
+    with pytest.raises(archive.ArchiveFormatError):
+        list(archive.read_blocks(io.BytesIO(archive.encode_header() + block[:-3])))
+
+
+@pytest.mark.asyncio
+async def test_export_import_roundtrip(db, target_db):
+    """
+    Тестирует выгрузку диапазона и загрузку в другую базу: строки, свечи и последняя цена совпадают.
+    """
+    rows = [(ticker, 100.0 + i % 37, BASE + i * 30) for ticker in ("btc_usd", "eth_usd") for i in range(5000)]
+    await db.insert_prices_bulk(rows)
+
+    data = await export_bytes(db, ["btc_usd", "eth_usd"], chunk_size=777)
+    imported = await archive.import_blocks(target_db, archive.read_blocks(io.BytesIO(data)), batch_rows=1500)
+
+    assert imported == len(rows)
+    for ticker in ("btc_usd", "eth_usd"):
+        assert await target_db.get_all_prices(ticker) == await db.get_all_prices(ticker)
+        assert await target_db.get_ohlc(ticker, 3600) == await db.get_ohlc(ticker, 3600)
+        assert await target_db.get_latest_price(ticker) == await db.get_latest_price(ticker)
+
+
+@pytest.mark.asyncio
+async def test_export_respects_range(db):
+    """
+    Тестирует, что выгрузка ограничивается тикером и диапазоном timestamp.
+    """
+    await db.insert_prices_bulk([("btc_usd", 1.0, BASE + i) for i in range(10)] + [("eth_usd", 2.0, BASE)])
+
+    data = await export_bytes(db, ["btc_usd"], BASE + 2, BASE + 5)
+    blocks = list(archive.read_blocks(io.BytesIO(data)))
+
+    assert [ticker for ticker, _, _ in blocks] == ["btc_usd"]
+    assert list(blocks[0][1]) == [BASE + 2, BASE + 3, BASE + 4, BASE + 5]
+
+
+@pytest.mark.asyncio
+async def test_import_rejects_negative_prices(target_db):
+    """
+    Тестирует, что архив с отрицательной ценой не загружается.
+    """
+    blocks = [("btc_usd", array("q", [BASE]), array("d", [-1.0]))]
+
+    with pytest.raises(ValueError, match="Price cannot be negative."):
+        await archive.import_blocks(target_db, blocks)
+
+    assert await target_db.get_all_prices("btc_usd") == []
@@ -0,0 +1,49 @@
+import argparse
+
+import pytest
+
+from benchmarks import compare, report, suite
+
+
+def test_compare_flags_regressions_in_both_directions():
+    """
+    Тестирует, что рост задержки и падение пропускной способности больше порога считаются регрессией,
+    а улучшения и метрики, которых нет в базовом отчёте, — нет.
+    """
+    baseline = {"results": {"asgi": {"prices": {"p50_us": 100.0, "p99_us": 200.0, "ops_per_s": 1000.0}}}}
+    current = {"results": {"asgi": {
+        "prices": {"p50_us": 120.0, "p99_us": 150.0, "ops_per_s": 800.0},
+        "latest_price": {"p50_us": 10.0},
+    }}}
+
+    rows = {row["metric"]: row for row in compare.compare(baseline, current, threshold=0.1)}
+
+    assert set(rows) == {"asgi.prices.p50_us", "asgi.prices.p99_us", "asgi.prices.ops_per_s"}
+    assert rows["asgi.prices.p50_us"]["regression"]
+    assert not rows["asgi.prices.p99_us"]["regression"]
+    assert rows["asgi.prices.ops_per_s"]["regression"]
+
+
+def test_summarize_percentiles():
+    """
+    Тестирует p50/p99 и пропускную способность по выборке задержек.
+    """
+    summary = report.summarize([float(i) for i in range(1, 101)], seconds=0.5)
+
+    assert summary["p50_us"] == 50.5
+    assert summary["p99_us"] == 100.0
+    assert summary["ops_per_s"] == 200.0
+
+
+@pytest.mark.asyncio
+async def test_suite_runs_on_small_history():
+    """
+    Тестирует, что набор бенчмарков проходит на маленькой истории без ошибочных ответов.
+    """
+    args = argparse.Namespace(seed=0, iterations=3, requests=20, concurrency=4, no_http=True)
+
+    result = await suite.run_size(1000, args)
+
+    assert set(result["database"]) >= {"get_latest_price", "get_price_rows_1h", "insert_prices_bulk_100"}
+    assert all(stats["errors"] == 0 for stats in result["asgi"].values())
+    assert suite.parse_size("50M") == 50_000_000
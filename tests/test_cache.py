@@ -0,0 +1,82 @@
+import os
+
+import pytest
+from app.cache import LatestPriceCache
+from app.database import Database
+
+
+@pytest.fixture
+async def db(tmp_path):
+    """
+    Фикстура для создания временной базы данных с проверкой кэша на каждом запросе.
+    """
+    test_db = Database(db_url=os.path.join(tmp_path, "cache.db"), latest_cache_validation_interval=0)
+    await test_db.initialize()
+    yield test_db
+    await test_db.close()
+
+
+def test_cache_ignores_older_updates():
+    """
+    Тестирует, что кэш не откатывает последнюю цену на более старую временную метку.
+    """
+    cache = LatestPriceCache()
+    cache.update("btc_usd", 50500.0, 1625078400)
+    cache.update("btc_usd", 50000.0, 1625077800)
+
+    assert cache.get("btc_usd").price == 50500.0
+    assert cache.get("eth_usd") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_is_warmed_from_existing_data(tmp_path):
+    """
+    Тестирует, что при инициализации кэш заполняется последними ценами из базы.
+    """
+    db_path = os.path.join(tmp_path, "warm.db")
+    writer = Database(db_url=db_path)
+    await writer.initialize()
+    await writer.insert_price("btc_usd", 50000.0, 1625077800)
+    await writer.insert_price("btc_usd", 50500.0, 1625078400)
+    await writer.insert_price("eth_usd", 2500.0, 1625077800)
+    await writer.close()
+
+    reader = Database(db_url=db_path)
+    await reader.initialize()
+    assert reader.latest_cache.get("btc_usd").price == 50500.0
+    assert reader.latest_cache.get("eth_usd").price == 2500.0
+    await reader.close()
+
+
+@pytest.mark.asyncio
+async def test_latest_price_served_without_reader_connection(db, monkeypatch):
+    """
+    Тестирует, что последняя цена отдаётся из кэша без обращения к соединениям на чтение.
+    """
+    await db.insert_price("btc_usd", 50000.0, 1625077800)
+
+    def fail_reader():
+        raise AssertionError("reader connection must not be used")
+
+    monkeypatch.setattr(db.pool, "reader", fail_reader)
+    latest = await db.get_latest_price("btc_usd")
+    assert latest.price == 50000.0
+    assert await db.get_latest_price("unknown_ticker") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_sees_writes_from_other_process(db):
+    """
+    Тестирует, что запись из другого соединения (другого воркера) обнаруживается через data_version.
+    """
+    await db.insert_price("btc_usd", 50000.0, 1625077800)
+
+    other_worker = Database(db_url=db.db_url)
+    await other_worker.initialize()
+    await other_worker.insert_price("btc_usd", 51000.0, 1625078400)
+    await other_worker.insert_price("eth_usd", 2500.0, 1625078400)
+    await other_worker.close()
+
+    latest = await db.get_latest_price("btc_usd")
+    assert latest.price == 51000.0
+    assert (await db.get_latest_price("eth_usd")).price == 2500.0
@@ -1,7 +1,9 @@
 import asyncio
 import pytest
 from app.database import Database
+from app.storage import PageCursor
 import os
+import time
 
 
 @pytest.fixture
@@ -13,6 +15,7 @@ async def db(tmp_path):
     test_db = Database(db_url=db_path)
     await test_db.initialize()
     yield test_db
+    await test_db.close()
     if os.path.exists(db_path):
         os.remove(db_path)
 
@@ -234,3 +237,236 @@ async def test_multiple_tickers_separation(db):
 
     for price in eth_prices:
         assert price.ticker == "eth_usd", "Некорректный тикер в записях eth_usd."
+
+
+@pytest.mark.asyncio
+async def test_insert_prices_bulk(db):
+    """
+    Тестирует пакетную вставку цен нескольких тикеров одной транзакцией.
+    """
+    rows = [("btc_usd", 50000.0 + i, 1625077800 + i) for i in range(100)]
+    rows += [("eth_usd", 2500.0 + i, 1625077800 + i) for i in range(100)]
+
+    inserted = await db.insert_prices_bulk(rows)
+    assert inserted == 200
+
+    btc_prices = await db.get_all_prices("btc_usd")
+    eth_prices = await db.get_all_prices("eth_usd")
+    assert len(btc_prices) == 100
+    assert len(eth_prices) == 100
+
+    latest = await db.get_latest_price("eth_usd")
+    assert latest.price == 2599.0
+
+
+@pytest.mark.asyncio
+async def test_insert_prices_bulk_is_atomic(db):
+    """
+    Тестирует, что пакет с некорректной строкой отклоняется целиком и ничего не записывается.
+    """
+    rows = [("btc_usd", 50000.0, 1625077800), ("btc_usd", -1.0, 1625077860)]
+
+    with pytest.raises(ValueError):
+        await db.insert_prices_bulk(rows)
+
+    assert await db.get_all_prices("btc_usd") == []
+    assert await db.get_latest_price("btc_usd") is None
+
+
+@pytest.mark.asyncio
+async def test_insert_prices_bulk_empty(db):
+    """
+    Тестирует, что пустой пакет не приводит к ошибке.
+    """
+    assert await db.insert_prices_bulk([]) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_filtered_prices_open_ranges(db):
+    """
+    Тестирует, что границы 'start' и 'end' применяются независимо друг от друга.
+    """
+    await db.insert_prices_bulk([("btc_usd", 50000.0 + i, 1625077800 + i * 60) for i in range(5)])
+
+    only_start = await db.get_filtered_prices("btc_usd", 1625077800 + 180, None)
+    assert [p.price for p in only_start] == [50003.0, 50004.0]
+
+    only_end = await db.get_filtered_prices("btc_usd", None, 1625077800 + 60)
+    assert [p.price for p in only_end] == [50000.0, 50001.0]
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination(db):
+    """
+    Тестирует постраничную выдачу через after_timestamp и limit: страницы идут подряд без пропусков и повторов.
+    """
+    await db.insert_prices_bulk([("btc_usd", 50000.0 + i, 1625077800 + i * 60) for i in range(10)])
+
+    pages = []
+    after = None
+    while True:
+        page = await db.get_all_prices("btc_usd", after_timestamp=after, limit=4)
+        if not page:
+            break
+        pages.append([p.price for p in page])
+        after = page[-1].timestamp
+
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert sum(pages, []) == [50000.0 + i for i in range(10)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("base", [0, None], ids=["sqlite", "hot_tier"])
+async def test_cursor_pagination_keeps_duplicate_timestamps(db, base):
+    """
+    Тестирует, что курсор страницы не теряет строки с одинаковым timestamp (в том числе полностью
+    одинаковые) на границе страниц — ни при чтении из SQLite, ни из горячего слоя.
+    """
+    base = int(time.time()) - 3600 if base is None else 1625077800
+    prices = [1.0, 2.0, 3.0, 4.0, 5.0, 5.0, 5.0, 6.0]
+    offsets = [100, 200, 200, 300, 400, 400, 400, 400]
+    await db.insert_prices_bulk([("btc_usd", price, base + offset) for price, offset in zip(prices, offsets)])
+
+    for limit in (1, 2, 3):
+        returned, cursor = [], None
+        while True:
+            rows = await db.get_price_rows("btc_usd", start=base, limit=limit, cursor=cursor)
+            returned += [row[1] for row in rows]
+            if len(rows) < limit:
+                break
+            cursor = PageCursor.after(rows, cursor)
+        assert returned == prices, f"limit={limit}"
+
+    cursor = PageCursor(base + 400, 5.0, 2)
+    streamed = [row[1] async for chunk in db.iter_prices("btc_usd", cursor=cursor, chunk_size=1) for row in chunk]
+    assert streamed == [5.0, 6.0]
+
+
+@pytest.mark.asyncio
+async def test_history_version_changes_on_writes_into_closed_ranges(db):
+    """
+    Тестирует, что history_version растёт при записи строк старше окна догрузки (обычной вставкой
+    и импортом) и не меняется при записи свежих цен.
+    """
+    now = int(time.time())
+    assert await db.history_version() == 0
+
+    await db.insert_prices_bulk([("btc_usd", 50000.0, now)])
+    assert await db.history_version() == 0
+
+    await db.insert_prices_bulk([("btc_usd", 50000.0, now), ("btc_usd", 49000.0, 1625077800)])
+    assert await db.history_version() == 1
+
+    await db.import_prices_bulk([("eth_usd", 2000.0, 1625077800)])
+    assert await db.history_version() == 2
+
+
+@pytest.mark.asyncio
+async def test_iter_prices_chunks(db):
+    """
+    Тестирует потоковую выдачу пачками, включая дубликаты временных меток на границе пачек и ограничение limit.
+    """
+    rows = [("btc_usd", 50000.0 + i, 1625077800 + (i // 2) * 60) for i in range(25)]
+    await db.insert_prices_bulk(rows)
+
+    chunks = [chunk async for chunk in db.iter_prices("btc_usd", chunk_size=4)]
+    assert [len(chunk) for chunk in chunks] == [4, 4, 4, 4, 4, 4, 1]
+    assert sorted(row[1] for chunk in chunks for row in chunk) == [row[1] for row in rows]
+
+    limited = [row async for chunk in db.iter_prices("btc_usd", limit=10, chunk_size=4) for row in chunk]
+    assert len(limited) == 10
+
+    ranged = [row async for chunk in db.iter_prices("btc_usd", 1625077800 + 60, 1625077800 + 120) for row in chunk]
+    assert [row[1] for row in ranged] == [50002.0, 50003.0, 50004.0, 50005.0]
+
+
+@pytest.mark.asyncio
+async def test_get_ohlc(db):
+    """
+    Тестирует агрегацию цен в свечи: open/high/low/close/count/mean по каждой корзине.
+    """
+    base = 1625077800 - 1625077800 % 3600
+    rows = [
+        ("btc_usd", 100.0, base + 10),
+        ("btc_usd", 120.0, base + 600),
+        ("btc_usd", 90.0, base + 1200),
+        ("btc_usd", 110.0, base + 3599),
+        ("btc_usd", 200.0, base + 3600),
+        ("eth_usd", 1.0, base + 20),
+    ]
+    await db.insert_prices_bulk(rows)
+
+    candles = await db.get_ohlc("btc_usd", 3600)
+
+    assert len(candles) == 2
+    first, second = candles
+    assert first.bucket == base
+    assert (first.open, first.high, first.low, first.close) == (100.0, 120.0, 90.0, 110.0)
+    assert first.count == 4
+    assert first.mean == pytest.approx(105.0)
+    assert (second.bucket, second.open, second.close, second.count) == (base + 3600, 200.0, 200.0, 1)
+
+
+@pytest.mark.asyncio
+async def test_get_ohlc_range_and_duplicate_timestamps(db):
+    """
+    Тестирует, что свечи учитывают диапазон, а при одинаковых timestamp open/close определяются порядком вставки.
+    """
+    await db.insert_prices_bulk([
+        ("btc_usd", 1.0, 0),
+        ("btc_usd", 2.0, 60),
+        ("btc_usd", 3.0, 60),
+        ("btc_usd", 4.0, 120),
+    ])
+
+    candles = await db.get_ohlc("btc_usd", 300, start=60, end=60)
+
+    assert len(candles) == 1
+    assert (candles[0].open, candles[0].close, candles[0].count) == (2.0, 3.0, 2)
+
+
+@pytest.mark.asyncio
+async def test_get_ohlc_negative_timestamps_floor(db):
+    """
+    Тестирует, что отрицательные timestamp попадают в корзину, округлённую вниз.
+    """
+    await db.insert_price("btc_usd", 1.0, -30)
+
+    candles = await db.get_ohlc("btc_usd", 60)
+    assert candles[0].bucket == -60
+
+
+@pytest.mark.asyncio
+async def test_get_prices_batch(db):
+    """
+    Тестирует выборку по нескольким тикерам одним запросом: лимит применяется к каждому тикеру,
+    а строки совпадают с выборкой по одному тикеру.
+    """
+    rows = [(ticker, 100.0 + i, 1625077800 + (i // 2) * 60) for ticker in ("btc_usd", "eth_usd") for i in range(10)]
+    await db.insert_prices_bulk(rows)
+
+    batch = await db.get_prices_batch(["eth_usd", "btc_usd", "xrp_usd"], 1625077800 + 60, None, limit=3)
+
+    assert list(batch) == ["eth_usd", "btc_usd", "xrp_usd"]
+    assert batch["xrp_usd"] == []
+    for ticker in ("btc_usd", "eth_usd"):
+        single = await db.get_filtered_prices(ticker, 1625077800 + 60, None, limit=3)
+        assert [tuple(row) for row in batch[ticker]] == [(p.ticker, p.price, p.timestamp) for p in single]
+
+    unlimited = await db.get_prices_batch(["btc_usd"], None, 1625077800 + 60)
+    assert [row[1] for row in unlimited["btc_usd"]] == [100.0, 101.0, 102.0, 103.0]
+
+
+@pytest.mark.asyncio
+async def test_get_latest_prices(db):
+    """
+    Тестирует получение последних цен по нескольким тикерам; отсутствующие тикеры пропускаются.
+    """
+    await db.insert_prices_bulk([("btc_usd", 1.0, 100), ("btc_usd", 2.0, 200), ("eth_usd", 3.0, 150)])
+
+    latest = await db.get_latest_prices(["btc_usd", "eth_usd", "xrp_usd"])
+
+    assert {ticker: (p.price, p.timestamp) for ticker, p in latest.items()} == {
+        "btc_usd": (2.0, 200),
+        "eth_usd": (3.0, 150),
+    }
@@ -0,0 +1,135 @@
+import os
+import random
+import time
+
+import pytest
+from app.database import Database
+from app.hot_tier import HotTier
+
+
+@pytest.fixture
+async def db(tmp_path):
+    """
+    Фикстура для создания временной базы данных с горячим слоем на один час.
+    """
+    test_db = Database(
+        db_url=os.path.join(tmp_path, "hot.db"), latest_cache_validation_interval=0, hot_tier_window=3600
+    )
+    await test_db.initialize()
+    yield test_db
+    await test_db.close()
+
+
+def test_hot_tier_keeps_sql_order_and_trims():
+    """
+    Тестирует порядок строк (timestamp, price, порядок вставки) и отрезание строк за пределами окна.
+    """
+    tier = HotTier(window=100, trim_slack=10)
+    tier.load(1000, [])
+    tier.extend([("btc_usd", 5.0, 1010), ("btc_usd", 3.0, 1005), ("btc_usd", 4.0, 1010), ("btc_usd", 1.0, 900)])
+
+    assert tier.query("btc_usd", 1000) == [("btc_usd", 3.0, 1005), ("btc_usd", 4.0, 1010), ("btc_usd", 5.0, 1010)]
+    assert tier.query("btc_usd", 1006, 1010, limit=1) == [("btc_usd", 4.0, 1010)]
+    assert tier.query("eth_usd", 1000) == []
+
+    tier.extend([("btc_usd", 6.0, 1111)])
+
+    assert tier.since == 1011
+    assert tier.covers(1011) and not tier.covers(1010)
+    assert tier.query("btc_usd", 0) == [("btc_usd", 6.0, 1111)]
+
+
+@pytest.mark.asyncio
+async def test_filtered_prices_match_sqlite(db, monkeypatch):
+    """
+    Тестирует, что ответы горячего слоя совпадают с ответами SQLite, включая пагинацию.
+    """
+    now = int(time.time())
+    rng = random.Random(7)
+    rows = [
+        (rng.choice(["btc_usd", "eth_usd"]), float(rng.randrange(100)), now - rng.randrange(7200))
+        for _ in range(2000)
+    ]
+    await db.insert_prices_bulk(rows)
+
+    cases = [
+        ("btc_usd", now - 600, None, None, None),
+        ("eth_usd", now - 3000, now - 1000, None, 50),
+        ("btc_usd", None, None, now - 1200, 30),
+        ("btc_usd", now - 5000, None, None, None),
+        ("xrp_usd", now - 60, None, None, None),
+    ]
+    expected = [await db._select_rows(*case) for case in cases]
+
+    calls = []
+    original = db._select_rows
+
+    async def tracked(*args, **kwargs):
+        calls.append(args)
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(db, "_select_rows", tracked)
+    for case, result in zip(cases, expected):
+        assert await db.get_price_rows(*case) == result
+
+    # В SQLite уходит только запрос, начало которого выходит за окно.
+    assert [args[0:2] for args in calls] == [("btc_usd", now - 5000)]
+
+
+@pytest.mark.asyncio
+async def test_hot_tier_sees_writes_from_other_process(db, tmp_path):
+    """
+    Тестирует, что после записи из другого процесса горячий слой перечитывается из базы.
+    """
+    now = int(time.time())
+    await db.insert_price("btc_usd", 100.0, now - 10)
+    assert len(await db.get_filtered_prices("btc_usd", now - 60, None)) == 1
+
+    other = Database(db_url=os.path.join(tmp_path, "hot.db"))
+    await other.initialize()
+    await other.insert_price("btc_usd", 101.0, now - 5)
+    await other.insert_price("eth_usd", 50.0, now - 5)
+    await other.close()
+
+    assert [p.price for p in await db.get_filtered_prices("btc_usd", now - 60, None)] == [100.0, 101.0]
+    assert [p.price for p in await db.get_filtered_prices("eth_usd", now - 60, None)] == [50.0]
+
+
+@pytest.mark.asyncio
+async def test_hot_tier_catches_up_without_full_reload(db, tmp_path, monkeypatch):
+    """
+    Тестирует, что записи другого процесса (в том числе догруженные задним числом и вперемешку
+    с собственными вставками) дополняют горячий слой по rowid без полной перезагрузки окна,
+    а изменение закрытой истории перечитывает окно целиком.
+    """
+    now = int(time.time())
+    await db.insert_price("btc_usd", 100.0, now - 10)
+    assert len(await db.get_filtered_prices("btc_usd", now - 60, None)) == 1
+    reloads = []
+    reload_hot_tier = db.reload_hot_tier
+
+    async def counting_reload():
+        reloads.append(1)
+        await reload_hot_tier()
+
+    monkeypatch.setattr(db, "reload_hot_tier", counting_reload)
+
+    other = Database(db_url=os.path.join(tmp_path, "hot.db"))
+    await other.initialize()
+    try:
+        await other.insert_price("btc_usd", 101.0, now - 5)
+        await other.insert_price("btc_usd", 99.0, now - 30)
+        await db.insert_price("btc_usd", 102.0, now - 1)
+        assert [p.price for p in await db.get_filtered_prices("btc_usd", now - 60, None)] == [99.0, 100.0, 101.0, 102.0]
+
+        await db.insert_price("btc_usd", 103.0, now)
+        await other.insert_price("btc_usd", 104.0, now)
+        rows = await db.get_price_rows("btc_usd", now - 60)
+        assert [row[1] for row in rows] == [99.0, 100.0, 101.0, 102.0, 103.0, 104.0]
+        assert reloads == []
+
+        await other.import_prices_bulk([("btc_usd", 1.0, 1625077800)])
+        assert len(await db.get_price_rows("btc_usd", now - 60)) == 6
+        assert reloads == [1]
+    finally:
+        await other.close()
@@ -0,0 +1,157 @@
+import pytest
+from app.config import settings
+from app.http_cache import CachedResponse, ResponseCache, cache_key, cache_ttl
+from app.main import app
+from app.models import PriceResponse
+from app.storage import closed_range_age
+
+PRICES = [PriceResponse(ticker="btc_usd", price=50000.0, timestamp=1625077800)]
+
+
+def entry(body: bytes, expires_at: float = float("inf")) -> CachedResponse:
+    return CachedResponse(200, [], body, last_modified=0, expires_at=expires_at, immutable=False)
+
+
+def test_response_cache_evicts_least_recently_used():
+    """
+    Тестирует LRU-вытеснение по числу записей и по суммарному размеру, а также истечение TTL.
+    """
+    cache = ResponseCache(max_entries=2, max_bytes=10, max_entry_bytes=8)
+    cache.put("a", entry(b"1111"))
+    cache.put("b", entry(b"2222"))
+    assert cache.get("a") is not None
+    cache.put("c", entry(b"33"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+    cache.put("d", entry(b"44444444"))
+    assert cache.get("a") is None and cache.size == 10
+    cache.put("e", entry(b"555555555"))
+    assert cache.get("e") is None
+
+    cache.put("f", entry(b"6", expires_at=100))
+    assert cache.get("f", now=99) is not None
+    assert cache.get("f", now=100) is None
+
+
+def test_cache_key_and_ttl_policy(monkeypatch):
+    """
+    Тестирует нормализацию ключа и выбор времени жизни: открытые диапазоны живут до следующего тика
+    загрузки, закрытые исторические — immutable, потоковые ответы не кэшируются. Диапазон в пределах окна
+    догрузки пропусков ещё открыт, а end учитывается только эндпоинтами, которые по нему фильтруют.
+    """
+    monkeypatch.setattr(settings, "fetch_interval", 60)
+    monkeypatch.setattr(settings, "http_cache_tick_grace", 1.0)
+    now = 1700000000
+    # now на 20 секунд позже границы минуты: до следующего тика и записи его данных 41 секунда.
+    open_ttl = (41.0, False)
+    immutable = (settings.http_cache_immutable_ttl, True)
+    assert closed_range_age() == max(settings.fetch_interval, settings.backfill_max_age)
+    assert cache_key("/prices", b"ticker=btc_usd&limit=5") == cache_key("/prices", b"limit=5&ticker=btc_usd")
+    assert cache_ttl("/latest_price", {"ticker": "btc_usd"}, now) == open_ttl
+    assert cache_ttl("/filtered_prices", {"end": str(now)}, now) == open_ttl
+    assert cache_ttl("/filtered_prices", {"end": "1625079000"}, now) == immutable
+    assert cache_ttl("/ohlc", {"end": "1625079000"}, now) == immutable
+    assert cache_ttl("/filtered_prices/batch", {"end": "1625079000"}, now) == immutable
+    backfilled = str(now - 2 * settings.fetch_interval)
+    assert cache_ttl("/filtered_prices", {"end": backfilled}, now) == open_ttl
+    assert cache_ttl("/prices", {"ticker": "btc_usd", "end": "1"}, now) == open_ttl
+    assert cache_ttl("/prices", {"stream": "ndjson"}, now) is None
+    assert cache_ttl("/export", {}, now) is None
+
+
+def test_open_ttl_follows_fetch_ticks(monkeypatch):
+    """
+    Тестирует, что открытый ответ истекает на границе тика загрузки, а не через fetch_interval после
+    вставки: ответ, собранный сразу после границы, ещё до записи данных тика, живёт только grace секунд.
+    В режиме websocket последние цены не кэшируются.
+    """
+    monkeypatch.setattr(settings, "fetch_interval", 60)
+    monkeypatch.setattr(settings, "http_cache_tick_grace", 1.0)
+    boundary = 1700000040
+    assert cache_ttl("/prices", {}, boundary - 0.5) == (1.5, False)
+    assert cache_ttl("/prices", {}, boundary + 0.25) == (0.75, False)
+    assert cache_ttl("/prices", {}, boundary + 1) == (60.0, False)
+    assert cache_ttl("/prices", {}, boundary + 59) == (2.0, False)
+
+    monkeypatch.setattr(settings, "ingestion_mode", "websocket")
+    assert cache_ttl("/latest_price", {"ticker": "btc_usd"}, boundary) is None
+    assert cache_ttl("/latest_prices", {}, boundary) is None
+    assert cache_ttl("/prices", {}, boundary + 30) == (31.0, False)
+
+
+@pytest.mark.asyncio
+async def test_repeated_request_is_served_from_cache(client, mock_db):
+    """
+    Тестирует, что повторный запрос отдаётся из кэша без обращения к базе и с заголовками кэширования.
+    """
+    mock_db.get_latest_price.return_value = PRICES[0]
+
+    first = await client.get("/latest_price", params={"ticker": "btc_usd"})
+    second = await client.get("/latest_price", params={"ticker": "btc_usd"})
+
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.headers["cache-control"].startswith("public, max-age=")
+    assert "last-modified" in second.headers
+    mock_db.get_latest_price.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_if_none_match_returns_not_modified(client, mock_db):
+    """
+    Тестирует ответ 304 на If-None-Match с актуальным ETag и immutable для закрытого диапазона.
+    """
+    mock_db.get_filtered_prices.return_value = PRICES
+    params = {"ticker": "btc_usd", "start": 1625077000, "end": 1625079000}
+
+    first = await client.get("/filtered_prices", params=params)
+    assert "immutable" in first.headers["cache-control"]
+
+    etag = first.headers["etag"]
+    revalidated = await client.get("/filtered_prices", params=params, headers={"If-None-Match": etag})
+    changed = await client.get("/filtered_prices", params=params, headers={"If-None-Match": '"other"'})
+
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+    assert changed.status_code == 200
+    mock_db.get_filtered_prices.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_closed_range_is_refetched_after_history_changes(client, mock_db):
+    """
+    Тестирует, что закрытый диапазон перечитывается из базы, когда history_version хранилища
+    изменился (импорт архива или воспроизведение прошлых данных), и отдаётся из кэша, пока он прежний.
+    """
+    mock_db.get_filtered_prices.return_value = PRICES
+    mock_db.history_version.side_effect = [1, 1, 2]
+    params = {"ticker": "btc_usd", "start": 1625077000, "end": 1625079000}
+    app.state.database = mock_db
+    try:
+        for _ in range(3):
+            response = await client.get("/filtered_prices", params=params)
+            assert response.status_code == 200
+    finally:
+        del app.state.database
+
+    assert mock_db.get_filtered_prices.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_and_no_cache_requests_bypass_cache(client, mock_db):
+    """
+    Тестирует, что 404 не кэшируется, а запрос с Cache-Control: no-cache идёт в базу.
+    """
+    missing = await client.get("/latest_price", params={"ticker": "btc_usd"})
+    assert missing.status_code == 404
+    assert "etag" not in missing.headers
+
+    mock_db.get_latest_price.return_value = PRICES[0]
+    await client.get("/latest_price", params={"ticker": "btc_usd"})
+    await client.get("/latest_price", params={"ticker": "btc_usd"}, headers={"Cache-Control": "no-cache"})
+
+    assert mock_db.get_latest_price.await_count == 3
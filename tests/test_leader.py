@@ -0,0 +1,143 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+from app.database import Database
+from app.leader import FileLeaderLock, LeaderElection
+from app.pubsub import LatestPricePoller, PriceHub
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    async def elected(self):
+        self.events.append("elected")
+
+    async def demoted(self):
+        self.events.append("demoted")
+
+
+@pytest.mark.asyncio
+async def test_file_lock_is_exclusive(tmp_path):
+    """
+    Тестирует, что блокировку ведущего берёт только один держатель, а после освобождения — следующий.
+    """
+    path = os.path.join(tmp_path, "prices.db.leader")
+    first, second = FileLeaderLock(path), FileLeaderLock(path)
+
+    assert await first.acquire()
+    assert await first.acquire()
+    assert not await second.acquire()
+
+    await first.release()
+    assert await second.acquire()
+    await second.release()
+
+
+@pytest.mark.asyncio
+async def test_failover_when_leader_process_dies(tmp_path):
+    """
+    Тестирует автоматическое переизбрание: блокировка убитого процесса освобождается ОС.
+    """
+    path = os.path.join(tmp_path, "prices.db.leader")
+    holder = subprocess.Popen(
+        [sys.executable, "-c", (
+            "import fcntl, os, sys, time\n"
+            f"fd = os.open({path!r}, os.O_RDWR | os.O_CREAT)\n"
+            "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+            "print('locked', flush=True)\n"
+            "time.sleep(60)\n"
+        )],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        assert holder.stdout.readline().strip() == b"locked"
+        recorder = Recorder()
+        election = LeaderElection(FileLeaderLock(path), recorder.elected, recorder.demoted, interval=0.05)
+
+        await election.start()
+        assert not election.is_leader
+
+        holder.kill()
+        holder.wait()
+        for _ in range(100):
+            if election.is_leader:
+                break
+            await asyncio.sleep(0.05)
+
+        assert election.is_leader
+        await election.close()
+        assert recorder.events == ["elected", "demoted"]
+    finally:
+        holder.kill()
+        holder.wait()
+        holder.stdout.close()
+
+
+@pytest.mark.asyncio
+async def test_only_one_election_wins(tmp_path):
+    """
+    Тестирует, что из нескольких процессов загрузку запускает один, а при его остановке её подхватывает другой.
+    """
+    path = os.path.join(tmp_path, "prices.db.leader")
+    recorders = [Recorder() for _ in range(3)]
+    elections = [LeaderElection(FileLeaderLock(path), r.elected, r.demoted, interval=3600) for r in recorders]
+    for election in elections:
+        await election.start()
+
+    assert [election.is_leader for election in elections] == [True, False, False]
+
+    await elections[0].close()
+    assert [await election.run_once() for election in elections[1:]] == [True, False]
+    assert [r.events for r in recorders] == [["elected", "demoted"], ["elected"], []]
+
+    for election in elections[1:]:
+        await election.close()
+
+
+@pytest.mark.asyncio
+async def test_leader_demoted_when_lock_lost(tmp_path):
+    """
+    Тестирует, что ведущий останавливает загрузку, если блокировка перестала ему принадлежать.
+    """
+    lock = FileLeaderLock(os.path.join(tmp_path, "prices.db.leader"))
+    recorder = Recorder()
+    election = LeaderElection(lock, recorder.elected, recorder.demoted, interval=3600)
+    await election.start()
+
+    async def lost():
+        return False
+
+    lock.held = lost
+    assert not await election.run_once()
+    assert recorder.events == ["elected", "demoted"]
+    await election.close()
+    assert recorder.events == ["elected", "demoted"]
+
+
+@pytest.mark.asyncio
+async def test_latest_price_poller_publishes_new_prices(tmp_path):
+    """
+    Тестирует, что ведомый публикует в шину только цены новее уже опубликованных.
+    """
+    db = Database(db_url=os.path.join(tmp_path, "prices.db"))
+    await db.initialize()
+    hub = PriceHub()
+    subscription = hub.subscribe("btc_usd")
+    poller = LatestPricePoller(db, hub, tickers=["btc_usd", "eth_usd"])
+    try:
+        await db.insert_prices_bulk([("btc_usd", 1.0, 100), ("eth_usd", 2.0, 100)])
+        assert await poller.poll_once() == 2
+        assert await poller.poll_once() == 0
+
+        await db.insert_price("btc_usd", 3.0, 160)
+        assert await poller.poll_once() == 1
+
+        assert [(await subscription.get()).price for _ in range(2)] == [1.0, 3.0]
+        assert db.leader_lock().path == os.path.join(tmp_path, "prices.db.leader")
+    finally:
+        hub.close()
+        await db.close()
@@ -0,0 +1,82 @@
+import pytest
+
+from app import metrics
+from app.metrics import Counter, Histogram, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    Тестирует, что гистограмма выдаёт накопительные корзины, сумму и количество в формате Prometheus.
+    """
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    child = histogram.labels("/prices")
+    for value in (0.05, 0.1, 0.5, 3.0):
+        child.observe(value)
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/prices",le="0.1"} 2',
+        'latency_seconds_bucket{route="/prices",le="1"} 3',
+        'latency_seconds_bucket{route="/prices",le="+Inf"} 4',
+        'latency_seconds_sum{route="/prices"} 3.65',
+        'latency_seconds_count{route="/prices"} 4',
+    ]
+
+
+def test_metric_kind_must_implement_children_and_samples():
+    """
+    Тестирует, что вид метрики без своих серий и строк выдачи нельзя создать.
+    """
+    class Gauge(metrics._Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError):
+        Gauge("queue_depth", "Queue depth.")
+
+
+def test_counter_children_are_cached_and_escaped():
+    """
+    Тестирует, что серия для набора меток создаётся один раз, а обратная косая черта, кавычки
+    и переводы строк в значениях экранируются.
+    """
+    counter = Counter("events_total", "Events.", ("name",))
+    assert counter.labels('a"b') is counter.labels('a"b')
+    counter.labels('a"b').inc()
+    counter.labels('a"b').inc(2)
+    counter.labels("c\\d\ne").inc()
+
+    assert counter.render()[-2:] == ['events_total{name="a\\"b"} 3', 'events_total{name="c\\\\d\\ne"} 1']
+    with pytest.raises(ValueError):
+        counter.labels("x", "y")
+
+
+def test_registry_rejects_duplicates():
+    """
+    Тестирует, что реестр не позволяет зарегистрировать две метрики с одним именем.
+    """
+    registry = Registry()
+    registry.counter("events_total", "Events.")
+    with pytest.raises(ValueError):
+        registry.counter("events_total", "Events.")
+    assert registry.render().startswith("# HELP events_total Events.\n")
+
+
+@pytest.mark.asyncio
+async def test_database_methods_record_latency_and_rows(test_db):
+    """
+    Тестирует, что методы Database записывают время запроса, число строк и ожидание соединения.
+    """
+    rows_metric = metrics.DB_ROWS.labels("sqlite", "get_price_rows")
+    latency = metrics.DB_QUERY_SECONDS.labels("sqlite", "insert_prices_bulk")
+    wait = metrics.DB_POOL_WAIT_SECONDS.labels("sqlite", "reader")
+    rows_before, sum_before = rows_metric.count, rows_metric.sum
+    latency_before, wait_before = latency.count, wait.count
+
+    await test_db.insert_prices_bulk([("btc_usd", 50000.0, 1000), ("btc_usd", 50100.0, 1060)])
+    await test_db.get_price_rows("btc_usd")
+
+    assert latency.count == latency_before + 1
+    assert rows_metric.count == rows_before + 1
+    assert rows_metric.sum == sum_before + 2
+    assert wait.count > wait_before
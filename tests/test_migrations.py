@@ -0,0 +1,89 @@
+import os
+import sqlite3
+
+import pytest
+from app.database import Database
+from app.migrations import LATEST_VERSION, get_schema_version, migrate
+
+
+@pytest.fixture
+def legacy_db_path(tmp_path):
+    """
+    Фикстура для создания базы данных в старом формате: таблица без индекса и без версии схемы.
+    """
+    db_path = os.path.join(tmp_path, "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE crypto_prices (ticker TEXT, price REAL, timestamp INTEGER)")
+    conn.executemany(
+        "INSERT INTO crypto_prices (ticker, price, timestamp) VALUES (?, ?, ?)",
+        [("btc_usd", 50000.0 + i, 1625077800 + i * 60) for i in range(10)]
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+@pytest.mark.asyncio
+async def test_fresh_database_is_at_latest_version(tmp_path):
+    """
+    Тестирует, что новая база данных сразу получает последнюю версию схемы.
+    """
+    db = Database(db_url=os.path.join(tmp_path, "fresh.db"))
+    await db.initialize()
+    async with db.pool.reader() as conn:
+        assert await get_schema_version(conn) == LATEST_VERSION
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_legacy_database_is_migrated_in_place(legacy_db_path):
+    """
+    Тестирует, что существующая база данных мигрирует на месте без потери данных.
+    """
+    db = Database(db_url=legacy_db_path)
+    await db.initialize()
+
+    prices = await db.get_all_prices("btc_usd")
+    assert len(prices) == 10
+    latest = await db.get_latest_price("btc_usd")
+    assert latest.price == 50009.0
+    await db.close()
+
+    conn = sqlite3.connect(legacy_db_path)
+    indexes = [row[1] for row in conn.execute("PRAGMA index_list('crypto_prices')")]
+    conn.close()
+    assert "idx_crypto_prices_ticker_timestamp" in indexes
+
+
+@pytest.mark.asyncio
+async def test_migrate_is_idempotent(tmp_path):
+    """
+    Тестирует, что повторный запуск миграций не меняет версию и не падает.
+    """
+    db = Database(db_url=os.path.join(tmp_path, "idempotent.db"))
+    await db.initialize()
+    async with db.pool.writer() as conn:
+        assert await migrate(conn) == LATEST_VERSION
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_lookups_use_covering_index(tmp_path):
+    """
+    Тестирует, что запросы последней цены и диапазона используют индекс (ticker, timestamp), а не полный скан.
+    """
+    db = Database(db_url=os.path.join(tmp_path, "plan.db"))
+    await db.initialize()
+    queries = [
+        ("SELECT ticker, price, timestamp FROM crypto_prices WHERE ticker = ? ORDER BY timestamp DESC LIMIT 1",
+         ("btc_usd",)),
+        ("SELECT ticker, price, timestamp FROM crypto_prices WHERE ticker = ? AND timestamp BETWEEN ? AND ? "
+         "ORDER BY timestamp", ("btc_usd", 1, 2)),
+    ]
+    async with db.pool.reader() as conn:
+        for query, params in queries:
+            async with conn.execute("EXPLAIN QUERY PLAN " + query, params) as cursor:
+                plan = " ".join(row[3] for row in await cursor.fetchall())
+            assert "USING COVERING INDEX idx_crypto_prices_ticker_timestamp" in plan, plan
+            assert "TEMP B-TREE" not in plan, plan
+    await db.close()
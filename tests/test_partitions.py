@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from app import partitions
+from app.database import Database
+from app.partitions import PartitionManager
+
+# 2024-01-15, 2024-02-15 и 2024-03-15 (UTC)
+JAN, FEB, MAR = 1705276800, 1707955200, 1710460800
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+async def db(tmp_path):
+    """
+    Фикстура для создания временной базы данных.
+    """
+    test_db = Database(db_url=os.path.join(tmp_path, "partitions.db"))
+    await test_db.initialize()
+    yield test_db
+    await test_db.close()
+
+
+async def fetch_all(db, query, params=()):
+    async with db.pool.reader() as conn:
+        async with conn.execute(query, params) as cursor:
+            return await cursor.fetchall()
+
+
+def test_month_bounds():
+    """
+    Тестирует границы месяца и имя секции, в том числе на переходе через год.
+    """
+    assert partitions.month_bounds(JAN) == (1704067200, 1706745600)
+    assert partitions.month_bounds(1704067200) == (1704067200, 1706745600)
+    assert partitions.month_bounds(1703980800)[1] == 1704067200
+    assert partitions.partition_name(FEB) == "crypto_prices_p202402"
+
+
+@pytest.mark.asyncio
+async def test_seal_moves_past_months_and_keeps_reads(db):
+    """
+    Тестирует перенос строк прошлых месяцев в секции: чтения, курсоры и свечи не меняются.
+    """
+    rows = [(ticker, float(i), JAN + i * 3600) for ticker in ("btc_usd", "eth_usd") for i in range(24 * 70)]
+    await db.insert_prices_bulk(rows)
+    before = await db.get_all_prices("btc_usd")
+    candles = await db.get_ohlc("btc_usd", 300)
+
+    manager = PartitionManager(db, chunk_size=100)
+    moved = await manager.seal(now=MAR)
+
+    head = await fetch_all(db, "SELECT MIN(timestamp) FROM crypto_prices")
+    assert head[0][0] >= partitions.month_bounds(MAR)[0]
+    assert moved == len([row for row in rows if row[2] < partitions.month_bounds(MAR)[0]])
+    registry = await fetch_all(db, "SELECT name FROM price_partitions ORDER BY start_ts")
+    assert [row[0] for row in registry] == ["crypto_prices_p202401", "crypto_prices_p202402"]
+
+    assert await db.get_all_prices("btc_usd") == before
+    assert await db.get_ohlc("btc_usd", 300) == candles
+    streamed = [row async for chunk in db.iter_prices("btc_usd", chunk_size=97) for row in chunk]
+    assert streamed == [(p.ticker, p.price, p.timestamp) for p in before]
+    page = await db.get_filtered_prices("btc_usd", FEB, None, limit=5)
+    assert [p.timestamp for p in page] == [FEB + i * 3600 for i in range(5)]
+    assert await manager.seal(now=MAR) == 0
+
+
+@pytest.mark.asyncio
+async def test_latest_cache_warms_from_partitions(db):
+    """
+    Тестирует, что последняя цена находится и для тикера, все строки которого уже в секциях.
+    """
+    await db.insert_prices_bulk([("btc_usd", 1.0, JAN), ("btc_usd", 2.0, FEB), ("eth_usd", 3.0, MAR)])
+    await PartitionManager(db).seal(now=MAR)
+
+    db.latest_cache.clear()
+    await db.refresh_latest_cache()
+
+    assert (await db.get_latest_price("btc_usd")).timestamp == FEB
+    assert (await db.get_latest_price("eth_usd")).price == 3.0
+
+
+@pytest.mark.asyncio
+async def test_retention_drops_partitions_and_keeps_rollups(db):
+    """
+    Тестирует удаление секций по сроку хранения: сырые данные пропадают, history_version растёт,
+    свечи остаются и не стираются пересчётом свёрток.
+    """
+    await db.insert_prices_bulk([("btc_usd", 10.0, JAN), ("btc_usd", 20.0, FEB), ("btc_usd", 30.0, MAR)])
+    manager = PartitionManager(db, retention_days=30)
+    await manager.seal(now=MAR)
+    version = (await fetch_all(db, "SELECT version FROM history_version"))[0][0]
+
+    dropped = await manager.apply_retention(now=MAR)
+
+    assert dropped == ["crypto_prices_p202401"]
+    assert (await fetch_all(db, "SELECT version FROM history_version"))[0][0] == version + 1
+    tables = await fetch_all(db, "SELECT name FROM sqlite_master WHERE name = 'crypto_prices_p202401'")
+    assert tables == []
+    assert [p.timestamp for p in await db.get_all_prices("btc_usd")] == [FEB, MAR]
+
+    await db.rebuild_rollups()
+    daily = await db.get_ohlc("btc_usd", DAY)
+    assert [(c.bucket, c.close) for c in daily] == [(JAN, 10.0), (FEB, 20.0), (MAR, 30.0)]
+
+
+@pytest.mark.asyncio
+async def test_compact_releases_free_pages(db):
+    """
+    Тестирует, что после удаления данных свободные страницы возвращаются файлу.
+    """
+    await db.insert_prices_bulk([("btc_usd", float(i), JAN + i) for i in range(20000)])
+    manager = PartitionManager(db, retention_days=1, vacuum_pages=16)
+    await manager.seal(now=MAR)
+    await manager.apply_retention(now=MAR)
+
+    free_before = (await fetch_all(db, "PRAGMA freelist_count"))[0][0]
+    released = await manager.compact()
+
+    assert free_before > 0
+    assert released == free_before
+    assert (await fetch_all(db, "PRAGMA freelist_count"))[0][0] == 0
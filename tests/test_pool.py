@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sqlite3
+
+import pytest
+from app.pool import ConnectionPool, PoolClosedError
+
+
+@pytest.fixture
+async def pool(tmp_path):
+    """
+    Фикстура для создания открытого пула соединений к временной базе данных.
+    """
+    test_pool = ConnectionPool(os.path.join(tmp_path, "pool.db"), size=2, health_check_interval=0)
+    await test_pool.open()
+    async with test_pool.writer() as db:
+        await db.execute("CREATE TABLE t (x INTEGER)")
+    yield test_pool
+    await test_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_uses_wal_mode(pool):
+    """
+    Тестирует, что соединения пула работают в режиме WAL.
+    """
+    async with pool.reader() as db:
+        async with db.execute("PRAGMA journal_mode") as cursor:
+            row = await cursor.fetchone()
+    assert row[0] == "wal"
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_reader_connections(pool):
+    """
+    Тестирует, что пул переиспользует одни и те же соединения на чтение, а не открывает новые.
+    """
+    seen = set()
+    for _ in range(10):
+        async with pool.reader() as db:
+            seen.add(id(db))
+    assert len(seen) == 2
+
+
+@pytest.mark.asyncio
+async def test_reader_connections_are_read_only(pool):
+    """
+    Тестирует, что через соединение на чтение нельзя изменить данные.
+    """
+    with pytest.raises(sqlite3.OperationalError):
+        async with pool.reader() as db:
+            await db.execute("INSERT INTO t (x) VALUES (1)")
+
+
+@pytest.mark.asyncio
+async def test_writer_rolls_back_on_error(pool):
+    """
+    Тестирует, что при исключении внутри блока записи транзакция откатывается.
+    """
+    with pytest.raises(RuntimeError):
+        async with pool.writer() as db:
+            await db.execute("INSERT INTO t (x) VALUES (1)")
+            raise RuntimeError("boom")
+
+    async with pool.reader() as db:
+        async with db.execute("SELECT COUNT(*) FROM t") as cursor:
+            row = await cursor.fetchone()
+    assert row[0] == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_readers_and_writer(pool):
+    """
+    Тестирует одновременную работу писателя и нескольких читателей.
+    """
+
+    async def write():
+        for i in range(50):
+            async with pool.writer() as db:
+                await db.execute("INSERT INTO t (x) VALUES (?)", (i,))
+
+    async def read():
+        for _ in range(50):
+            async with pool.reader() as db:
+                async with db.execute("SELECT COUNT(*) FROM t") as cursor:
+                    await cursor.fetchone()
+
+    await asyncio.gather(write(), read(), read(), read())
+
+    async with pool.reader() as db:
+        async with db.execute("SELECT COUNT(*) FROM t") as cursor:
+            row = await cursor.fetchone()
+    assert row[0] == 50
+
+
+@pytest.mark.asyncio
+async def test_health_check_replaces_broken_connection(pool):
+    """
+    Тестирует, что проверка здоровья заменяет закрытое соединение новым.
+    """
+    async with pool.reader() as db:
+        broken = db
+    await broken.close()
+
+    for _ in range(2):
+        async with pool.reader() as db:
+            async with db.execute("SELECT COUNT(*) FROM t") as cursor:
+                row = await cursor.fetchone()
+            assert row[0] == 0
+
+
+@pytest.mark.asyncio
+async def test_closed_pool_rejects_requests(tmp_path):
+    """
+    Тестирует, что закрытый пул отказывает в выдаче соединений.
+    """
+    test_pool = ConnectionPool(os.path.join(tmp_path, "pool.db"), size=1)
+    await test_pool.open()
+    await test_pool.close()
+
+    with pytest.raises(PoolClosedError):
+        async with test_pool.reader():
+            pass
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import time
+
+import pytest
+from app.database import Database
+from app.storage import PageCursor
+
+pytest.importorskip("asyncpg")
+
+from app.postgres import AdvisoryLeaderLock, PostgresStorage  # noqa: E402
+
+# Тесты выполняются только при заданной TEST_POSTGRES_URL; таблица crypto_prices в этой базе пересоздаётся.
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.fixture
+async def pg():
+    """
+    Фикстура для создания хранилища PostgreSQL с пустой таблицей цен.
+    """
+    storage = PostgresStorage(POSTGRES_URL)
+    await storage.initialize()
+    async with storage.pool.acquire() as conn:
+        await conn.execute("TRUNCATE crypto_prices RESTART IDENTITY")
+    yield storage
+    await storage.close()
+
+
+@pytest.fixture
+async def sqlite(tmp_path):
+    """
+    Фикстура для создания хранилища SQLite, с которым сравниваются ответы PostgreSQL.
+    """
+    db = Database(db_url=os.path.join(tmp_path, "reference.db"))
+    await db.initialize()
+    yield db
+    await db.close()
+
+
+ROWS = [
+    (ticker, 100.0 + (i * 7) % 13, 1625077800 + (i // 3) * 60 - 600)
+    for ticker in ("btc_usd", "eth_usd")
+    for i in range(60)
+] + [("btc_usd", 104.0, 1625077500)] * 3
+CURSOR = PageCursor(1625077500, 104.0, 2)
+
+
+@pytest.mark.asyncio
+async def test_postgres_matches_sqlite(pg, sqlite):
+    """
+    Тестирует, что PostgreSQL отвечает так же, как SQLite: выборки, пагинация, потоковая выдача,
+    пакетные запросы, последние цены и свечи.
+    """
+    for storage in (pg, sqlite):
+        assert await storage.insert_prices_bulk(ROWS) == len(ROWS)
+
+    async def collect(storage):
+        return {
+            "all": await storage.get_all_prices("btc_usd"),
+            "page": await storage.get_filtered_prices("eth_usd", 1625077800, None, after_timestamp=1625077800, limit=7),
+            "rows": await storage.get_price_rows("btc_usd", None, 1625077800),
+            "stream": [row async for chunk in storage.iter_prices("btc_usd", limit=25, chunk_size=4) for row in chunk],
+            "cursor": await storage.get_price_rows("btc_usd", limit=5, cursor=CURSOR),
+            "cursor_stream": [
+                row async for chunk in storage.iter_prices("eth_usd", limit=9, chunk_size=4, cursor=CURSOR) for row in chunk
+            ],
+            "batch": await storage.get_prices_batch(["eth_usd", "btc_usd", "xrp_usd"], 1625077500, None, 5),
+            "latest": await storage.get_latest_prices(["btc_usd", "eth_usd", "xrp_usd"]),
+            "ohlc": await storage.get_ohlc("btc_usd", 300),
+            "ohlc_range": await storage.get_ohlc("eth_usd", 120, 1625077300, 1625078000),
+        }
+
+    expected = await collect(sqlite)
+    actual = await collect(pg)
+    actual["batch"] = {ticker: [tuple(row) for row in rows] for ticker, rows in actual["batch"].items()}
+    expected["batch"] = {ticker: [tuple(row) for row in rows] for ticker, rows in expected["batch"].items()}
+    for key in ("rows", "cursor"):
+        expected[key] = [tuple(row) for row in expected[key]]
+
+    assert actual == expected
+    assert (await pg.get_latest_price("eth_usd")) == expected["latest"]["eth_usd"]
+    assert await pg.get_latest_price("xrp_usd") is None
+
+
+@pytest.mark.asyncio
+async def test_postgres_history_version(pg):
+    """
+    Тестирует, что history_version в PostgreSQL растёт только при записи в закрытые диапазоны.
+    """
+    start = await pg.history_version()
+    await pg.insert_prices_bulk([("btc_usd", 50000.0, int(time.time()))])
+    assert await pg.history_version() == start
+    await pg.insert_prices_bulk([("btc_usd", 49000.0, 1625077800)])
+    assert await pg.history_version() == start + 1
+
+
+@pytest.mark.asyncio
+async def test_postgres_rejects_negative_price(pg):
+    """
+    Тестирует, что пачка с отрицательной ценой не записывается целиком.
+    """
+    with pytest.raises(ValueError):
+        await pg.insert_prices_bulk([("btc_usd", 1.0, 100), ("btc_usd", -1.0, 200)])
+
+    assert await pg.get_all_prices("btc_usd") == []
+
+
+@pytest.mark.asyncio
+async def test_advisory_leader_lock(pg):
+    """
+    Тестирует, что advisory lock держит один процесс, и он освобождается вместе с соединением.
+    """
+    first, second = pg.leader_lock(), AdvisoryLeaderLock(pg.dsn)
+    try:
+        assert await first.acquire()
+        assert await first.held()
+        assert not await second.acquire()
+
+        first.conn.terminate()
+        assert not await first.held()
+        # Сервер снимает блокировку, когда заметит закрытие соединения, — не мгновенно.
+        for _ in range(100):
+            if await second.acquire():
+                break
+            await asyncio.sleep(0.05)
+        assert await second.held()
+    finally:
+        await first.release()
+        await second.release()
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from app.pubsub import PriceHub
+
+
+@pytest.mark.asyncio
+async def test_subscriber_receives_published_prices():
+    """
+    Тестирует, что подписчик получает обновления только по своему тикеру и в порядке публикации.
+    """
+    hub = PriceHub(queue_size=10)
+    subscription = hub.subscribe("btc_usd")
+
+    hub.publish("btc_usd", 50000.0, 1625077800)
+    hub.publish("eth_usd", 2500.0, 1625077800)
+    hub.publish("btc_usd", 50500.0, 1625077860)
+
+    first = await subscription.get()
+    second = await subscription.get()
+    assert (first.price, second.price) == (50000.0, 50500.0)
+    assert subscription.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_new_subscriber_gets_latest_price_immediately():
+    """
+    Тестирует, что новый подписчик сразу получает последнюю известную цену.
+    """
+    hub = PriceHub(queue_size=10)
+    hub.publish("btc_usd", 50000.0, 1625077800)
+
+    subscription = hub.subscribe("btc_usd")
+    latest = await asyncio.wait_for(subscription.get(), timeout=1)
+    assert latest.price == 50000.0
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped_without_blocking_publisher():
+    """
+    Тестирует, что переполнение очереди отключает медленного подписчика, не блокируя публикацию
+    и не затрагивая остальных подписчиков.
+    """
+    hub = PriceHub(queue_size=3)
+    slow = hub.subscribe("btc_usd")
+    fast = hub.subscribe("btc_usd")
+
+    for i in range(3):
+        hub.publish("btc_usd", 50000.0 + i, 1625077800 + i)
+    for _ in range(3):
+        await fast.get()
+
+    hub.publish("btc_usd", 50003.0, 1625077803)
+
+    assert slow.dropped
+    assert await slow.get() is None
+    assert [item async for item in slow] == []
+    assert hub.subscriber_count("btc_usd") == 1
+    assert hub.dropped_subscribers == 1
+    assert (await fast.get()).price == 50003.0
+
+
+@pytest.mark.asyncio
+async def test_close_ends_all_subscriptions():
+    """
+    Тестирует, что закрытие шины завершает итерацию у всех подписчиков.
+    """
+    hub = PriceHub(queue_size=10)
+    subscription = hub.subscribe("btc_usd")
+    hub.publish("btc_usd", 50000.0, 1625077800)
+
+    hub.close()
+
+    assert [item async for item in subscription] == []
+    assert hub.subscriber_count() == 0
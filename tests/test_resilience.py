@@ -0,0 +1,63 @@
+from app.resilience import CircuitBreaker, backoff_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_backoff_delay_grows_with_jitter_and_cap():
+    """
+    Тестирует, что задержка растёт экспоненциально, имеет разброс не больше половины и ограничена сверху.
+    """
+    for attempt, ceiling in ((0, 0.5), (1, 1.0), (2, 2.0), (5, 3.0)):
+        delays = [backoff_delay(attempt, 0.5, 3.0) for _ in range(200)]
+        assert all(ceiling / 2 <= delay <= ceiling for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """
+    Тестирует переходы предохранителя: размыкание после серии ошибок, один пробный вызов
+    по истечении таймаута и замыкание после успеха.
+    """
+    clock = FakeClock()
+    breaker = CircuitBreaker("upstream", failure_threshold=3, reset_timeout=10, clock=clock)
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 25
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    assert breaker.rejected == 2
+
+
+def test_circuit_breaker_success_resets_failure_count():
+    """
+    Тестирует, что размыкают цепь только ошибки подряд.
+    """
+    breaker = CircuitBreaker("upstream", failure_threshold=2, reset_timeout=10, clock=FakeClock())
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,154 @@
+import os
+import random
+import sqlite3
+
+import pytest
+from app import rollups
+from app.database import Database
+
+
+@pytest.fixture
+async def db(tmp_path):
+    """
+    Фикстура для создания временной базы данных.
+    """
+    test_db = Database(db_url=os.path.join(tmp_path, "rollups.db"))
+    await test_db.initialize()
+    yield test_db
+    await test_db.close()
+
+
+def random_rows(count, seed=42):
+    rng = random.Random(seed)
+    base = 1625011200
+    rows = []
+    for _ in range(count):
+        ticker = rng.choice(["btc_usd", "eth_usd"])
+        rows.append((ticker, round(rng.uniform(100, 200), 2), base + rng.randrange(0, 3 * 86400, 7)))
+    return rows
+
+
+async def raw_ohlc(db, monkeypatch, *args):
+    monkeypatch.setattr(rollups, "choose_rollup", lambda *a: None)
+    try:
+        return await db.get_ohlc(*args)
+    finally:
+        monkeypatch.undo()
+
+
+def assert_same_candles(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert (a.bucket, a.open, a.high, a.low, a.close, a.count) == (e.bucket, e.open, e.high, e.low, e.close, e.count)
+        assert a.mean == pytest.approx(e.mean)
+
+
+def test_choose_rollup():
+    """
+    Тестирует выбор самой грубой подходящей свёртки с учётом выравнивания границ диапазона.
+    """
+    assert rollups.choose_rollup(86400, None, None) == "1d"
+    assert rollups.choose_rollup(3600, None, None) == "1h"
+    assert rollups.choose_rollup(300, None, None) == "1m"
+    assert rollups.choose_rollup(86400, 3600, None) == "1h"
+    assert rollups.choose_rollup(86400, 0, 86399) == "1d"
+    assert rollups.choose_rollup(3600, 30, None) is None
+    assert rollups.choose_rollup(90, None, None) is None
+
+
+@pytest.mark.asyncio
+async def test_incremental_rollups_match_raw_aggregation(db, monkeypatch):
+    """
+    Тестирует, что свечи из инкрементально обновляемых свёрток совпадают с расчётом по сырым данным,
+    в том числе при вставке пачками не по порядку времени.
+    """
+    rows = random_rows(3000)
+    for i in range(0, len(rows), 250):
+        await db.insert_prices_bulk(rows[i:i + 250])
+
+    for bucket_seconds in (60, 300, 3600, 86400):
+        expected = await raw_ohlc(db, monkeypatch, "btc_usd", bucket_seconds)
+        actual = await db.get_ohlc("btc_usd", bucket_seconds)
+        assert_same_candles(actual, expected)
+
+    start, end = 1625011200 + 86400, 1625011200 + 2 * 86400 - 1
+    expected = await raw_ohlc(db, monkeypatch, "eth_usd", 3600, start, end)
+    assert_same_candles(await db.get_ohlc("eth_usd", 3600, start, end), expected)
+
+
+@pytest.mark.asyncio
+async def test_get_ohlc_reads_rollup_table(db):
+    """
+    Тестирует, что выровненный запрос дневных свечей читает таблицу свёртки, а не сырые цены.
+    """
+    await db.insert_prices_bulk([("btc_usd", 100.0, 0), ("btc_usd", 110.0, 100)])
+    async with db.pool.writer() as conn:
+        await conn.execute("UPDATE crypto_prices_1d SET high = 999 WHERE ticker = 'btc_usd'")
+
+    candles = await db.get_ohlc("btc_usd", 86400)
+    assert candles[0].high == 999
+
+
+@pytest.mark.asyncio
+async def test_rebuild_rollups_restores_from_raw(db, monkeypatch):
+    """
+    Тестирует, что пересчёт свёрток за диапазон восстанавливает их по сырым данным.
+    """
+    rows = random_rows(500, seed=7)
+    await db.insert_prices_bulk(rows)
+    async with db.pool.writer() as conn:
+        for name in rollups.ROLLUPS:
+            await conn.execute(f"DELETE FROM {rollups.rollup_table(name)}")
+
+    await db.rebuild_rollups(1625011200, 1625011200 + 86400 + 5)
+
+    day = await db.get_ohlc("btc_usd", 86400, 1625011200, 1625011200 + 86400 - 1)
+    expected = await raw_ohlc(db, monkeypatch, "btc_usd", 86400, 1625011200, 1625011200 + 86400 - 1)
+    assert_same_candles(day, expected)
+    hour_end = 1625011200 + 86400 + 3600 - 1
+    assert_same_candles(
+        await db.get_ohlc("btc_usd", 3600, 1625011200, hour_end),
+        await raw_ohlc(db, monkeypatch, "btc_usd", 3600, 1625011200, hour_end),
+    )
+
+
+@pytest.mark.asyncio
+async def test_migration_backfills_existing_history(tmp_path, monkeypatch):
+    """
+    Тестирует, что миграция заполняет свёртки по уже накопленной истории.
+    """
+    db_path = os.path.join(tmp_path, "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE crypto_prices (ticker TEXT, price REAL, timestamp INTEGER)")
+    conn.executemany("INSERT INTO crypto_prices VALUES (?, ?, ?)", random_rows(400, seed=3))
+    conn.commit()
+    conn.close()
+
+    db = Database(db_url=db_path)
+    await db.initialize()
+    assert_same_candles(
+        await db.get_ohlc("eth_usd", 3600),
+        await raw_ohlc(db, monkeypatch, "eth_usd", 3600),
+    )
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_backfill_cli(tmp_path):
+    """
+    Тестирует команду пересчёта свёрток из командной строки.
+    """
+    db_path = os.path.join(tmp_path, "cli.db")
+    db = Database(db_url=db_path)
+    await db.initialize()
+    await db.insert_prices_bulk([("btc_usd", 100.0, 0), ("btc_usd", 110.0, 100)])
+    async with db.pool.writer() as conn:
+        await conn.execute("DELETE FROM crypto_prices_1d")
+    await db.close()
+
+    await rollups._backfill(db_path, None, None)
+
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT open, close, count FROM crypto_prices_1d WHERE ticker = 'btc_usd'").fetchone()
+    conn.close()
+    assert row == (100.0, 110.0, 2)
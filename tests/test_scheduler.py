@@ -0,0 +1,83 @@
+import pytest
+from app.scheduler import TickScheduler
+
+
+class FakeClock:
+    """
+    Часы, которые двигаются только при sleep() и work(): время работы тика задаётся явно.
+    """
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float):
+        self.now += delay
+
+    def work(self, seconds: float):
+        self.now += seconds
+
+
+async def run_ticks(scheduler: TickScheduler, clock: FakeClock, durations):
+    ticks = []
+    async for tick in scheduler:
+        ticks.append(tick)
+        if len(ticks) > len(durations):
+            break
+        clock.work(durations[len(ticks) - 1])
+    return ticks
+
+
+@pytest.mark.asyncio
+async def test_ticks_are_aligned_and_do_not_drift():
+    """
+    Тестирует, что тики приходятся на границы минуты независимо от длительности работы.
+    """
+    clock = FakeClock(1000.5)
+    scheduler = TickScheduler(60, clock=clock, sleep=clock.sleep)
+
+    ticks = await run_ticks(scheduler, clock, [7.25, 59.0, 0.1, 30.0])
+
+    assert [tick.scheduled for tick in ticks] == [1020.0, 1080.0, 1140.0, 1200.0, 1260.0]
+    assert [tick.lag for tick in ticks] == [0.0] * 5
+    assert scheduler.skipped == 0
+
+
+@pytest.mark.asyncio
+async def test_skip_policy_drops_missed_ticks():
+    """
+    Тестирует, что при политике skip тики, пропущенные из-за долгой работы, не выполняются.
+    """
+    clock = FakeClock(0.0)
+    scheduler = TickScheduler(10, policy="skip", clock=clock, sleep=clock.sleep)
+
+    ticks = await run_ticks(scheduler, clock, [35.0, 1.0])
+
+    assert [tick.scheduled for tick in ticks] == [10.0, 50.0, 60.0]
+    assert scheduler.skipped == 3
+
+
+@pytest.mark.asyncio
+async def test_catch_up_policy_runs_missed_ticks_with_lag():
+    """
+    Тестирует, что при политике catch_up пропущенные тики выполняются подряд, а отставание фиксируется.
+    """
+    clock = FakeClock(0.0)
+    scheduler = TickScheduler(10, policy="catch_up", max_catch_up=2, clock=clock, sleep=clock.sleep)
+
+    ticks = await run_ticks(scheduler, clock, [35.0, 0.0, 0.0, 0.0])
+
+    assert [tick.scheduled for tick in ticks] == [10.0, 30.0, 40.0, 50.0, 60.0]
+    assert [tick.lag for tick in ticks] == [0.0, 15.0, 5.0, 0.0, 0.0]
+    assert scheduler.skipped == 1
+    assert scheduler.max_lag == 15.0
+
+
+def test_rejects_non_positive_interval():
+    """
+    Тестирует, что нулевой интервал отклоняется.
+    """
+    with pytest.raises(ValueError):
+        TickScheduler(0)
@@ -1,8 +1,14 @@
 import pytest
 from unittest.mock import AsyncMock, patch, ANY
-from app.services import PriceFetcher
+from app import metrics
+from app.resilience import CircuitBreaker
+from app.scheduler import Tick
+from app.services import PriceFetcher, Quote
 from app.database import Database
+from app.write_buffer import WriteBuffer
+from app.pubsub import PriceHub
 import asyncio
+import time
 
 
 @pytest.mark.asyncio
@@ -13,10 +19,8 @@ async def test_fetch_price_success():
     mock_db = AsyncMock(spec=Database)
     fetcher = PriceFetcher(db=mock_db)
 
-    with patch('aiohttp.ClientSession.get') as mock_get:
-        mock_response = AsyncMock()
-        mock_response.json.return_value = {'result': {'index_price': 50000.0}}
-        mock_get.return_value.__aenter__.return_value = mock_response
+    with patch('app.upstream.UpstreamClient.get_json', new_callable=AsyncMock) as mock_get_json:
+        mock_get_json.return_value = {'result': {'index_price': 50000.0}}
 
         price = await fetcher.fetch_price('http://fakeurl.com')
 
@@ -32,10 +36,8 @@ async def test_fetch_price_no_price():
     mock_db = AsyncMock(spec=Database)
     fetcher = PriceFetcher(db=mock_db)
 
-    with patch('aiohttp.ClientSession.get') as mock_get:
-        mock_response = AsyncMock()
-        mock_response.json.return_value = {'result': {}}
-        mock_get.return_value.__aenter__.return_value = mock_response
+    with patch('app.upstream.UpstreamClient.get_json', new_callable=AsyncMock) as mock_get_json:
+        mock_get_json.return_value = {'result': {}}
 
         price = await fetcher.fetch_price('http://fakeurl.com')
 
@@ -66,16 +68,17 @@ async def test_fetch_prices_loop_success():
     mock_db = AsyncMock(spec=Database)
     fetcher = PriceFetcher(db=mock_db, interval=0.1)
 
-    with patch.object(fetcher, 'fetch_price') as mock_fetch_price:
-        mock_fetch_price.side_effect = [50000.0, 3000.0, asyncio.CancelledError()]
+    with patch.object(fetcher, 'fetch_quote') as mock_fetch_quote:
+        mock_fetch_quote.side_effect = [
+            Quote(50000.0, 1625077800), Quote(3000.0, 1625077801), asyncio.CancelledError(), asyncio.CancelledError()
+        ]
 
-        with patch.object(mock_db, 'insert_price', new_callable=AsyncMock) as mock_insert_price:
+        with patch.object(mock_db, 'insert_prices_bulk', new_callable=AsyncMock) as mock_insert_bulk:
             with pytest.raises(asyncio.CancelledError):
                 await fetcher.fetch_prices_loop()
 
-            assert mock_fetch_price.call_count == 3, f"Expected 3 calls, got {mock_fetch_price.call_count}"
-            mock_insert_price.assert_any_await("btc_usd", 50000.0, ANY)
-            mock_insert_price.assert_any_await("eth_usd", 3000.0, ANY)
+            assert mock_fetch_quote.call_count == 4, f"Expected 4 calls, got {mock_fetch_quote.call_count}"
+            mock_insert_bulk.assert_awaited_once_with([("btc_usd", 50000.0, 1625077800), ("eth_usd", 3000.0, 1625077801)])
 
     await fetcher.shutdown()
 
@@ -84,21 +87,345 @@ async def test_fetch_prices_loop_success():
 async def test_fetch_prices_loop_partial_failure():
     """
     Тестирует цикл получения цен из API при частичном отсутствии данных.
-    Ожидается, что метод insert_price не будет вызван, и будет зафиксовано предупреждение в логах.
+    Ожидается, что полученные цены будут сохранены, а по остальным тикерам будет зафиксировано предупреждение в логах.
     """
     mock_db = AsyncMock(spec=Database)
     fetcher = PriceFetcher(db=mock_db, interval=0.1)
 
-    with patch.object(fetcher, 'fetch_price') as mock_fetch_price:
-        mock_fetch_price.side_effect = [50000.0, None, asyncio.CancelledError()]
+    with patch.object(fetcher, 'fetch_quote') as mock_fetch_quote:
+        mock_fetch_quote.side_effect = [
+            Quote(50000.0, 1625077800), None, asyncio.CancelledError(), asyncio.CancelledError()
+        ]
 
-        with patch.object(mock_db, 'insert_price', new_callable=AsyncMock) as mock_insert_price:
+        with patch.object(mock_db, 'insert_prices_bulk', new_callable=AsyncMock) as mock_insert_bulk:
             with patch('app.services.logger') as mock_logger:
                 with pytest.raises(asyncio.CancelledError):
                     await fetcher.fetch_prices_loop()
 
-                assert mock_fetch_price.call_count == 3, f"Expected 3 calls, got {mock_fetch_price.call_count}"
-                mock_insert_price.assert_not_called()
-                mock_logger.warning.assert_called_once_with("Failed to fetch one or both prices.")
+                assert mock_fetch_quote.call_count == 4, f"Expected 4 calls, got {mock_fetch_quote.call_count}"
+                mock_insert_bulk.assert_awaited_once_with([("btc_usd", 50000.0, 1625077800)])
+                mock_logger.warning.assert_called_once_with("Failed to fetch prices for: eth_usd")
 
     await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_prices_loop_uses_write_buffer():
+    """
+    Тестирует, что при наличии буфера отложенной записи цикл складывает тик в буфер, а не пишет в базу напрямую.
+    """
+    mock_db = AsyncMock(spec=Database)
+    buffer = AsyncMock(spec=WriteBuffer)
+    fetcher = PriceFetcher(db=mock_db, interval=0.1, buffer=buffer)
+
+    with patch.object(fetcher, 'fetch_quote') as mock_fetch_quote:
+        mock_fetch_quote.side_effect = [
+            Quote(50000.0, None), Quote(3000.0, None), asyncio.CancelledError(), asyncio.CancelledError()
+        ]
+
+        with pytest.raises(asyncio.CancelledError):
+            await fetcher.fetch_prices_loop()
+
+    buffer.add.assert_awaited_once_with([("btc_usd", 50000.0, ANY), ("eth_usd", 3000.0, ANY)])
+    mock_db.insert_prices_bulk.assert_not_called()
+
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_tick_is_concurrent(deribit_stub):
+    """
+    Тестирует, что цены 50 тикеров запрашиваются параллельно: время тика близко к одному запросу,
+    а не к сумме всех запросов.
+    """
+    deribit_stub.delay = 0.05
+    tickers = [f"coin{i}_usd" for i in range(50)]
+    deribit_stub.prices = {ticker: float(i) for i, ticker in enumerate(tickers)}
+    fetcher = PriceFetcher(db=AsyncMock(spec=Database), tickers=tickers, api_url=deribit_stub.url, concurrency=50)
+
+    started = time.perf_counter()
+    prices = await fetcher.fetch_tick()
+    elapsed = time.perf_counter() - started
+
+    assert prices == deribit_stub.prices
+    assert deribit_stub.requests == 50
+    assert elapsed < 50 * deribit_stub.delay / 5, f"Tick took {elapsed:.3f}s"
+
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_tick_respects_concurrency_limit(deribit_stub):
+    """
+    Тестирует, что число одновременных запросов ограничено параметром concurrency.
+    """
+    deribit_stub.delay = 0.05
+    tickers = [f"coin{i}_usd" for i in range(10)]
+    fetcher = PriceFetcher(db=AsyncMock(spec=Database), tickers=tickers, api_url=deribit_stub.url, concurrency=2)
+
+    started = time.perf_counter()
+    await fetcher.fetch_tick()
+    elapsed = time.perf_counter() - started
+
+    assert elapsed >= 5 * deribit_stub.delay * 0.9, f"Tick took {elapsed:.3f}s"
+
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_tick_applies_request_timeout(deribit_stub):
+    """
+    Тестирует, что медленный ответ обрывается по таймауту и не задерживает тик.
+    """
+    deribit_stub.delay = 1.0
+    fetcher = PriceFetcher(
+        db=AsyncMock(spec=Database), tickers=["btc_usd"], api_url=deribit_stub.url, timeout=0.1, retries=0
+    )
+
+    started = time.perf_counter()
+    prices = await fetcher.fetch_tick()
+    elapsed = time.perf_counter() - started
+
+    assert prices == {"btc_usd": None}
+    assert elapsed < 0.5
+
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_store_prices_publishes_to_hub():
+    """
+    Тестирует, что сохранённый тик публикуется в шину потоковых подписок.
+    """
+    hub = PriceHub(queue_size=10)
+    subscription = hub.subscribe("btc_usd")
+    fetcher = PriceFetcher(db=AsyncMock(spec=Database), hub=hub)
+
+    await fetcher.store_prices([("btc_usd", 50000.0, 1625077800), ("eth_usd", 2500.0, 1625077800)])
+
+    assert (await subscription.get()).price == 50000.0
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_quote_uses_exchange_timestamp(deribit_stub):
+    """
+    Тестирует, что время цены берётся из ответа биржи (usOut), а не из локальных часов.
+    """
+    deribit_stub.server_time = 1625077800.75
+    fetcher = PriceFetcher(db=AsyncMock(spec=Database), api_url=deribit_stub.url)
+
+    quote = await fetcher.fetch_quote(fetcher.ticker_url("btc_usd"))
+
+    assert quote == Quote(1000.0, 1625077800)
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_prices_loop_falls_back_to_tick_boundary():
+    """
+    Тестирует, что без времени биржи строка получает время границы тика, кратное интервалу.
+    """
+    mock_db = AsyncMock(spec=Database)
+    fetcher = PriceFetcher(db=mock_db, interval=1, tickers=["btc_usd"])
+
+    started = time.time()
+    with patch.object(fetcher, 'fetch_quote') as mock_fetch_quote:
+        mock_fetch_quote.side_effect = [Quote(50000.0, None), asyncio.CancelledError()]
+        with pytest.raises(asyncio.CancelledError):
+            await fetcher.fetch_prices_loop()
+
+    mock_db.insert_prices_bulk.assert_awaited_once_with([("btc_usd", 50000.0, int(started) + 1)])
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_quote_retries_transient_errors(deribit_stub):
+    """
+    Тестирует, что ответы 503 повторяются с задержкой и цена всё же получается.
+    """
+    deribit_stub.failures = 2
+    fetcher = PriceFetcher(
+        db=AsyncMock(spec=Database), api_url=deribit_stub.url, retries=2, retry_base_delay=0.01
+    )
+
+    quote = await fetcher.fetch_quote(fetcher.ticker_url("btc_usd"))
+
+    assert quote is not None and quote.price == 1000.0
+    assert deribit_stub.requests == 3
+    assert fetcher.breaker.failures == 0
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_records_upstream_metrics(deribit_stub):
+    """
+    Тестирует, что время запроса по тикеру, повторы и неудачные загрузки попадают в метрики.
+    """
+    deribit_stub.failures = 1
+    fetcher = PriceFetcher(
+        db=AsyncMock(spec=Database), tickers=["btc_usd"], api_url=deribit_stub.url, retries=1, retry_base_delay=0.01
+    )
+    latency = metrics.UPSTREAM_FETCH_SECONDS.labels("btc_usd")
+    latency_before, retries_before = latency.count, metrics.UPSTREAM_RETRIES.labels().value
+
+    assert await fetcher.fetch_tick() == {"btc_usd": 1000.0}
+
+    assert latency.count == latency_before + 1
+    assert metrics.UPSTREAM_RETRIES.labels().value == retries_before + 1
+
+    failures = metrics.UPSTREAM_FAILURES.labels("btc_usd")
+    failures_before = failures.value
+    deribit_stub.failures = 2
+    assert await fetcher.fetch_tick() == {"btc_usd": None}
+    assert failures.value == failures_before + 1
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_stops_requests_to_failing_upstream(deribit_stub):
+    """
+    Тестирует, что после серии ошибок запросы к upstream прекращаются, а после таймаута
+    пробный запрос снова замыкает цепь.
+    """
+    deribit_stub.failures = 100
+    breaker = CircuitBreaker("deribit", failure_threshold=3, reset_timeout=0.2)
+    fetcher = PriceFetcher(
+        db=AsyncMock(spec=Database), api_url=deribit_stub.url, retries=1, retry_base_delay=0.01, breaker=breaker,
+        # По одному запросу за раз: параллельные повторы могли пройти предохранитель до его размыкания.
+        concurrency=1,
+    )
+
+    for _ in range(4):
+        assert await fetcher.fetch_tick() == {"btc_usd": None, "eth_usd": None}
+
+    assert deribit_stub.requests == 3
+    assert breaker.state == CircuitBreaker.OPEN
+
+    deribit_stub.failures = 0
+    await asyncio.sleep(0.25)
+    assert (await fetcher.fetch_quote(fetcher.ticker_url("btc_usd"))).price == 1000.0
+    assert breaker.state == CircuitBreaker.CLOSED
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_bad_body_during_half_open_trial_reopens_circuit(deribit_stub):
+    """
+    Тестирует, что негодное тело ответа на пробном запросе снова размыкает цепь, а не оставляет её
+    полуоткрытой навсегда: после следующего таймаута пробный запрос проходит и замыкает цепь.
+    """
+    breaker = CircuitBreaker("deribit", failure_threshold=1, reset_timeout=0.1)
+    fetcher = PriceFetcher(
+        db=AsyncMock(spec=Database), tickers=["btc_usd"], api_url=deribit_stub.url, retries=0, breaker=breaker,
+    )
+    deribit_stub.failures = 1
+    assert await fetcher.fetch_tick() == {"btc_usd": None}
+    assert breaker.state == CircuitBreaker.OPEN
+
+    await asyncio.sleep(0.15)
+    deribit_stub.payloads = {"btc_usd": b"{not json"}
+    assert await fetcher.fetch_tick() == {"btc_usd": None}
+    assert breaker.state == CircuitBreaker.OPEN
+
+    deribit_stub.payloads = {}
+    await asyncio.sleep(0.15)
+    assert await fetcher.fetch_tick() == {"btc_usd": 1000.0}
+    assert breaker.state == CircuitBreaker.CLOSED
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_exchange_clock_skew_is_not_a_gap(deribit_stub, test_db):
+    """
+    Тестирует, что отставание часов биржи от сетки тиков не считается пропуском: история не
+    запрашивается, и на каждый тик сохраняется ровно одна цена.
+    """
+    base = (int(time.time()) // 60) * 60 - 600
+    fetcher = PriceFetcher(
+        db=test_db, interval=60, tickers=["btc_usd"], api_url=deribit_stub.url, retries=0,
+        breaker=CircuitBreaker("deribit", failure_threshold=100, reset_timeout=0),
+    )
+    deribit_stub.history = {"btc_usd": [(base + 59, 1.0), (base + 119, 2.0)]}
+    for index in range(4):
+        # Часы биржи на 0,3 секунды позади тика.
+        deribit_stub.server_time = base + index * 60 - 0.3
+        await fetcher.run_tick(Tick(base + index * 60, 0.0))
+
+    assert deribit_stub.history_requests == 0
+    assert fetcher.gaps == {}
+    assert [p.timestamp for p in await test_db.get_all_prices("btc_usd")] == [base - 1, base + 59, base + 119, base + 179]
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_gap_backfilled_after_upstream_recovers(deribit_stub, test_db):
+    """
+    Тестирует, что тики, пропущенные во время сбоя, заполняются по истории биржи после восстановления,
+    а успешные цены частичного тика не теряются.
+    """
+    base = (int(time.time()) // 60) * 60 - 600
+    fetcher = PriceFetcher(
+        db=test_db, interval=60, tickers=["btc_usd"], api_url=deribit_stub.url, retries=0,
+        breaker=CircuitBreaker("deribit", failure_threshold=100, reset_timeout=0),
+    )
+    deribit_stub.prices = {"btc_usd": 100.0}
+    deribit_stub.history = {"btc_usd": [(base + 50, 1.0), (base + 61, 101.0), (base + 125, 102.0), (base + 250, 103.0)]}
+
+    deribit_stub.server_time = base + 0.5
+    await fetcher.run_tick(Tick(base, 0.0))
+    deribit_stub.failures = 2
+    await fetcher.run_tick(Tick(base + 60, 0.0))
+    await fetcher.run_tick(Tick(base + 120, 0.0))
+    deribit_stub.server_time = base + 180.5
+    await fetcher.run_tick(Tick(base + 180, 0.0))
+
+    stored = [(p.price, p.timestamp) for p in await test_db.get_all_prices("btc_usd")]
+    assert stored == [(100.0, base), (101.0, base + 61), (102.0, base + 125), (100.0, base + 180)]
+    assert deribit_stub.history_requests == 1
+    assert fetcher.gaps == {}
+
+    # Новый пропуск заполняется отдельным запросом истории.
+    deribit_stub.failures = 1
+    await fetcher.run_tick(Tick(base + 240, 0.0))
+    deribit_stub.server_time = base + 300.5
+    await fetcher.run_tick(Tick(base + 300, 0.0))
+    assert [p.timestamp for p in await test_db.get_all_prices("btc_usd")][-2:] == [base + 250, base + 300]
+    assert deribit_stub.history_requests == 2
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_malformed_response_does_not_discard_tick(deribit_stub):
+    """
+    Тестирует, что ответ неожиданной структуры по одному тикеру не срывает тик: цены остальных тикеров сохраняются.
+    """
+    deribit_stub.payloads = {"eth_usd": {"jsonrpc": "2.0", "result": None}, "sol_usd": {"result": {"index_price": "x"}}}
+    mock_db = AsyncMock(spec=Database)
+    fetcher = PriceFetcher(
+        db=mock_db, tickers=["btc_usd", "eth_usd", "sol_usd"], api_url=deribit_stub.url, backfill_enabled=False
+    )
+
+    quotes = await fetcher.fetch_quotes()
+    assert quotes["btc_usd"].price == 1000.0
+    assert quotes["eth_usd"] is None
+    assert quotes["sol_usd"] is None
+
+    await fetcher.run_tick(Tick(time.time(), 0.0))
+    rows = mock_db.insert_prices_bulk.await_args.args[0]
+    assert [row[0] for row in rows] == ["btc_usd"]
+    await fetcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_history_skips_malformed_points(deribit_stub):
+    """
+    Тестирует, что некорректные точки истории пропускаются, а не прерывают заполнение пропусков.
+    """
+    deribit_stub.payloads = {"btc_usd": {"result": [[1625077800000, 100.0], [None, 1.0], ["x"], [1625077860000, 101.0]]}}
+    fetcher = PriceFetcher(db=AsyncMock(spec=Database), api_url=deribit_stub.url)
+
+    history = await fetcher.fetch_history("btc_usd", time.time() - 60)
+
+    assert history == [(1625077800, 100.0), (1625077860, 101.0)]
+    await fetcher.shutdown()
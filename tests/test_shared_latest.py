@@ -0,0 +1,242 @@
+import os
+import platform
+import subprocess
+import sys
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+from app.database import Database
+from app.main import Ingestion
+from app.pubsub import PriceHub
+from app.shared_latest import HEADER_SIZE, SharedLatestPrices, main, segment_name, unlink_segment
+
+
+@pytest.fixture
+def name():
+    """
+    Фикстура с уникальным именем сегмента; сегмент удаляется после теста.
+    """
+    segment = f"cpl_test_{uuid.uuid4().hex[:12]}"
+    yield segment
+    store = SharedLatestPrices(segment, capacity=1)
+    store.unlink()
+    store.close()
+
+
+def test_writer_and_reader_share_prices(name):
+    """
+    Тестирует, что цены писателя видны во втором подключении, включая тикеры, добавленные после подключения.
+    """
+    writer = SharedLatestPrices(name, capacity=8)
+    writer.writer = True
+    reader = SharedLatestPrices(name, capacity=8)
+
+    writer.update("btc_usd", 50000.0, 1625077800)
+    assert reader.get("btc_usd").price == 50000.0
+    assert reader.get("eth_usd") is None
+
+    writer.update("eth_usd", 3000.0, 1625077800)
+    writer.update("btc_usd", 50500.0, 1625078400)
+    assert reader.get("eth_usd").price == 3000.0
+    assert reader.get("btc_usd").timestamp == 1625078400
+    assert sorted(reader.tickers()) == ["btc_usd", "eth_usd"]
+
+    reader.close()
+    writer.close()
+
+
+def test_older_updates_are_ignored(name):
+    """
+    Тестирует, что цена не откатывается на более старую временную метку.
+    """
+    store = SharedLatestPrices(name, capacity=8)
+    store.update("btc_usd", 50500.0, 1625078400)
+    store.update("btc_usd", 50000.0, 1625077800)
+
+    assert store.get("btc_usd").price == 50500.0
+    store.close()
+
+
+def test_tickers_that_do_not_fit_are_skipped(name):
+    """
+    Тестирует, что при заполненном сегменте и слишком длинном имени тикера запись пропускается.
+    """
+    store = SharedLatestPrices(name, capacity=1)
+    store.update("btc_usd", 50000.0, 1625077800)
+    store.update("eth_usd", 3000.0, 1625077800)
+    store.update("x" * 40, 1.0, 1625077800)
+
+    assert store.tickers() == ["btc_usd"]
+    assert store.get("eth_usd") is None
+    store.close()
+
+
+def test_read_during_write_is_retried(name):
+    """
+    Тестирует, что слот с нечётным seq (запись не завершена) не читается, а следующая запись его восстанавливает.
+    """
+    store = SharedLatestPrices(name, capacity=8)
+    store.update("btc_usd", 50000.0, 1625077800)
+    offset = HEADER_SIZE
+    seq = int.from_bytes(store.buf[offset:offset + 8], "little")
+    store.buf[offset:offset + 8] = (seq + 1).to_bytes(8, "little")
+
+    assert store.get("btc_usd") is None
+
+    store.update("btc_usd", 50500.0, 1625078400)
+    assert store.get("btc_usd").price == 50500.0
+    assert int.from_bytes(store.buf[offset:offset + 8], "little") % 2 == 0
+    store.close()
+
+
+def test_other_process_reads_prices_and_segment_survives_it(name):
+    """
+    Тестирует чтение из другого процесса и то, что выход процесса не удаляет сегмент.
+    """
+    store = SharedLatestPrices(name, capacity=8)
+    store.update("btc_usd", 50000.0, 1625077800)
+
+    output = subprocess.run(
+        [sys.executable, "-c", (
+            "from app.shared_latest import SharedLatestPrices\n"
+            f"store = SharedLatestPrices({name!r}, capacity=8)\n"
+            "print(store.get('btc_usd').price)\n"
+            "store.close()\n"
+        )],
+        capture_output=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    assert output.stdout.strip() == b"50000.0"
+    assert b"leaked" not in output.stderr
+
+    again = SharedLatestPrices(name, capacity=8)
+    assert again.get("btc_usd").price == 50000.0
+    again.close()
+    store.close()
+
+
+def test_last_process_removes_segment(name, capsys):
+    """
+    Тестирует, что сегмент удаляется, когда отключается последний процесс, и не раньше; команда unlink
+    не трогает используемый сегмент.
+    """
+    first = SharedLatestPrices(name, capacity=8)
+    first.update("btc_usd", 50000.0, 1625077800)
+    second = SharedLatestPrices(name, capacity=8)
+    with pytest.raises(ValueError):
+        unlink_segment(name)
+
+    first.close()
+    assert second.get("btc_usd").price == 50000.0
+    second.close()
+
+    fresh = SharedLatestPrices(name, capacity=8)
+    assert fresh.get("btc_usd") is None
+    fresh.close(remove=False)
+    main(["--name", name, "unlink"])
+    assert capsys.readouterr().out.strip() == f"Removed {name}"
+    assert not unlink_segment(name)
+
+
+@pytest.mark.asyncio
+async def test_follower_reads_leader_prices_without_sqlite(tmp_path):
+    """
+    Тестирует, что ведомый процесс получает последние цены ведущего из разделяемой памяти, не обращаясь к SQLite.
+    """
+    db_path = os.path.join(tmp_path, "shared.db")
+    leader = Database(db_url=db_path)
+    await leader.initialize()
+    await leader.insert_price("btc_usd", 50000.0, 1625077800)
+    follower = Database(db_url=db_path, latest_cache_validation_interval=0)
+    await follower.initialize()
+    name = f"cpl_test_{uuid.uuid4().hex[:12]}"
+    leader.open_shared_latest(name)
+    follower.open_shared_latest(name)
+    ingestion = Ingestion(leader, PriceHub())
+    try:
+        # Ведущий при старте заполняет сегмент ценами, уже сохранёнными в базе.
+        await leader.rebuild_shared_latest()
+        await leader.insert_prices_bulk([("btc_usd", 50500.0, 1625078400), ("eth_usd", 3000.0, 1625078400)])
+
+        follower.pool.data_version = AsyncMock(side_effect=AssertionError("SQLite must not be queried"))
+        assert (await follower.get_latest_price("btc_usd")).price == 50500.0
+        prices = await follower.get_latest_prices(["btc_usd", "eth_usd"])
+        assert {ticker: price.price for ticker, price in prices.items()} == {"btc_usd": 50500.0, "eth_usd": 3000.0}
+
+        await ingestion.stop()
+        assert not leader.shared_latest.writer
+    finally:
+        leader.shared_latest.unlink()
+        await follower.close()
+        await leader.close()
+
+
+def test_reset_starts_new_generation(name):
+    """
+    Тестирует, что после reset() читатель забывает прежние номера слотов: тикеры, получившие
+    другие слоты, читаются верно, а стёртые не читаются.
+    """
+    writer = SharedLatestPrices(name, capacity=8)
+    writer.writer = True
+    reader = SharedLatestPrices(name, capacity=8)
+    writer.update("btc_usd", 50000.0, 1625077800)
+    writer.update("eth_usd", 3000.0, 1625077800)
+    assert reader.get("btc_usd").price == 50000.0
+
+    writer.reset()
+    assert reader.get("btc_usd") is None
+    writer.update("eth_usd", 2900.0, 1625077700)
+    writer.update("btc_usd", 49000.0, 1625077700)
+
+    assert reader.get("btc_usd").price == 49000.0
+    assert reader.get("eth_usd").price == 2900.0
+    assert reader.tickers() == ["eth_usd", "btc_usd"]
+    reader.close()
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_new_leader_rebuilds_segment_from_database(tmp_path):
+    """
+    Тестирует, что новый ведущий (Ingestion.start) не оставляет в сегменте цен, которых нет в базе: из будущего
+    (после воспроизведения) и от прежней базы с тем же путём.
+    """
+    db_path = os.path.join(tmp_path, "rebuild.db")
+    name = f"cpl_test_{uuid.uuid4().hex[:12]}"
+    stale = SharedLatestPrices(name, capacity=8)
+    stale.update("btc_usd", 99999.0, 4102444800)
+    stale.update("xrp_usd", 1.0, 1625077800)
+
+    db = Database(db_url=db_path)
+    await db.initialize()
+    await db.insert_price("btc_usd", 50000.0, 1625077800)
+    db.open_shared_latest(name)
+    try:
+        await db.rebuild_shared_latest()
+        assert db.shared_latest.writer
+        assert stale.get("btc_usd").price == 50000.0
+        assert stale.get("xrp_usd") is None
+        assert await db.get_latest_price("xrp_usd") is None
+    finally:
+        stale.close()
+        db.shared_latest.unlink()
+        await db.close()
+
+
+def test_non_x86_platforms_are_refused(name, monkeypatch):
+    """
+    Тестирует, что seqlock без барьеров памяти не включается вне x86.
+    """
+    monkeypatch.setattr(platform, "machine", lambda: "aarch64")
+    with pytest.raises(ValueError):
+        SharedLatestPrices(name, capacity=8)
+
+
+def test_segment_name_depends_on_database_path(tmp_path):
+    """
+    Тестирует, что имя сегмента определяется путём к базе и укладывается в ограничения POSIX shm.
+    """
+    first = segment_name(os.path.join(tmp_path, "a.db"))
+    assert first == segment_name(os.path.join(tmp_path, "a.db"))
+    assert first != segment_name(os.path.join(tmp_path, "b.db"))
+    assert len(first) <= 30
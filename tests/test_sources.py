@@ -0,0 +1,168 @@
+import asyncio
+from array import array
+
+import pytest
+from app import archive
+from app.scheduler import Tick
+from app.services import PriceFetcher
+from app.config import settings
+from app.sources import ReplaySource, SyntheticSource, create_price_source, source_tickers
+
+BASE = 1625011200
+
+
+def write_archive(path, blocks):
+    with open(path, "wb") as f:
+        f.write(archive.encode_header())
+        for ticker, rows in blocks:
+            f.write(archive.encode_block(
+                ticker, array("q", [row[0] for row in rows]), array("d", [row[1] for row in rows])
+            ))
+
+
+@pytest.mark.asyncio
+async def test_synthetic_source_keeps_rate_across_ticks():
+    """
+    Тестирует, что синтетический источник выдаёт rate цен в секунду на тикер, а пропущенный тик
+    увеличивает следующую пачку, не уменьшая частоту.
+    """
+    source = SyntheticSource(["a_usd", "b_usd"], rate=5, volatility=0.01, seed=1)
+
+    first = await source.read(Tick(BASE, 0.0))
+    second = await source.read(Tick(BASE + 1, 0.0))
+    after_skip = await source.read(Tick(BASE + 3, 0.0))
+
+    assert len(first) == 2
+    assert len(second) == 10
+    assert len(after_skip) == 20
+    assert all(BASE + 1 <= timestamp <= BASE + 3 for _, _, timestamp in after_skip)
+    assert [price for ticker, price, _ in second if ticker == "a_usd"] != [1000.0] * 5
+    assert all(price > 0 for _, price, _ in first + second + after_skip)
+
+
+@pytest.mark.asyncio
+async def test_synthetic_source_is_reproducible_with_seed():
+    """
+    Тестирует, что при одинаковом seed последовательность цен повторяется.
+    """
+    ticks = [Tick(BASE + i, 0.0) for i in range(3)]
+    runs = []
+    for _ in range(2):
+        source = SyntheticSource(["a_usd"], rate=3, seed=42)
+        runs.append([await source.read(tick) for tick in ticks])
+
+    assert runs[0] == runs[1]
+
+
+@pytest.mark.asyncio
+async def test_replay_merges_tickers_by_time_with_speedup(tmp_path):
+    """
+    Тестирует, что архив с блоками тикеров друг за другом воспроизводится в порядке времени
+    с ускорением speed.
+    """
+    path = str(tmp_path / "history.cpa")
+    write_archive(path, [
+        ("btc_usd", [(1000, 1.0), (1020, 2.0)]),
+        ("btc_usd", [(1040, 3.0)]),
+        ("eth_usd", [(1010, 10.0), (1030, 20.0)]),
+    ])
+    source = ReplaySource(path, speed=20, rebase=False)
+    await source.open()
+
+    assert source.tickers == ["btc_usd", "eth_usd"]
+    assert await source.read(Tick(BASE, 0.0)) == [("btc_usd", 1.0, 1000)]
+    assert await source.read(Tick(BASE + 1, 0.0)) == [
+        ("eth_usd", 10.0, 1010), ("btc_usd", 2.0, 1020),
+    ]
+    assert not source.exhausted
+    assert await source.read(Tick(BASE + 5, 0.0)) == [
+        ("eth_usd", 20.0, 1030), ("btc_usd", 3.0, 1040),
+    ]
+    assert source.exhausted
+    assert source.replayed == 5
+    await source.close()
+
+
+@pytest.mark.asyncio
+async def test_replay_rebase_keeps_spacing(tmp_path):
+    """
+    Тестирует, что при rebase первая строка приходится на первый тик, интервалы между строками
+    сохраняются, а строки не обгоняют текущий тик. Rebase со speed > 1 отклоняется.
+    """
+    path = str(tmp_path / "history.cpa")
+    write_archive(path, [("btc_usd", [(1000, 1.0), (1003, 2.0), (1007, 3.0), (1012, 4.0)])])
+    source = ReplaySource(path, speed=1, max_rows_per_tick=1)
+    await source.open()
+
+    assert await source.read(Tick(BASE, 0.0)) == [("btc_usd", 1.0, BASE)]
+    # Строки, не уместившиеся в предыдущие тики, сохраняют свои интервалы.
+    assert await source.read(Tick(BASE + 10, 0.0)) == [("btc_usd", 2.0, BASE + 3)]
+    assert await source.read(Tick(BASE + 11, 0.0)) == [("btc_usd", 3.0, BASE + 7)]
+    assert await source.read(Tick(BASE + 11, 0.0)) == []
+    assert await source.read(Tick(BASE + 12, 0.0)) == [("btc_usd", 4.0, BASE + 12)]
+    await source.close()
+
+    with pytest.raises(ValueError):
+        ReplaySource(path, speed=20)
+
+
+@pytest.mark.asyncio
+async def test_replay_limits_rows_per_tick(tmp_path):
+    """
+    Тестирует, что за тик выдаётся не больше max_rows_per_tick строк, а остаток переходит на следующий тик.
+    """
+    path = str(tmp_path / "history.cpa")
+    write_archive(path, [("btc_usd", [(1000 + i, float(i)) for i in range(5)])])
+    source = ReplaySource(path, speed=1000, max_rows_per_tick=2, rebase=False)
+    await source.open()
+
+    batches = [await source.read(Tick(BASE + i, 0.0)) for i in range(4)]
+
+    assert [len(batch) for batch in batches] == [1, 2, 2, 0]
+    assert [row[2] for batch in batches for row in batch] == [1000, 1001, 1002, 1003, 1004]
+    await source.close()
+
+
+@pytest.mark.asyncio
+async def test_fetcher_stores_source_rows_and_stops_when_exhausted(tmp_path, test_db):
+    """
+    Тестирует, что цены из источника проходят обычный путь PriceFetcher в базу, а после конца
+    записи цикл загрузки завершается сам.
+    """
+    path = str(tmp_path / "history.cpa")
+    write_archive(path, [("btc_usd", [(1000, 1.0), (1001, 2.0)]), ("eth_usd", [(1000, 10.0)])])
+    fetcher = PriceFetcher(db=test_db, interval=0.05, source=ReplaySource(path, speed=1000, rebase=False))
+
+    await fetcher.start()
+    await asyncio.wait_for(fetcher.task, timeout=2)
+
+    assert fetcher.tickers == ["btc_usd", "eth_usd"]
+    assert await test_db.get_price_rows("btc_usd") == [("btc_usd", 1.0, 1000), ("btc_usd", 2.0, 1001)]
+    assert (await test_db.get_latest_price("eth_usd")).price == 10.0
+    await fetcher.shutdown()
+
+
+def test_create_price_source_by_mode():
+    """
+    Тестирует выбор источника по режиму загрузки.
+    """
+    assert create_price_source("rest") is None
+    assert isinstance(create_price_source("synthetic"), SyntheticSource)
+    with pytest.raises(ValueError):
+        create_price_source("replay")
+
+
+@pytest.mark.asyncio
+async def test_source_tickers_follow_active_source(tmp_path, monkeypatch):
+    """
+    Тестирует, что набор тикеров для ведомого процесса берётся из активного источника:
+    из настроек для Deribit, из синтетического источника и из индекса архива для replay.
+    """
+    path = str(tmp_path / "history.cpa")
+    write_archive(path, [("xrp_usd", [(1000, 1.0)]), ("sol_usd", [(1000, 2.0)]), ("xrp_usd", [(1001, 3.0)])])
+    monkeypatch.setattr(settings, "replay_path", path)
+    monkeypatch.setattr(settings, "synthetic_tickers", 2)
+
+    assert await source_tickers("rest") == list(settings.tickers)
+    assert await source_tickers("synthetic") == ["synthetic0_usd", "synthetic1_usd"]
+    assert await source_tickers("replay") == ["xrp_usd", "sol_usd"]
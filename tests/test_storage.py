@@ -0,0 +1,57 @@
+import os
+
+import pytest
+from app.database import Database
+from app.storage import StorageBackend, create_storage, postgres_dsn, sqlite_path
+
+
+def test_sqlite_path():
+    """
+    Тестирует разбор путей SQLite: обычный путь и URL в стиле SQLAlchemy.
+    """
+    assert sqlite_path("/app/data/crypto_prices.db") == "/app/data/crypto_prices.db"
+    assert sqlite_path("sqlite+aiosqlite:///app/data/crypto_prices.db") == "/app/data/crypto_prices.db"
+    assert sqlite_path("sqlite:///tmp/prices.db") == "/tmp/prices.db"
+    assert sqlite_path("sqlite://data/prices.db") == "data/prices.db"
+
+
+def test_postgres_dsn():
+    """
+    Тестирует, что суффикс драйвера отбрасывается, а остальной DSN не меняется.
+    """
+    assert postgres_dsn("postgresql+asyncpg://user:secret@db:5432/prices") == "postgresql://user:secret@db:5432/prices"
+    assert postgres_dsn("postgres://db/prices") == "postgres://db/prices"
+
+
+def test_create_storage_selects_backend():
+    """
+    Тестирует выбор реализации хранилища по схеме URL.
+    """
+    sqlite = create_storage("sqlite+aiosqlite:///app/data/crypto_prices.db")
+    assert isinstance(sqlite, Database)
+    assert sqlite.path == "/app/data/crypto_prices.db"
+
+    pytest.importorskip("asyncpg")
+    from app.postgres import PostgresStorage
+
+    postgres = create_storage("postgresql+asyncpg://user@localhost/prices")
+    assert isinstance(postgres, PostgresStorage)
+    assert isinstance(postgres, StorageBackend)
+    assert postgres.dsn == "postgresql://user@localhost/prices"
+
+
+@pytest.mark.asyncio
+async def test_sqlite_url_creates_database_at_path(tmp_path):
+    """
+    Тестирует, что база по URL sqlite+aiosqlite:// создаётся по указанному пути.
+    """
+    path = os.path.join(tmp_path, "nested", "prices.db")
+    db = create_storage(f"sqlite+aiosqlite://{path}")
+    await db.initialize()
+    try:
+        await db.insert_price("btc_usd", 1.0, 100)
+        assert (await db.get_latest_price("btc_usd")).price == 1.0
+    finally:
+        await db.close()
+
+    assert os.path.exists(path)
@@ -0,0 +1,175 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from app.streaming import PriceStreamer
+
+
+class DeribitWebSocketStub:
+    """
+    Локальная замена WebSocket API Deribit: отвечает на подписку и рассылает обновления индексов.
+    """
+
+    def __init__(self):
+        self.received = []
+        self.notifications = []
+        self.close_after_notifications = False
+        self.send_test_request = False
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            message = json.loads(msg.data)
+            self.received.append(message)
+            await ws.send_json({"jsonrpc": "2.0", "id": message["id"], "result": "ok"})
+            if message["method"] == "public/subscribe":
+                if self.send_test_request:
+                    await ws.send_json({"jsonrpc": "2.0", "method": "heartbeat", "params": {"type": "test_request"}})
+                for channel, price, timestamp in self.notifications:
+                    await ws.send_json({
+                        "jsonrpc": "2.0",
+                        "method": "subscription",
+                        "params": {"channel": channel, "data": {"price": price, "timestamp": timestamp}},
+                    })
+                if self.close_after_notifications:
+                    await ws.close()
+        return ws
+
+    def methods(self):
+        return [message["method"] for message in self.received]
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/ws/api/v2", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}/ws/api/v2"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+@pytest.fixture
+async def ws_stub():
+    """
+    Фикстура для запуска локального WebSocket-сервера Deribit.
+    """
+    stub = DeribitWebSocketStub()
+    await stub.start()
+    yield stub
+    await stub.stop()
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Condition was not met in time")
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_streamer_subscribes_and_stores_prices(ws_stub, test_db):
+    """
+    Тестирует, что стример подписывается на каналы индексов и сохраняет полученные цены в базу.
+    """
+    ws_stub.notifications = [
+        ("deribit_price_index.btc_usd", 50000.0, 1625077800000),
+        ("deribit_price_index.eth_usd", 2500.0, 1625077800500),
+    ]
+    streamer = PriceStreamer(db=test_db, tickers=["btc_usd", "eth_usd"], ws_url=ws_stub.url)
+    await streamer.start()
+
+    await wait_for(lambda: test_db.latest_cache.get("eth_usd") is not None)
+    await streamer.shutdown()
+
+    subscribe = next(m for m in ws_stub.received if m["method"] == "public/subscribe")
+    assert subscribe["params"]["channels"] == ["deribit_price_index.btc_usd", "deribit_price_index.eth_usd"]
+    assert ws_stub.methods()[0] == "public/set_heartbeat"
+
+    btc = await test_db.get_latest_price("btc_usd")
+    assert btc.price == 50000.0
+    assert btc.timestamp == 1625077800
+    assert (await test_db.get_latest_price("eth_usd")).price == 2500.0
+
+
+@pytest.mark.asyncio
+async def test_streamer_skips_malformed_notifications(ws_stub, test_db):
+    """
+    Тестирует, что уведомления с испорченной, отрицательной или нулевой ценой и без timestamp
+    пропускаются без переподключения, а следующие за ними цены сохраняются.
+    """
+    ws_stub.notifications = [
+        ("deribit_price_index.btc_usd", "abc", 1625077800000),
+        ("deribit_price_index.btc_usd", -1.0, 1625077800000),
+        ("deribit_price_index.btc_usd", 0, 1625077800000),
+        ("deribit_price_index.btc_usd", 50000.0, None),
+        ("deribit_price_index.btc_usd", 50000.0, 1625077800000),
+    ]
+    streamer = PriceStreamer(db=test_db, tickers=["btc_usd"], ws_url=ws_stub.url)
+    await streamer.start()
+
+    await wait_for(lambda: test_db.latest_cache.get("btc_usd") is not None)
+    await streamer.shutdown()
+
+    assert await test_db.get_price_rows("btc_usd") == [("btc_usd", 50000.0, 1625077800)]
+    assert streamer.connections == 1
+    assert ws_stub.methods().count("public/subscribe") == 1
+
+
+@pytest.mark.asyncio
+async def test_streamer_answers_heartbeat(ws_stub, test_db):
+    """
+    Тестирует, что стример отвечает на heartbeat test_request вызовом public/test.
+    """
+    ws_stub.send_test_request = True
+    streamer = PriceStreamer(db=test_db, tickers=["btc_usd"], ws_url=ws_stub.url)
+    await streamer.start()
+
+    await wait_for(lambda: "public/test" in ws_stub.methods())
+    await streamer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_streamer_reconnects_and_resubscribes(ws_stub, test_db):
+    """
+    Тестирует, что после обрыва соединения стример переподключается и заново оформляет подписку.
+    """
+    ws_stub.notifications = [("deribit_price_index.btc_usd", 50000.0, 1625077800000)]
+    ws_stub.close_after_notifications = True
+    streamer = PriceStreamer(
+        db=test_db, tickers=["btc_usd"], ws_url=ws_stub.url,
+        reconnect_min_delay=0.01, reconnect_max_delay=0.05,
+    )
+    await streamer.start()
+
+    # Четвёртая подписка означает, что уведомления первых трёх соединений уже сохранены.
+    await wait_for(lambda: ws_stub.methods().count("public/subscribe") >= 4)
+    await streamer.shutdown()
+
+    assert streamer.connections >= 3
+    assert len(await test_db.get_all_prices("btc_usd")) >= 3
+
+
+@pytest.mark.asyncio
+async def test_streamer_backs_off_when_server_is_down(test_db):
+    """
+    Тестирует, что при недоступном сервере стример не падает, а продолжает попытки подключения.
+    """
+    streamer = PriceStreamer(
+        db=test_db, tickers=["btc_usd"], ws_url="ws://127.0.0.1:1/ws/api/v2",
+        reconnect_min_delay=0.01, reconnect_max_delay=0.02,
+    )
+    await streamer.start()
+    await asyncio.sleep(0.1)
+
+    assert not streamer.task.done()
+    assert streamer.connections == 0
+    await streamer.shutdown()
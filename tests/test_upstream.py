@@ -0,0 +1,84 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from app.database import Database
+from app.services import PriceFetcher
+from app.upstream import ResponseTooLargeError, UpstreamClient, UpstreamStatusError
+
+
+def test_client_does_not_create_session_outside_loop():
+    """
+    Тестирует, что конструктор не создаёт сессию aiohttp: она появляется только внутри цикла событий.
+    """
+    client = UpstreamClient()
+
+    assert client.session is None
+
+
+@pytest.mark.asyncio
+async def test_get_json_reuses_connections_and_counts_per_host(deribit_stub):
+    """
+    Тестирует, что последовательные запросы идут через одно соединение, а статистика хоста
+    считает запросы, новые и переиспользованные соединения.
+    """
+    deribit_stub.prices = {"btc_usd": 50000.0}
+    client = UpstreamClient()
+    url = f"{deribit_stub.url}/public/get_index_price?index_name=btc_usd"
+
+    for _ in range(3):
+        data = await client.get_json(url)
+        assert data["result"]["index_price"] == 50000.0
+
+    stats = client.stats()["127.0.0.1"]
+    assert stats["requests"] == 3
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 2
+    assert stats["max_request_seconds"] > 0
+    await client.close()
+    assert client.session is None
+
+
+@pytest.mark.asyncio
+async def test_get_json_raises_on_error_status(deribit_stub):
+    """
+    Тестирует, что статус из error_statuses превращается в UpstreamStatusError.
+    """
+    deribit_stub.failures = 1
+    client = UpstreamClient()
+
+    with pytest.raises(UpstreamStatusError) as error:
+        await client.get_json(f"{deribit_stub.url}/public/get_index_price?index_name=btc_usd", frozenset({503}))
+
+    assert error.value.status == 503
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_get_json_limits_response_size(deribit_stub):
+    """
+    Тестирует, что ответ больше max_response_bytes не читается целиком и не разбирается.
+    """
+    deribit_stub.history = {"btc_usd": [(1625011200 + i * 60, 50000.0 + i) for i in range(100)]}
+    client = UpstreamClient(max_response_bytes=256)
+
+    with pytest.raises(ResponseTooLargeError):
+        await client.get_json(f"{deribit_stub.url}/public/get_index_chart_data?index_name=btc_usd&range=1h")
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_fetchers_share_client_without_closing_it(deribit_stub):
+    """
+    Тестирует, что загрузчик с общим клиентом не закрывает его при остановке, и следующий
+    загрузчик продолжает работать через тот же пул соединений.
+    """
+    client = UpstreamClient()
+    for _ in range(2):
+        fetcher = PriceFetcher(db=AsyncMock(spec=Database), tickers=["btc_usd"], api_url=deribit_stub.url, client=client)
+        assert await fetcher.fetch_tick() == {"btc_usd": 1000.0}
+        await fetcher.shutdown()
+
+    assert client.session is not None and not client.session.closed
+    assert client.stats()["127.0.0.1"]["new_connections"] == 1
+    await client.close()
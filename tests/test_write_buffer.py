@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+import pytest
+from app.database import Database
+from app.write_buffer import WriteBuffer
+
+
+@pytest.fixture
+async def db(tmp_path):
+    """
+    Фикстура для создания временной базы данных.
+    """
+    test_db = Database(db_url=os.path.join(tmp_path, "buffer.db"))
+    await test_db.initialize()
+    yield test_db
+    await test_db.close()
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_on_size_threshold(db):
+    """
+    Тестирует, что буфер сбрасывается в базу при достижении порога по количеству строк.
+    """
+    buffer = WriteBuffer(db, max_rows=3, flush_interval=60)
+
+    await buffer.add([("btc_usd", 50000.0, 1625077800), ("eth_usd", 2500.0, 1625077800)])
+    assert len(buffer) == 2
+    assert await db.get_all_prices("btc_usd") == []
+
+    await buffer.add([("btc_usd", 50500.0, 1625077860)])
+    assert len(buffer) == 0
+    assert len(await db.get_all_prices("btc_usd")) == 2
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_on_timer(db):
+    """
+    Тестирует, что фоновая задача сбрасывает буфер по истечении интервала.
+    """
+    buffer = WriteBuffer(db, max_rows=1000, flush_interval=0.05)
+    await buffer.start()
+
+    await buffer.add([("btc_usd", 50000.0, 1625077800)])
+    await asyncio.sleep(0.2)
+
+    assert len(await db.get_all_prices("btc_usd")) == 1
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_on_close(db):
+    """
+    Тестирует, что при закрытии буфера оставшиеся строки записываются в базу.
+    """
+    buffer = WriteBuffer(db, max_rows=1000, flush_interval=60)
+    await buffer.start()
+    await buffer.add([("btc_usd", 50000.0, 1625077800), ("btc_usd", 50500.0, 1625077860)])
+
+    await buffer.close()
+
+    assert len(await db.get_all_prices("btc_usd")) == 2
+    assert (await db.get_latest_price("btc_usd")).price == 50500.0
+
+
+@pytest.mark.asyncio
+async def test_buffer_rejects_invalid_rows_early(db):
+    """
+    Тестирует, что некорректная строка отклоняется при добавлении и не отравляет весь пакет.
+    """
+    buffer = WriteBuffer(db, max_rows=1000, flush_interval=60)
+    await buffer.add([("btc_usd", 50000.0, 1625077800)])
+
+    with pytest.raises(ValueError):
+        await buffer.add([("btc_usd", -1.0, 1625077860)])
+
+    assert await buffer.flush() == 1
+
+
+@pytest.mark.asyncio
+async def test_buffer_keeps_rows_when_flush_fails(db, monkeypatch):
+    """
+    Тестирует, что при ошибке записи строки остаются в буфере для следующей попытки.
+    """
+    buffer = WriteBuffer(db, max_rows=1000, flush_interval=60)
+    await buffer.add([("btc_usd", 50000.0, 1625077800)])
+
+    original = db.insert_prices_bulk
+
+    async def failing_insert(rows):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(db, "insert_prices_bulk", failing_insert)
+    with pytest.raises(RuntimeError):
+        await buffer.flush()
+    assert len(buffer) == 1
+
+    monkeypatch.setattr(db, "insert_prices_bulk", original)
+    assert await buffer.flush() == 1